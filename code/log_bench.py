@@ -0,0 +1,231 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional
+
+import log_codec
+from log_synth import write_synthetic
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ("producer", "parse", "detect", "consume")
+DEFAULT_SIZES = (10_000,)
+BLOCK_LINES = 50_000  # buffer lines decoded per block in the parse/detect stages
+RESULTS_VERSION = 1
+
+def parse_size(text: str) -> int:
+    """Row count from "10000", "10k", "1M" or "10m" """
+    multipliers = {"k": 1_000, "m": 1_000_000}
+    suffix = text[-1:].lower()
+    if suffix in multipliers:
+        return int(float(text[:-1]) * multipliers[suffix])
+    return int(text)
+
+def _peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MB, None where it cannot be read"""
+    # VmHWM belongs to the current address space; ru_maxrss would also count
+    # the parent's peak, which survives fork and exec on Linux
+    try:
+        with open("/proc/self/status", 'r') as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    return round(peak / (1 << 20) if sys.platform == "darwin" else peak / (1 << 10), 1)
+
+def _buffer_blocks(buffer_path: str) -> Any:
+    with open(buffer_path, 'rb') as f:
+        block = []
+        for line in f:
+            block.append(line)
+            if len(block) >= BLOCK_LINES:
+                yield block
+                block = []
+        if block:
+            yield block
+
+def run_stage(stage: str, csv_path: str, buffer_path: str, alerts_path: str) -> Dict[str, Any]:
+    """Run one stage over prepared inputs, returning its timing and peak RSS
+    
+    producer streams the CSV into the JSONL buffer; parse decodes and parses
+    the buffer; detect runs is_suspicious over parsed events (parsing is not
+    timed); consume is consume_logs end to end with a JSONL alert sink.
+    Console output of the stages is discarded.
+    """
+    from log_producer import stream_logs
+    from log_consumer import consume_logs
+    from log_sinks import JsonlAlertSink
+    from log_utils import parse_log_line, is_suspicious
+    
+    events = 0
+    seconds = 0.0
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if stage == "producer":
+            started = time.perf_counter()
+            stream_logs(csv_path, buffer_path, delay=0, chunksize=50_000)
+            seconds = time.perf_counter() - started
+            with open(buffer_path, 'rb') as f:
+                events = sum(1 for _ in f)
+        elif stage == "parse":
+            for block in _buffer_blocks(buffer_path):
+                started = time.perf_counter()
+                parsed = [parse_log_line(log_codec.loads(line)) for line in block]
+                seconds += time.perf_counter() - started
+                events += len(parsed)
+        elif stage == "detect":
+            for block in _buffer_blocks(buffer_path):
+                parsed = [parse_log_line(log_codec.loads(line)) for line in block]
+                started = time.perf_counter()
+                for event in parsed:
+                    is_suspicious(event)
+                seconds += time.perf_counter() - started
+                events += len(parsed)
+        elif stage == "consume":
+            if os.path.exists(alerts_path):
+                os.remove(alerts_path)
+            started = time.perf_counter()
+            consume_logs(buffer_path, None, sink=JsonlAlertSink(alerts_path, batch_size=1000))
+            seconds = time.perf_counter() - started
+            with open(buffer_path, 'rb') as f:
+                events = sum(1 for _ in f)
+        else:
+            raise ValueError(f"Unknown stage {stage!r}, expected one of {STAGES}")
+    
+    return {
+        "stage": stage,
+        "events": events,
+        "seconds": round(seconds, 6),
+        "events_per_sec": round(events / seconds, 1) if seconds else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+def _git_commit() -> Optional[str]:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+def run_benchmark(sizes: List[int] = list(DEFAULT_SIZES), stages: List[str] = list(STAGES),
+                  work_dir: Optional[str] = None, seed: int = 0, suspicious_ratio: float = 0.05,
+                  isolate: bool = True) -> Dict[str, Any]:
+    """Benchmark each stage at each size on seeded synthetic data
+    
+    Inputs are generated into work_dir (a temporary directory by default)
+    and reused when they already exist there. With isolate, every stage runs
+    in a fresh spawned process so its peak RSS is its own.
+    """
+    for stage in stages:
+        if stage not in STAGES:
+            raise ValueError(f"Unknown stage {stage!r}, expected one of {STAGES}")
+    # The parse/detect/consume stages read the buffer the producer writes
+    needs_buffer = any(stage != "producer" for stage in stages)
+    
+    report: Dict[str, Any] = {
+        "version": RESULTS_VERSION,
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "codec": log_codec.BACKEND,
+        "seed": seed,
+        "suspicious_ratio": suspicious_ratio,
+        "results": [],
+    }
+    
+    with contextlib.ExitStack() as stack:
+        if work_dir is None:
+            work_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="sysmon-bench-"))
+        os.makedirs(work_dir, exist_ok=True)
+        
+        for rows in sizes:
+            csv_path = os.path.join(work_dir, f"synthetic_{rows}_{seed}.csv")
+            buffer_path = os.path.join(work_dir, f"buffer_{rows}_{seed}.jsonl")
+            alerts_path = os.path.join(work_dir, f"alerts_{rows}_{seed}.jsonl")
+            if not os.path.exists(csv_path):
+                print(f"[Bench] Generating {rows} events -> {csv_path}")
+                write_synthetic(csv_path, rows, seed=seed, suspicious_ratio=suspicious_ratio)
+            
+            run_order = list(stages)
+            if needs_buffer and "producer" not in run_order:
+                run_order.insert(0, "producer")
+            for stage in run_order:
+                args = (stage, csv_path, buffer_path, alerts_path)
+                if isolate:
+                    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as executor:
+                        result = executor.submit(run_stage, *args).result()
+                else:
+                    result = run_stage(*args)
+                if stage not in stages:
+                    continue
+                result["rows"] = rows
+                report["results"].append(result)
+                print(f"[Bench] {rows:>10} rows  {stage:<9} {result['seconds']:>9.3f}s  "
+                      f"{result['events_per_sec'] or 0:>12,.0f} events/sec  {result['peak_rss_mb'] or 0:>8.1f} MB peak RSS")
+    return report
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Pair results by (rows, stage) and report the events/sec change against the baseline"""
+    previous = {(result["rows"], result["stage"]): result for result in baseline.get("results", [])}
+    changes = []
+    for result in current.get("results", []):
+        before = previous.get((result["rows"], result["stage"]))
+        if not before or not before.get("events_per_sec") or not result.get("events_per_sec"):
+            continue
+        changes.append({
+            "rows": result["rows"],
+            "stage": result["stage"],
+            "baseline_events_per_sec": before["events_per_sec"],
+            "events_per_sec": result["events_per_sec"],
+            "speedup": round(result["events_per_sec"] / before["events_per_sec"], 3),
+            "peak_rss_change_mb": (round(result["peak_rss_mb"] - before["peak_rss_mb"], 1)
+                                   if result["peak_rss_mb"] is not None and before["peak_rss_mb"] is not None else None),
+        })
+    return changes
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark producer, parse, detect and consume throughput")
+    parser.add_argument("--sizes", nargs="+", default=[str(size) for size in DEFAULT_SIZES],
+                        help="row counts to benchmark, e.g. 10k 1M 10M")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--suspicious-ratio", type=float, default=0.05)
+    parser.add_argument("--work-dir", default=None, help="keep and reuse generated inputs here")
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="run stages in this process (faster, but peak RSS accumulates)")
+    parser.add_argument("--output", default="bench_results.json", help="machine-readable results file")
+    parser.add_argument("--compare", default=None, help="results file of a baseline run to compare against")
+    args = parser.parse_args()
+    
+    report = run_benchmark([parse_size(size) for size in args.sizes], args.stages, args.work_dir, args.seed,
+                           args.suspicious_ratio, isolate=not args.no_isolate)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"[Bench] Results saved to: {args.output}")
+    
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        print(f"[Bench] Compared with {args.compare} (commit {baseline.get('commit') or 'unknown'}):")
+        for change in compare_results(baseline, report):
+            print(f"  {change['rows']:>10} rows  {change['stage']:<9} {change['speedup']:>6.2f}x events/sec  "
+                  f"{change['peak_rss_change_mb'] or 0:+.1f} MB peak RSS")
@@ -0,0 +1,111 @@
+import mmap
+import struct
+from typing import Dict, Any, List, Iterator, BinaryIO
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+BUFFER_FORMATS = ("jsonl", "msgpack")
+
+# Length-prefixed msgpack record batches:
+#   file  := MAGIC batch*
+#   batch := uint32 little-endian payload length, msgpack payload
+#   payload := {"n": rows, "columns": {name: column}}
+# A column is a plain list of values, or, for DICTIONARY_COLUMNS, a
+# {"dict": [distinct values], "codes": uint32 little-endian bytes} pair. A column that
+# some records lack also carries "absent": [row indices].
+MAGIC = b"SYSMONB1"
+DICTIONARY_COLUMNS = ("Image", "ProcessName")
+_LENGTH = struct.Struct("<I")
+_CODE = np.dtype("<u4")  # explicit width and byte order, so buffers move between hosts
+
+def _require_msgpack() -> None:
+    if msgpack is None:
+        raise RuntimeError("The msgpack buffer format requires the msgpack package (pip install msgpack)")
+
+def encode_batch(records: List[Dict[str, Any]]) -> bytes:
+    """Encode records as one length-prefixed columnar msgpack batch"""
+    _require_msgpack()
+    names: Dict[str, None] = {}
+    for record in records:
+        names.update(dict.fromkeys(record))
+    
+    ragged = any(len(record) != len(names) for record in records)
+    columns: Dict[str, Any] = {}
+    for name in names:
+        values = [record.get(name) for record in records]
+        if name in DICTIONARY_COLUMNS:
+            index: Dict[Any, int] = {}
+            codes = np.array([index.setdefault(value, len(index)) for value in values], dtype=_CODE)
+            column: Dict[str, Any] = {"dict": list(index), "codes": codes.tobytes()}
+        else:
+            column = {"values": values}
+        if ragged:
+            absent = [row for row, record in enumerate(records) if name not in record]
+            if absent:
+                column["absent"] = absent
+        columns[name] = column
+    
+    payload = msgpack.packb({"n": len(records), "columns": columns}, use_bin_type=True)
+    return _LENGTH.pack(len(payload)) + payload
+
+def decode_batch(payload: Any) -> List[Dict[str, Any]]:
+    """Decode one msgpack batch payload (bytes or memoryview) back into records"""
+    _require_msgpack()
+    batch = msgpack.unpackb(payload, raw=False)
+    rows = batch["n"]
+    names = list(batch["columns"])
+    column_values = []
+    absent_cells = []
+    for name, column in batch["columns"].items():
+        if "dict" in column:
+            dictionary = column["dict"]
+            codes = np.frombuffer(column["codes"], dtype=_CODE).tolist()
+            column_values.append([dictionary[code] for code in codes])
+        else:
+            column_values.append(column["values"])
+        absent_cells.extend((row, name) for row in column.get("absent", ()))
+    
+    records = [dict(zip(names, row)) for row in zip(*column_values)] if names else [{} for _ in range(rows)]
+    for row, name in absent_cells:
+        del records[row][name]
+    return records
+
+class MsgpackBufferWriter:
+    """Write record batches to a msgpack columnar buffer file"""
+    
+    def __init__(self, f: BinaryIO):
+        _require_msgpack()
+        self._file = f
+        self._file.write(MAGIC)
+    
+    def write_batch(self, records: List[Dict[str, Any]]) -> None:
+        if records:
+            self._file.write(encode_batch(records))
+
+def iter_msgpack_batches(f: BinaryIO) -> Iterator[List[Dict[str, Any]]]:
+    """Yield the record batches of an open msgpack buffer, memory-mapped"""
+    _require_msgpack()
+    f.seek(0, 2)
+    if f.tell() == 0:
+        return
+    
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        try:
+            if view[:len(MAGIC)] != MAGIC:
+                raise ValueError("Not a msgpack log buffer (bad magic)")
+            position = len(MAGIC)
+            while position + _LENGTH.size <= len(view):
+                (length,) = _LENGTH.unpack_from(view, position)
+                position += _LENGTH.size
+                if position + length > len(view):
+                    raise ValueError(f"Truncated batch at byte {position - _LENGTH.size}")
+                yield decode_batch(view[position:position + length])
+                position += length
+        finally:
+            view.release()
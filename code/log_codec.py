@@ -0,0 +1,72 @@
+import json
+from typing import Any, Iterable, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+def _default(obj: Any) -> Any:
+    """Fallback for values the JSON encoder does not know, matching default=str"""
+    to_dict = getattr(obj, "to_dict", None)
+    if to_dict is not None:  # SysmonEvent and other dict-like records
+        return to_dict()
+    if hasattr(obj, "item"):  # numpy scalars
+        return obj.item()
+    return str(obj)
+
+if orjson is not None:
+    BACKEND = "orjson"
+    DecodeError = orjson.JSONDecodeError
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+    
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact JSON bytes"""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS)
+    
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize obj to one JSONL line (with trailing newline)"""
+        return orjson.dumps(obj, default=_default, option=_OPTIONS | orjson.OPT_APPEND_NEWLINE)
+    
+    loads = orjson.loads
+
+elif msgspec is not None:
+    BACKEND = "msgspec"
+    DecodeError = msgspec.DecodeError
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+    _decoder = msgspec.json.Decoder()
+    
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact JSON bytes"""
+        return _encoder.encode(obj)
+    
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize obj to one JSONL line (with trailing newline)"""
+        return _encoder.encode(obj) + b"\n"
+    
+    def loads(data: Union[bytes, str]) -> Any:
+        """Deserialize JSON from bytes or str"""
+        return _decoder.decode(data)
+
+else:
+    BACKEND = "json"
+    DecodeError = json.JSONDecodeError
+    
+    def dumps(obj: Any) -> bytes:
+        """Serialize obj to compact JSON bytes"""
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+    
+    def dumps_line(obj: Any) -> bytes:
+        """Serialize obj to one JSONL line (with trailing newline)"""
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode() + b"\n"
+    
+    loads = json.loads
+
+def dumps_lines(records: Iterable[Any]) -> bytes:
+    """Serialize a batch of records as one JSONL block"""
+    return b"".join([dumps_line(record) for record in records])
@@ -1,82 +1,780 @@
-import json
 import sys
 import os
-from typing import List, Dict, Any
-from log_utils import parse_log_line, is_suspicious, validate_json_structure
+import argparse
+import asyncio
+import contextlib
+import heapq
+import logging
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
+from concurrent.futures import Executor, ProcessPoolExecutor
+from log_utils import (
+    parse_log_line, is_suspicious, validate_json_structure, get_verdict_cache, set_verdict_cache_size,
+    suspicious_reasons, utc_time_to_epoch, get_ioc_index, load_iocs, SOURCE_FIELD
+)
+from log_tail import tail_lines, make_watcher, load_checkpoint, save_checkpoint
+import log_codec
+from log_buffer import iter_msgpack_batches, BUFFER_FORMATS
+from log_sinks import AlertSink, JsonlAlertSink, build_sink, FSYNC_POLICIES
+from log_metrics import (
+    MetricsRegistry, MetricsExporter, RateTracker, METRICS_FORMATS, enable_metrics, get_registry, timed_iter
+)
+from log_correlation import CorrelationEngine, load_correlation_rules
+from log_rules import RULE_LOAD_ERRORS, RuleEngine, rule_alert
+from log_index import build_index, iter_range_lines
+from log_segments import SEGMENT_ACTIONS, is_segmented, pending_segments, finish_segment, open_compressed
+from log_diagnostics import LOG_LEVELS, UNLIMITED, Progress, configure_diagnostics, get_logger
 
-def consume_logs(input_path: str = 'stream_buffer.jsonl', output_path: str = 'alerts.json') -> None:
-    """Process logs and generate alerts with enhanced error handling"""
-    alerts: List[Dict[str, Any]] = []
-    processed_count = 0
-    error_count = 0
+CHECKPOINT_EVERY = 1000  # lines between periodic checkpoint saves
+SHARD_BYTES = 64 << 20  # upper bound on the size of one parallel shard
+
+ALERT_FIELDS = ("EventID", "UtcTime", "Image", "ProcessName", "CommandLine", SOURCE_FIELD)  # SourceHost may be None
+
+# Templates take a {"line_num", "detail"} mapping, so repeats of a kind are rate-limited together
+ERROR_MESSAGES = {
+    "structure": "[Consumer] Warning: Invalid structure at line %(line_num)s",
+    "decode": "[Consumer] JSON decode error at line %(line_num)s: %(detail)s",
+    "error": "[Consumer] Error processing line %(line_num)s: %(detail)s",
+}
+
+log = get_logger("consumer")
+
+class LogProcessor:
+    """Validate, parse and check buffer records, sending alerts to a sink
     
-    try:
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"Input file not found: {input_path}")
+    With a correlator, every parsed event is also fed to the correlation
+    engine and the alerts it completes go to the same sink. With rules (a
+    RuleEngine), the rules replace is_suspicious as the detector and each
+    alert carries the ids of the rules it matched.
+    """
+    
+    def __init__(self, sink: Optional[AlertSink], correlator: Optional[CorrelationEngine] = None,
+                 rules: Optional[RuleEngine] = None):
+        self.sink = sink
+        self.correlator = correlator
+        self.rules = rules
+        self.alert_count = 0
+        self.correlation_count = 0
+        self.suppressed_count = 0
+        self.processed_count = 0
+        self.error_count = 0
+        self._progress = Progress()
+    
+    def process_line(self, line, line_num: int) -> None:
+        """Decode one JSONL line (bytes or str) and process the record"""
+        try:
+            line = line.strip()
+            if not line:  # Skip empty lines
+                return
+            
+            log_raw = log_codec.loads(line)
+        except log_codec.DecodeError as e:
+            self.error("decode", line_num, e)
+            return
+        except Exception as e:
+            self.error("error", line_num, e)
+            return
         
-        print(f"[Consumer] Processing logs from {input_path}")
+        self.process_record(log_raw, line_num)
+    
+    def process_record(self, log_raw: Dict[str, Any], line_num: int) -> None:
+        """Validate, parse and check one decoded record"""
+        try:
+            # Validate JSON structure
+            if not validate_json_structure(log_raw):
+                self.error("structure", line_num)
+                return
+            
+            parsed = parse_log_line(log_raw)
+            self.processed_count += 1
+            
+            if self.processed_count % 100 == 0:  # Log every 100 records
+                self.progress()
+            
+            if self.rules is not None:
+                self.detect_rules(parsed)
+            elif is_suspicious(parsed):
+                self.alert(parsed)
+            if self.correlator is not None:
+                self.correlate(parsed)
         
-        with open(input_path, 'r') as f:
-            for line_num, line in enumerate(f, 1):
-                try:
-                    line = line.strip()
-                    if not line:  # Skip empty lines
-                        continue
-                        
-                    log_raw = json.loads(line)
-                    
-                    # Validate JSON structure
-                    if not validate_json_structure(log_raw):
-                        print(f"[Consumer] Warning: Invalid structure at line {line_num}")
-                        error_count += 1
-                        continue
-                    
-                    parsed = parse_log_line(log_raw)
-                    processed_count += 1
-                    
-                    # More informative logging
-                    process_info = parsed['ProcessName'] or parsed['Image'] or 'Unknown'
-                    if processed_count % 100 == 0:  # Log every 100 records
-                        print(f"[Consumer] Processed {processed_count} records...")
-                    
-                    if is_suspicious(parsed):
-                        print(f"[Consumer] Suspicious Event: EventID {parsed['EventID']} from {process_info}")
-                        alerts.append(parsed)
-                        
-                except json.JSONDecodeError as e:
-                    print(f"[Consumer] JSON decode error at line {line_num}: {e}")
-                    error_count += 1
-                    continue
-                except Exception as e:
-                    print(f"[Consumer] Error processing line {line_num}: {e}")
-                    error_count += 1
-                    continue
+        except Exception as e:
+            self.error("error", line_num, e)
+    
+    def detect_rules(self, parsed: Dict[str, Any]) -> None:
+        matched = self.rules.match(parsed)
+        if matched:
+            self.alert(rule_alert(parsed, matched))
+    
+    def correlate(self, parsed: Dict[str, Any]) -> None:
+        for correlation in self.correlator.process(parsed):
+            self.correlation_alert(correlation)
+    
+    def correlation_alert(self, correlation: Dict[str, Any]) -> None:
+        """Report a completed correlation rule and send it to the sink"""
+        log.info("[Consumer] Correlation: %s for %s (%s events from %s to %s)", correlation['Rule'],
+                 correlation['Key'], correlation['Count'], correlation['FirstTime'], correlation['LastTime'])
+        self.sink.write(correlation)
+        self.correlation_count += 1
+    
+    def alert(self, parsed: Dict[str, Any]) -> bool:
+        """Report a suspicious event and send it to the sink; False when the sink suppressed it"""
+        if not self.sink.admit(parsed):
+            self.suppressed_count += 1
+            return False
+        # Rate-limited: the sink has every alert, the console a sample of them
+        if log.isEnabledFor(logging.INFO):
+            process_info = parsed['ProcessName'] or parsed['Image'] or 'Unknown'
+            rules = f" (rules: {', '.join(parsed['Rules'])})" if "Rules" in parsed else ""
+            log.info("[Consumer] Suspicious Event: EventID %s from %s%s", parsed['EventID'], process_info, rules)
+        self.sink.write(parsed)
+        self.alert_count += 1
+        return True
+    
+    def error(self, kind: str, line_num: int, detail: Any = "") -> None:
+        """Count and report a line that could not be processed"""
+        log.warning(ERROR_MESSAGES[kind], {"line_num": line_num, "detail": detail})
+        self.error_count += 1
+    
+    def progress(self) -> None:
+        """Log a periodic summary line when one is due"""
+        rate = self._progress.check(self.processed_count)
+        if rate is not None:
+            log.info("[Consumer] Processed %d records (%d alerts, %d errors, %.0f records/sec)",
+                     self.processed_count, self.alert_count, self.error_count, rate)
+    
+    def lines(self, source):
+        """Hook for wrapping the buffer line iterator (batch mode)"""
+        return source
+    
+    def report_lag(self, lag_bytes: int) -> None:
+        """Hook for the distance between the consumer and the end of a followed buffer"""
+        pass
+
+class InstrumentedLogProcessor(LogProcessor):
+    """LogProcessor that reports to a MetricsRegistry
+    
+    Exports stage latencies (read, decode, validate, parse, detect,
+    alert_write), alerts by reason (event_id, the matched pattern
+    categories, rule:<id> or correlation:<rule>), suppressed alerts,
+    per-rule evaluations and time, errors by kind, records/sec, byte lag
+    in follow mode and event-time lag. Per-record stage timings are taken
+    on one record in registry.sample_every; counts are exact. Plain
+    LogProcessor is used when metrics are disabled, so that path carries
+    no instrumentation.
+    """
+    
+    def __init__(self, sink: Optional[AlertSink], registry: MetricsRegistry,
+                 correlator: Optional[CorrelationEngine] = None, rules: Optional[RuleEngine] = None):
+        super().__init__(sink, correlator, rules)
+        self.registry = registry
+        stages = registry.histogram("sysmon_consumer_stage_seconds",
+                                    "Per-record time in each consumer stage (sampled)", ("stage",))
+        self._read, self._decode, self._validate, self._parse, self._detect, self._alert_write = (
+            stages.labels(stage) for stage in ("read", "decode", "validate", "parse", "detect", "alert_write"))
+        self._alerts = registry.counter("sysmon_consumer_alerts_total",
+                                        "Alerts by reason: event_id, the matching pattern category, "
+                                        "rule:<id> or correlation:<rule>", ("reason",))
+        self._suppressed = registry.counter("sysmon_consumer_alerts_suppressed_total",
+                                            "Alerts collapsed by --suppress-ttl instead of written").labels()
+        self._errors = registry.counter("sysmon_consumer_errors_total", "Unprocessable lines by kind", ("kind",))
+        self._lag_bytes = registry.gauge("sysmon_consumer_lag_bytes",
+                                         "Bytes between the consumer offset and the end of a followed buffer").labels()
+        self._event_lag = registry.gauge("sysmon_consumer_event_lag_seconds",
+                                         "Seconds between now and the UtcTime of the latest sampled event").labels()
+        records = registry.counter("sysmon_consumer_records_total", "Records parsed").labels()
+        rate = registry.gauge("sysmon_consumer_events_per_second", "Records parsed per second since the last export")
+        # Keyed, so a processor created later in the same process replaces these collectors
+        registry.add_collector(lambda: records.set_total(self.processed_count), key="consumer_records")
+        registry.add_collector(RateTracker(rate.labels(), lambda: self.processed_count), key="consumer_rate")
+        registry.remove_collector("consumer_rules")
+        if rules is not None:
+            evaluations = registry.counter("sysmon_rule_evaluations_total", "Rule predicate evaluations", ("rule",))
+            seconds = registry.counter("sysmon_rule_seconds_total",
+                                       "Time spent evaluating each rule (extrapolated from samples)", ("rule",))
+            
+            def collect_rules() -> None:
+                for rule in rules.rules:
+                    evaluations.labels(rule.id).set_total(rule.evaluations)
+                    seconds.labels(rule.id).set_total(rule.estimated_seconds())
+            registry.add_collector(collect_rules, key="consumer_rules")
+        self._every = registry.sample_every
+        self._tick = 0
+        self._last_utc_time = None
+    
+    def process_line(self, line, line_num: int) -> None:
+        if self._tick + 1 < self._every:  # process_record will not sample this one
+            super().process_line(line, line_num)
+            return
         
-        # Save results
+        started = time.perf_counter()
         try:
-            with open(output_path, 'w') as out:
-                json.dump(alerts, out, indent=2, default=str)
-                
-            print(f"\n[Consumer] Processing complete:")
-            print(f"  Total processed: {processed_count}")
-            print(f"  Alerts generated: {len(alerts)}")
-            print(f"  Errors encountered: {error_count}")
-            print(f"  Results saved to: {output_path}")
+            line = line.strip()
+            if not line:
+                return
+            log_raw = log_codec.loads(line)
+        except log_codec.DecodeError as e:
+            self.error("decode", line_num, e)
+            return
+        except Exception as e:
+            self.error("error", line_num, e)
+            return
+        self._decode.observe(time.perf_counter() - started)
+        self.process_record(log_raw, line_num)
+    
+    def process_record(self, log_raw: Dict[str, Any], line_num: int) -> None:
+        self._tick += 1
+        if self._tick < self._every:
+            super().process_record(log_raw, line_num)
+            return
+        
+        self._tick = 0
+        try:
+            started = time.perf_counter()
+            valid = validate_json_structure(log_raw)
+            validated = time.perf_counter()
+            self._validate.observe(validated - started)
+            if not valid:
+                self.error("structure", line_num)
+                return
+            
+            parsed = parse_log_line(log_raw)
+            parsed_at = time.perf_counter()
+            self._parse.observe(parsed_at - validated)
+            self.processed_count += 1
+            self._last_utc_time = parsed["UtcTime"]
+            
+            if self.processed_count % 100 == 0:  # Log every 100 records
+                self.progress()
             
+            if self.rules is not None:
+                matched = self.rules.match(parsed)
+                self._detect.observe(time.perf_counter() - parsed_at)
+                if matched:
+                    self.alert(rule_alert(parsed, matched))
+            else:
+                suspicious = is_suspicious(parsed)
+                self._detect.observe(time.perf_counter() - parsed_at)
+                if suspicious:
+                    self.alert(parsed)
+            if self.correlator is not None:
+                self.correlate(parsed)
+        
         except Exception as e:
-            print(f"[Consumer] Error saving results: {e}")
-            sys.exit(1)
+            self.error("error", line_num, e)
+    
+    def alert(self, parsed: Dict[str, Any]) -> bool:
+        started = time.perf_counter()
+        admitted = super().alert(parsed)
+        self._alert_write.observe(time.perf_counter() - started)
+        if not admitted:
+            self._suppressed.inc()
+            return False
+        # Reasons only for written alerts, so they add up to alert_count
+        if "Rules" in parsed:
+            for rule_id in parsed["Rules"]:
+                self._alerts.labels(f"rule:{rule_id}").inc()
+        else:
+            for reason in suspicious_reasons(parsed):
+                self._alerts.labels(reason).inc()
+        return True
+    
+    def correlation_alert(self, correlation: Dict[str, Any]) -> None:
+        self._alerts.labels(f"correlation:{correlation['Rule']}").inc()
+        super().correlation_alert(correlation)
+    
+    def error(self, kind: str, line_num: int, detail: Any = "") -> None:
+        self._errors.labels(kind).inc()
+        super().error(kind, line_num, detail)
+    
+    def progress(self) -> None:
+        super().progress()
+        event_time = utc_time_to_epoch(self._last_utc_time)
+        if event_time is not None:
+            self._event_lag.set(time.time() - event_time)
+    
+    def lines(self, source):
+        return timed_iter(source, self._read, self._every)
+    
+    def report_lag(self, lag_bytes: int) -> None:
+        self._lag_bytes.set(lag_bytes)
+
+def make_processor(sink: Optional[AlertSink], correlator: Optional[CorrelationEngine] = None,
+                   rules: Optional[RuleEngine] = None) -> LogProcessor:
+    """An instrumented processor when metrics are enabled, a plain one otherwise"""
+    registry = get_registry()
+    if registry is not None:
+        return InstrumentedLogProcessor(sink, registry, correlator, rules)
+    return LogProcessor(sink, correlator, rules)
+
+# Worker result: (lines, processed, alert rows, errors, verdict cache (hits, misses, evictions))
+ShardResult = Tuple[int, int, List[Tuple[Any, ...]], List[Tuple[str, int, str]], Tuple[int, int, int]]
+
+class _ShardProcessor(LogProcessor):
+    """Worker-side processor that collects compact results instead of printing"""
+    
+    def __init__(self):
+        super().__init__(None)
+        self.alerts: List[Tuple[Any, ...]] = []  # (line_num, *ALERT_FIELDS values)
+        self.errors: List[Tuple[str, int, str]] = []
+        self._line_num = 0
+        self._cache_start = get_verdict_cache().counters()
+    
+    def result(self, line_count: int) -> ShardResult:
+        """The worker result, with the verdict cache lookups made since the processor was created"""
+        cache = tuple(now - start for now, start in zip(get_verdict_cache().counters(), self._cache_start))
+        return line_count, self.processed_count, self.alerts, self.errors, cache
+    
+    def process_record(self, log_raw: Dict[str, Any], line_num: int) -> None:
+        self._line_num = line_num
+        super().process_record(log_raw, line_num)
+    
+    def alert(self, parsed: Dict[str, Any]) -> bool:
+        self.alerts.append((self._line_num, *(parsed.get(field) for field in ALERT_FIELDS)))
+        self.alert_count += 1
+        return True
+    
+    def error(self, kind: str, line_num: int, detail: Any = "") -> None:
+        self.errors.append((kind, line_num, str(detail)))
+        self.error_count += 1
+    
+    def progress(self) -> None:
+        pass
+
+def consume_logs(input_path: str = 'stream_buffer.jsonl', output_path: str = 'alerts.json',
+                 follow: bool = False, checkpoint_path: Optional[str] = None,
+                 idle_timeout: Optional[float] = None, sink: Optional[AlertSink] = None,
+                 workers: int = 1, buffer_format: str = "jsonl",
+                 correlator: Optional[CorrelationEngine] = None, suppress_ttl: Optional[float] = None,
+                 finished_segments: str = "keep", time_range: Optional[Tuple[str, str]] = None,
+                 rules: Optional[RuleEngine] = None) -> None:
+    """Process logs and generate alerts with enhanced error handling
+    
+    Alerts are streamed as they are found to sink (for example a
+    JsonlAlertSink) and, unless output_path is None, to the pretty-printed
+    alerts.json export, so memory does not grow with the number of alerts.
+    
+    With workers > 1 (batch mode only), the buffer is split into
+    newline-aligned shards processed by a process pool; alerts come out in
+    file order, as in a serial run.
+    
+    buffer_format "msgpack" reads a columnar msgpack buffer written by the
+    producer (batch mode only; records are numbered in place of lines).
+    
+    With follow, the buffer is kept open and lines are processed as they are
+    appended, until idle_timeout seconds pass without new data or the
+    consumer is interrupted. With checkpoint_path, the byte offset reached is
+    saved periodically and a restarted consumer resumes from it.
+    
+    correlator (a CorrelationEngine) adds time-windowed correlation alerts;
+    it needs the events in buffer order, so it cannot be used with workers.
+    
+    rules (a RuleEngine, see log_rules) replaces the built-in detection with
+    declarative rules, reloaded when their files change. The engine lives in
+    this process, so it cannot be used with workers either.
+    
+    With suppress_ttl, repeats of an alert (same EventID, Image and
+    CommandLine) within that many seconds are collapsed into one alert with
+    a count (see SuppressingSink). Seconds are measured in UtcTime, or on
+    the wall clock with follow.
+    
+    input_path may also be a segmented buffer directory written by the
+    producer (see log_segments). Its segments are processed in manifest
+    order, or in parallel with workers > 1, and each finished segment is
+    kept, deleted or archived according to finished_segments. Segments
+    already deleted or archived are skipped, so a rerun picks up the rest.
+    
+    time_range (start, end) processes only events with start <= UtcTime <
+    end (either may be None): the buffer's sparse index (built or extended first, see log_index)
+    gives the byte range to read, and lines outside it are never decoded.
+    """
+    try:
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input file not found: {input_path}")
+        if buffer_format not in BUFFER_FORMATS:
+            raise ValueError(f"Unknown buffer format {buffer_format!r}, expected one of {BUFFER_FORMATS}")
+        if buffer_format != "jsonl" and (follow or checkpoint_path or workers > 1):
+            raise ValueError("follow, checkpoint and workers need the jsonl buffer format")
+        if correlator is not None and workers > 1:
+            raise ValueError("correlation needs events in order and cannot run with workers")
+        if rules is not None and workers > 1:
+            raise ValueError("detection rules cannot run with workers")
+        segmented = is_segmented(input_path)
+        if segmented and (follow or checkpoint_path or buffer_format != "jsonl"):
+            raise ValueError("Segmented buffers are read in batch mode with the jsonl format")
+        range_epochs = None
+        if time_range is not None:
+            if segmented or follow or checkpoint_path or workers > 1 or buffer_format != "jsonl":
+                raise ValueError("time_range reads a single jsonl buffer in batch mode")
+            start, end = time_range  # either may be None for an open-ended range
+            range_epochs = (utc_time_to_epoch(start) if start else float("-inf"),
+                            utc_time_to_epoch(end) if end else float("inf"))
+            if None in range_epochs:
+                raise ValueError(f"Not a UtcTime range: {time_range!r}")
+        if finished_segments not in SEGMENT_ACTIONS:
+            raise ValueError(f"Unknown segment action {finished_segments!r}, expected one of {SEGMENT_ACTIONS}")
+        
+        log.info("[Consumer] %s logs from %s", 'Following' if follow else 'Processing', input_path)
+        
+        # A followed buffer is live: suppression windows then run on the wall clock
+        alert_sink = build_sink(output_path, sink, suppress_ttl, suppress_clock=time.monotonic if follow else None)
+        processor = make_processor(alert_sink, correlator, rules)
+        with contextlib.ExitStack() as stack:
+            f = None if segmented else stack.enter_context(open(input_path, 'rb'))
+            try:
+                alert_sink.open()
+            except Exception as e:
+                log.error("[Consumer] Error saving results: %s", e)
+                sys.exit(1)
+                return
             
+            try:
+                if segmented:
+                    _consume_segments(input_path, processor, workers, finished_segments)
+                elif buffer_format == "msgpack":
+                    _consume_msgpack(f, processor)
+                elif range_epochs is not None:
+                    index = build_index(input_path)
+                    for line_num, line in iter_range_lines(f, index, *range_epochs):
+                        processor.process_line(line, line_num)
+                elif follow or checkpoint_path:
+                    if workers > 1:
+                        log.warning("[Consumer] Warning: workers is ignored in follow/checkpoint mode")
+                    _consume_incremental(f, input_path, processor, follow, checkpoint_path, idle_timeout)
+                elif workers > 1:
+                    _consume_parallel(input_path, processor, workers)
+                else:
+                    for line_num, line in enumerate(processor.lines(f), 1):
+                        processor.process_line(line, line_num)
+            finally:
+                alert_sink.close()
+        
+        print_summary(processor)
+    
     except FileNotFoundError as e:
-        print(f"[Consumer] Error: {e}")
+        log.error("[Consumer] Error: %s", e)
         sys.exit(1)
     except Exception as e:
-        print(f"[Consumer] Unexpected error: {e}")
+        log.error("[Consumer] Unexpected error: %s", e)
         sys.exit(1)
 
+def print_summary(processor: LogProcessor) -> None:
+    """Print the end-of-run counters of a processor"""
+    log.info("\n[Consumer] Processing complete:", extra=UNLIMITED)
+    log.info("  Total processed: %d", processor.processed_count, extra=UNLIMITED)
+    log.info("  Alerts generated: %d", processor.alert_count, extra=UNLIMITED)
+    if processor.suppressed_count:
+        stats = processor.sink.stats()
+        log.info("  Alerts suppressed: %d (collapsed into %d alerts with counts)",
+                 processor.suppressed_count, stats['collapsed'], extra=UNLIMITED)
+    log.info("  Errors encountered: %d", processor.error_count, extra=UNLIMITED)
+    log.info("  Results saved to: %s", processor.sink.describe(), extra=UNLIMITED)
+    cache = get_verdict_cache().stats()
+    if cache["hits"] or cache["misses"]:
+        log.info("  Verdict cache: %d hits, %d misses (%.1f%% hit rate, %d/%d entries)",
+                 cache['hits'], cache['misses'], cache['hit_rate'] * 100, cache['size'], cache['maxsize'],
+                 extra=UNLIMITED)
+    iocs = get_ioc_index()
+    if iocs is not None and iocs.lookups:
+        stats = iocs.stats()
+        log.info("  IOC lookups: %d tokens, %d past the Bloom filter, %d hits",
+                 stats['lookups'], stats['bloom_passes'], stats['hits'], extra=UNLIMITED)
+    if processor.correlator is not None:
+        stats = processor.correlator.stats()
+        log.info("  Correlation alerts: %d (%d active keys, %d evicted, %d dropped, %d late events)",
+                 processor.correlation_count, stats['active_keys'], stats['evicted_keys'],
+                 stats['dropped_keys'], stats['late_events'], extra=UNLIMITED)
+    if processor.rules is not None:
+        print_rule_stats(processor.rules)
+
+def print_rule_stats(rules: RuleEngine, top: int = 5) -> None:
+    """Print the rule index layout and the rules that cost the most time"""
+    index = rules.index_summary()
+    log.info("  Rules: %d (%d indexed by EventID, %d by field, %d unindexed; %d reloads)", len(rules.rules),
+             index['event_id'], index['field'], index['unindexed'], rules.reloads, extra=UNLIMITED)
+    for stats in rules.stats()[:top]:
+        log.info("    %s: %d evaluations, %d matches, %.1f ms (%.2f us each)", stats['id'], stats['evaluations'],
+                 stats['matches'], stats['seconds'] * 1000, stats['us_per_evaluation'], extra=UNLIMITED)
+
+def _consume_incremental(f, input_path: str, processor: LogProcessor, follow: bool,
+                         checkpoint_path: Optional[str], idle_timeout: Optional[float]) -> None:
+    """Read the buffer by byte offset, following growth and saving checkpoints"""
+    offset, line_num = 0, 0
+    if checkpoint_path:
+        offset, line_num = load_checkpoint(checkpoint_path, input_path)
+        if offset:
+            log.info("[Consumer] Resuming %s at byte %d (line %d)", input_path, offset, line_num)
+    
+    def checkpoint(at_offset: int) -> None:
+        # Alerts up to the offset must be on disk before the offset is recorded
+        processor.sink.flush()
+        processor.report_lag(os.fstat(f.fileno()).st_size - at_offset)
+        if checkpoint_path:
+            save_checkpoint(checkpoint_path, input_path, at_offset, line_num)
+    
+    def restart() -> None:
+        nonlocal line_num
+        line_num = 0
+    
+    # A checkpointed run leaves an unterminated last line to the next run instead of
+    # recording an offset past a record the producer may still be writing
+    watcher = make_watcher(input_path) if follow else None
+    try:
+        for offset, line in tail_lines(f, offset, follow, watcher, idle_timeout, on_idle=checkpoint,
+                                       on_truncate=restart, hold_partial=bool(checkpoint_path)):
+            line_num += 1
+            processor.process_line(line, line_num)
+            if line_num % CHECKPOINT_EVERY == 0:
+                checkpoint(offset)
+    except KeyboardInterrupt:
+        log.info("\n[Consumer] Interrupted, finishing up")
+    finally:
+        if watcher is not None:
+            watcher.close()
+    checkpoint(offset)
+
+def _consume_msgpack(f, processor: LogProcessor) -> None:
+    """Process every record of a memory-mapped msgpack buffer"""
+    record_num = 0
+    for batch in iter_msgpack_batches(f):
+        for record in batch:
+            record_num += 1
+            processor.process_record(record, record_num)
+
+def _consume_segments(directory: str, processor: LogProcessor, workers: int, finished: str) -> None:
+    """Process the pending segments of a segmented buffer in order, then keep, delete or archive each"""
+    paths = pending_segments(directory)
+    log.info("[Consumer] Processing %d segments%s", len(paths), f" with {workers} workers" if workers > 1 else "")
+    if workers > 1:
+        line_base = 0
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for path, result in zip(paths, executor.map(_process_segment, paths)):
+                _merge_results(processor, line_base, result)
+                line_base += result[0]
+                processor.progress()
+                # A segment's alerts must be on disk before the segment goes
+                processor.sink.flush()
+                finish_segment(path, finished)
+        return
+    
+    line_num = 0
+    for path in paths:
+        with open_compressed(path) as f:
+            for line in processor.lines(f):
+                line_num += 1
+                processor.process_line(line, line_num)
+        processor.sink.flush()
+        finish_segment(path, finished)
+
+def shard_ranges(path: str, shard_count: int) -> List[Tuple[int, int]]:
+    """Split a file into at most shard_count newline-aligned (start, end) byte ranges"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for index in range(1, shard_count):
+            target = size * index // shard_count
+            if target <= bounds[-1]:
+                continue
+            # Move to the start of the first line that begins at or after target
+            f.seek(target - 1)
+            f.readline()
+            position = f.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if start < end]
+
+def _process_shard(task: Tuple[str, int, int]) -> ShardResult:
+    """Worker: process one byte range"""
+    path, start, end = task
+    processor = _ShardProcessor()
+    line_count = 0
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start
+        for line in f:
+            line_count += 1
+            processor.process_line(line, line_count)
+            remaining -= len(line)
+            if remaining <= 0:
+                break
+    return processor.result(line_count)
+
+def _process_segment(path: str) -> ShardResult:
+    """Worker: process one whole (possibly compressed) segment, in the _process_shard result format"""
+    processor = _ShardProcessor()
+    line_count = 0
+    with open_compressed(path) as f:
+        for line in f:
+            line_count += 1
+            processor.process_line(line, line_count)
+    return processor.result(line_count)
+
+def _process_batch(records: List[Dict[str, Any]]) -> ShardResult:
+    """Worker: process one batch of decoded records, in the _process_shard result format"""
+    processor = _ShardProcessor()
+    for record_num, record in enumerate(records, 1):
+        processor.process_record(record, record_num)
+    return processor.result(len(records))
+
+def _merge_results(processor: LogProcessor, line_base: int, result: ShardResult, remote: bool = True) -> None:
+    """Apply one worker result to the main processor, rebasing line numbers
+    
+    Alerts and errors are replayed in line order, interleaved as a serial
+    run reports them. The verdict cache counters of a worker process
+    (remote) are added to this process's cache statistics; thread workers
+    share its cache and have been counted already.
+    """
+    _, processed, alerts, errors, cache = result
+    reports = heapq.merge(((row[0], True, row[1:]) for row in alerts),
+                          ((line_num, False, (kind, detail)) for kind, line_num, detail in errors),
+                          key=lambda report: report[0])
+    for line_num, is_alert, values in reports:
+        if is_alert:
+            processor.alert({field: value for field, value in zip(ALERT_FIELDS, values) if value is not None})
+        else:
+            kind, detail = values
+            processor.error(kind, line_base + line_num, detail)
+    processor.processed_count += processed
+    if remote:
+        get_verdict_cache().add_counters(*cache)
+
+def _consume_parallel(input_path: str, processor: LogProcessor, workers: int) -> None:
+    """Process shards in a process pool and merge their results in file order"""
+    size = os.path.getsize(input_path)
+    shard_count = max(workers * 4, -(-size // SHARD_BYTES))
+    tasks = [(input_path, start, end) for start, end in shard_ranges(input_path, shard_count)]
+    log.info("[Consumer] Processing %d shards with %d workers", len(tasks), workers)
+    
+    line_base = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(_process_shard, tasks):
+            _merge_results(processor, line_base, result)
+            line_base += result[0]
+            processor.progress()
+
+async def consume_queue_async(queue: asyncio.Queue, processor: LogProcessor,
+                              executor: Optional[Executor] = None, max_in_flight: int = 1) -> None:
+    """Process record batches from an asyncio queue until a None batch arrives
+    
+    Without an executor, detection runs on the event loop between batches.
+    With one (thread or process pool), up to max_in_flight batches are
+    checked concurrently off the loop; results are merged in queue order and
+    alerts are written to the sink from the loop.
+    """
+    loop = asyncio.get_running_loop()
+    pending: deque = deque()
+    record_base = 0
+    remote = isinstance(executor, ProcessPoolExecutor)
+    
+    async def merge_oldest() -> None:
+        nonlocal record_base
+        result = await pending.popleft()
+        reported = processor.processed_count // 100
+        _merge_results(processor, record_base, result, remote)
+        record_base += result[0]
+        if processor.processed_count // 100 > reported:
+            processor.progress()
+    
+    while True:
+        batch = await queue.get()
+        if batch is None:
+            break
+        
+        if executor is None:
+            for record_num, record in enumerate(batch, record_base + 1):
+                processor.process_record(record, record_num)
+            record_base += len(batch)
+            await asyncio.sleep(0)  # let the producer refill the queue
+            continue
+        
+        pending.append(loop.run_in_executor(executor, _process_batch, batch))
+        while len(pending) >= max_in_flight:
+            await merge_oldest()
+    
+    while pending:
+        await merge_oldest()
+
 if __name__ == "__main__":
-    input_file = sys.argv[1] if len(sys.argv) > 1 else "stream_buffer.jsonl"
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "alerts.json"
+    parser = argparse.ArgumentParser(description="Analyze a JSONL log buffer and generate alerts")
+    parser.add_argument("input_file", nargs="?", default="stream_buffer.jsonl")
+    parser.add_argument("output_file", nargs="?", default="alerts.json")
+    parser.add_argument("--follow", action="store_true", help="keep reading lines appended to the buffer")
+    parser.add_argument("--checkpoint", default=None, help="byte-offset checkpoint file to resume from")
+    parser.add_argument("--idle-timeout", type=float, default=None,
+                        help="with --follow, stop after this many seconds without new data")
+    parser.add_argument("--workers", type=int, default=1, help="process the buffer in parallel shards")
+    parser.add_argument("--format", choices=BUFFER_FORMATS, default="jsonl", help="buffer format to read")
+    parser.add_argument("--start", default=None, help="only process events from this UtcTime (uses the .idx index)")
+    parser.add_argument("--end", default=None, help="only process events before this UtcTime")
+    parser.add_argument("--finished-segments", choices=SEGMENT_ACTIONS, default="keep",
+                        help="what to do with each processed segment of a segmented buffer directory")
+    parser.add_argument("--correlation-rules", default=None, help="JSON file of threshold/sequence correlation rules")
+    parser.add_argument("--allowed-lateness", type=float, default=0.0,
+                        help="seconds of UtcTime disorder tolerated by correlation windows")
+    parser.add_argument("--iocs", nargs="+", default=None,
+                        help="IOC feeds checked by the built-in detection: a compiled .ioc index or text feed files")
+    parser.add_argument("--rules", default=None,
+                        help="JSON/YAML detection rule file or directory, replacing the built-in detection")
+    parser.add_argument("--verdict-cache", type=int, default=None,
+                        help="entries in the pattern verdict cache (0 disables)")
+    parser.add_argument("--alerts-jsonl", default=None, help="append alerts to this JSONL file as they are found")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="seconds between JSONL alert flushes")
+    parser.add_argument("--fsync", choices=FSYNC_POLICIES, default="close", help="JSONL alert fsync policy")
+    parser.add_argument("--max-bytes", type=int, default=None, help="rotate the JSONL alert file at this size")
+    parser.add_argument("--suppress-ttl", type=float, default=None,
+                        help="collapse repeats of an alert within this many seconds into one alert with a count")
+    parser.add_argument("--no-export", action="store_true", help="do not write the pretty-printed alerts.json")
+    parser.add_argument("--metrics-file", default=None, help="write Prometheus text or JSON metrics to this file")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between metrics writes")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="info", help="console diagnostics level")
+    parser.add_argument("--quiet", action="store_true", help="only print warnings and errors")
+    parser.add_argument("--summary-interval", type=float, default=5.0, help="seconds between progress summary lines")
+    args = parser.parse_args()
     
-    print(f"[Consumer] Starting log analysis: {input_file} -> {output_file}")
-    consume_logs(input_file, output_file)
\ No newline at end of file
+    configure_diagnostics(args.log_level, args.quiet, summary_interval=args.summary_interval)
+    if args.verdict_cache is not None:
+        set_verdict_cache_size(args.verdict_cache)
+    correlator = None
+    if args.correlation_rules:
+        try:
+            correlator = CorrelationEngine(load_correlation_rules(args.correlation_rules), args.allowed_lateness)
+        except (OSError, ValueError, TypeError) as e:
+            log.error("[Consumer] Error loading correlation rules: %s", e)
+            sys.exit(1)
+    if args.iocs:
+        try:
+            iocs = load_iocs(args.iocs)
+        except (OSError, ValueError) as e:
+            log.error("[Consumer] Error loading IOC feeds: %s", e)
+            sys.exit(1)
+        log.info("[Consumer] Loaded %d indicators (%s)", len(iocs), ', '.join(iocs.categories))
+    rules = None
+    if args.rules:
+        try:
+            rules = RuleEngine.from_path(args.rules)
+        except RULE_LOAD_ERRORS as e:
+            log.error("[Consumer] Error loading detection rules: %s", e)
+            sys.exit(1)
+    
+    exporter = None
+    if args.metrics_file:
+        exporter = MetricsExporter(enable_metrics(), args.metrics_file, args.metrics_format,
+                                   args.metrics_interval).start()
+    
+    jsonl_sink = None
+    if args.alerts_jsonl:
+        jsonl_sink = JsonlAlertSink(args.alerts_jsonl, flush_interval=args.flush_interval,
+                                    fsync=args.fsync, max_bytes=args.max_bytes)
+    output_file = None if args.no_export else args.output_file
+    
+    log.info("[Consumer] Starting log analysis: %s -> %s", args.input_file, args.alerts_jsonl or output_file)
+    try:
+        consume_logs(args.input_file, output_file, args.follow, args.checkpoint, args.idle_timeout, jsonl_sink,
+                     args.workers, args.format, correlator, args.suppress_ttl, args.finished_segments,
+                     (args.start, args.end) if args.start or args.end else None, rules)
+    finally:
+        if exporter is not None:
+            exporter.stop()
@@ -0,0 +1,247 @@
+import json
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+from log_utils import utc_time_to_epoch
+
+MAX_KEYS = 100_000  # per rule; the least recently updated key is dropped beyond this
+RULE_TYPES = ("threshold", "sequence")
+
+def format_utc_time(epoch: float) -> str:
+    """Epoch seconds back to the Sysmon UtcTime format"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+class CorrelationRule:
+    """Base class for keyed, time-windowed rules
+    
+    State is kept per key in an OrderedDict ordered by last update, so keys
+    that have gone quiet sit at the front and are evicted in O(1) each once
+    the watermark passes their horizon.
+    """
+    
+    rule_type = ""
+    
+    def __init__(self, name: str, event_ids: Iterable[int], key: Union[str, Sequence[str]] = "Image",
+                 horizon: float = 60.0, max_keys: int = MAX_KEYS):
+        self.name = name
+        self.event_ids = frozenset(event_ids)
+        self.key_fields = (key,) if isinstance(key, str) else tuple(key)
+        self.horizon = horizon
+        self.max_keys = max_keys
+        self.states: "OrderedDict[Any, Any]" = OrderedDict()
+        self.dropped_keys = 0
+    
+    def key_of(self, event: Dict[str, Any]) -> Any:
+        if len(self.key_fields) == 1:
+            return event[self.key_fields[0]]
+        return tuple(event[field] for field in self.key_fields)
+    
+    def _touch(self, key: Any, state: Any) -> None:
+        """Store state as the most recently updated key, dropping the oldest beyond max_keys"""
+        self.states[key] = state
+        self.states.move_to_end(key)
+        if len(self.states) > self.max_keys:
+            self.states.popitem(last=False)
+            self.dropped_keys += 1
+    
+    def last_time(self, state: Any) -> float:
+        raise NotImplementedError
+    
+    def evict(self, watermark: float) -> int:
+        """Drop keys whose newest event is older than watermark - horizon"""
+        evicted = 0
+        cutoff = watermark - self.horizon
+        states = self.states
+        while states:
+            key = next(iter(states))
+            if self.last_time(states[key]) >= cutoff:
+                break
+            del states[key]
+            evicted += 1
+        return evicted
+    
+    def process(self, event: Dict[str, Any], event_time: float) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+    
+    def _alert(self, key: Any, event: Dict[str, Any], count: int, first_time: float,
+               last_time: float) -> Dict[str, Any]:
+        return {
+            "Rule": self.name,
+            "Type": self.rule_type,
+            "Key": key if isinstance(key, str) else list(key),
+            "Count": count,
+            "FirstTime": format_utc_time(first_time),
+            "LastTime": format_utc_time(last_time),
+            "EventID": event["EventID"],
+            "Image": event["Image"],
+            "ProcessName": event["ProcessName"],
+            "CommandLine": event["CommandLine"],
+        }
+
+class ThresholdRule(CorrelationRule):
+    """More than threshold events with one of event_ids for the same key within window seconds
+    
+    Sliding windows keep a ring buffer of the last threshold + 1 event times
+    per key, so memory per key is bounded by the threshold, not the rate.
+    With tumbling, fixed windows aligned to multiples of window keep a
+    single (window start, count) pair per key. A key's window is reset when
+    it fires.
+    """
+    
+    rule_type = "threshold"
+    
+    def __init__(self, name: str, event_ids: Iterable[int], key: Union[str, Sequence[str]] = "Image",
+                 threshold: int = 50, window: float = 60.0, tumbling: bool = False,
+                 max_keys: int = MAX_KEYS):
+        if threshold < 1 or window <= 0:
+            raise ValueError(f"Rule {name}: threshold must be >= 1 and window > 0")
+        super().__init__(name, event_ids, key, window, max_keys)
+        self.threshold = threshold
+        self.window = window
+        self.tumbling = tumbling
+    
+    def last_time(self, state: Any) -> float:
+        if self.tumbling:
+            return state[0] + self.window - 1e-9  # keep the key until its window closes
+        return state[-1]
+    
+    def process(self, event: Dict[str, Any], event_time: float) -> Optional[Dict[str, Any]]:
+        key = self.key_of(event)
+        state = self.states.get(key)
+        
+        if self.tumbling:
+            window_start = event_time - event_time % self.window
+            count = state[1] + 1 if state is not None and state[0] == window_start else 1
+            if count > self.threshold:
+                del self.states[key]
+                return self._alert(key, event, count, window_start, event_time)
+            self._touch(key, (window_start, count))
+            return None
+        
+        if state is None:
+            state = deque(maxlen=self.threshold + 1)
+        state.append(event_time)
+        if len(state) > self.threshold and event_time - state[0] <= self.window:
+            del self.states[key]
+            return self._alert(key, event, len(state), state[0], event_time)
+        self._touch(key, state)
+        return None
+
+class SequenceRule(CorrelationRule):
+    """Events with steps[0], steps[1], ... in order for the same key, all within `within` seconds
+    
+    One partial match is kept per key: a first-step event (re)starts it and
+    each following step advances it while the sequence is still inside the
+    time limit.
+    """
+    
+    rule_type = "sequence"
+    
+    def __init__(self, name: str, steps: Sequence[int], key: Union[str, Sequence[str]] = "Image",
+                 within: float = 5.0, max_keys: int = MAX_KEYS):
+        if len(steps) < 2 or within <= 0:
+            raise ValueError(f"Rule {name}: a sequence needs at least two steps and within > 0")
+        super().__init__(name, steps, key, within, max_keys)
+        self.steps = tuple(steps)
+        self.within = within
+    
+    def last_time(self, state: Any) -> float:
+        return state[1]  # started at; the partial match expires `within` after it
+    
+    def process(self, event: Dict[str, Any], event_time: float) -> Optional[Dict[str, Any]]:
+        key = self.key_of(event)
+        event_id = event["EventID"]
+        state = self.states.get(key)
+        
+        if state is not None:
+            next_step, started = state
+            if event_time - started > self.within:
+                del self.states[key]
+                state = None
+            elif event_id == self.steps[next_step]:
+                if next_step + 1 == len(self.steps):
+                    del self.states[key]
+                    return self._alert(key, event, len(self.steps), started, event_time)
+                self._touch(key, (next_step + 1, started))
+                return None
+        
+        if event_id == self.steps[0]:
+            self._touch(key, (1, event_time))
+        return None
+
+class CorrelationEngine:
+    """Run correlation rules over parsed events in UtcTime order
+    
+    Each relevant event's UtcTime is parsed once and shared by all rules.
+    The watermark trails the newest event time by allowed_lateness; events
+    older than the watermark are counted as late and skipped, and rule
+    state older than the watermark minus a rule's horizon is evicted, so
+    memory is bounded by active keys x window rather than stream length.
+    """
+    
+    def __init__(self, rules: Sequence[CorrelationRule], allowed_lateness: float = 0.0):
+        self.rules = list(rules)
+        self.allowed_lateness = allowed_lateness
+        self.watermark = float("-inf")
+        self.late_events = 0
+        self.evicted_keys = 0
+        self._by_event_id: Dict[int, List[CorrelationRule]] = {}
+        for rule in self.rules:
+            for event_id in rule.event_ids:
+                self._by_event_id.setdefault(event_id, []).append(rule)
+    
+    def process(self, event: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Feed one parsed event, returning the correlation alerts it completes"""
+        rules = self._by_event_id.get(event["EventID"])
+        if not rules:
+            return []
+        event_time = utc_time_to_epoch(event["UtcTime"])
+        if event_time is None:
+            return []
+        if event_time < self.watermark:
+            self.late_events += 1
+            return []
+        
+        watermark = event_time - self.allowed_lateness
+        if watermark > self.watermark:
+            self.watermark = watermark
+            for rule in self.rules:
+                if rule.states:
+                    self.evicted_keys += rule.evict(watermark)
+        
+        alerts = []
+        for rule in rules:
+            alert = rule.process(event, event_time)
+            if alert is not None:
+                alerts.append(alert)
+        return alerts
+    
+    def active_keys(self) -> int:
+        return sum(len(rule.states) for rule in self.rules)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active_keys": self.active_keys(),
+            "evicted_keys": self.evicted_keys,
+            "dropped_keys": sum(rule.dropped_keys for rule in self.rules),
+            "late_events": self.late_events,
+        }
+
+def build_rule(spec: Dict[str, Any]) -> CorrelationRule:
+    """Create a rule from a dict such as {"type": "threshold", "name": ..., "event_ids": [3], ...}"""
+    spec = dict(spec)
+    rule_type = spec.pop("type", None)
+    if rule_type == "threshold":
+        return ThresholdRule(**spec)
+    if rule_type == "sequence":
+        return SequenceRule(**spec)
+    raise ValueError(f"Unknown correlation rule type {rule_type!r}, expected one of {RULE_TYPES}")
+
+def load_correlation_rules(path: str) -> List[CorrelationRule]:
+    """Load a JSON list of rule specs"""
+    with open(path, 'r') as f:
+        specs = json.load(f)
+    if not isinstance(specs, list):
+        raise ValueError(f"{path} must contain a JSON list of correlation rules")
+    return [build_rule(spec) for spec in specs]
@@ -0,0 +1,255 @@
+import atexit
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from typing import Any, Dict, IO, List, Optional, Tuple
+
+LOG_LEVELS = ("debug", "info", "warning", "error")
+ROOT_LOGGER = "sysmon"
+QUEUE_LINES = 10_000  # lines waiting for the writer thread before new ones are dropped
+WRITE_BATCH = 1000  # lines written per flush of the output stream
+RATE_LIMIT = 10  # lines per message template per RATE_INTERVAL before repeats are suppressed
+RATE_INTERVAL = 1.0
+MAX_TEMPLATES = 1000  # rate-limit windows kept before expired ones are dropped
+SUMMARY_INTERVAL = 5.0  # seconds between periodic progress summaries
+UNLIMITED = {"rate_limited": False}  # extra= for lines that must never be suppressed (end-of-run summaries)
+
+class RateLimiter:
+    """At most limit lines per message template per interval seconds
+    
+    Lines are keyed on logger name and unformatted message, so callers pass
+    values as arguments (log.info("... %s", value)) instead of formatting
+    them first. admit() returns -1 for a line over the limit, which is
+    counted, and otherwise how many lines of that template were suppressed
+    since the last one let through. limit 0 turns limiting off.
+    """
+    
+    def __init__(self, limit: int = RATE_LIMIT, interval: float = RATE_INTERVAL):
+        self.limit = limit
+        self.interval = interval
+        self._windows: Dict[Tuple[str, Any], List[float]] = {}  # key -> [window start, passed, suppressed]
+    
+    def admit(self, key: Tuple[str, Any]) -> int:
+        if not self.limit:
+            return 0
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.interval:
+            if window is None and len(self._windows) >= MAX_TEMPLATES:
+                self._expire(now)
+            self._windows[key] = [now, 1, 0]
+            return int(window[2]) if window is not None else 0
+        if window[1] < self.limit:
+            window[1] += 1
+            return 0
+        window[2] += 1
+        return -1
+    
+    def _expire(self, now: float) -> None:
+        """Drop windows that have closed; unreported counts of those are lost"""
+        self._windows = {key: window for key, window in self._windows.items() if now - window[0] < self.interval}
+    
+    def pending(self) -> List[Tuple[str, int]]:
+        """(template, count) of repeats suppressed and not yet reported"""
+        return [(str(msg), int(window[2])) for (_, msg), window in self._windows.items() if window[2]]
+    
+    def reset(self) -> None:
+        self._windows = {}
+
+class DiagnosticsLogger(logging.LoggerAdapter):
+    """Logger front end that rate-limits lines before a LogRecord is built
+    
+    A line below the logger's level or over the rate limit costs a level
+    check and a dict lookup. Lines logged with extra=UNLIMITED are never
+    suppressed. A line let through after suppressed repeats of its template
+    carries the count, which QueueWriter appends.
+    """
+    
+    def log(self, level: int, msg: Any, *args: Any, **kwargs: Any) -> None:
+        if not self.logger.isEnabledFor(level):
+            return
+        extra = kwargs.get("extra")
+        if extra is None or extra.get("rate_limited", True):
+            suppressed = _limiter.admit((self.logger.name, msg))
+            if suppressed < 0:
+                return
+            if suppressed:
+                kwargs["extra"] = {**(extra or {}), "suppressed": suppressed}
+        self.logger.log(level, msg, *args, **kwargs)
+
+class QueueWriter(logging.Handler):
+    """Handler that formats records in the caller and writes them from a background thread
+    
+    emit never waits on the output: lines go onto a bounded queue, and when
+    the queue is full (a stalled pipe or terminal) they are dropped and
+    counted. The writer thread writes and flushes lines in batches. The
+    target stream is looked up when a record is logged (sys.stdout unless
+    stream is set), so redirect_stdout and test capture keep working. A
+    forked child starts its own writer on first use.
+    """
+    
+    def __init__(self, stream: Optional[IO[str]] = None, maxsize: int = QUEUE_LINES):
+        super().__init__()
+        self.stream = stream
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Tuple[IO[str], str]]]" = queue.Queue(maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            text = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += f" ({suppressed} similar messages suppressed)"
+        self.write_line(text)
+    
+    def write_line(self, text: str, stream: Optional[IO[str]] = None) -> None:
+        """Queue one line for the writer thread, or count it as dropped when the queue is full"""
+        if self._pid != os.getpid():
+            self._start()
+        try:
+            self._queue.put_nowait((stream or self.stream or sys.stdout, text))
+        except queue.Full:
+            self.dropped += 1
+    
+    def _start(self) -> None:
+        self._pid = os.getpid()
+        self._queue = queue.Queue(self.maxsize)  # lines queued in a parent have no writer here
+        self._thread = threading.Thread(target=self._run, name="diagnostics-writer", daemon=True)
+        self._thread.start()
+    
+    def _run(self) -> None:
+        lines = self._queue
+        while True:
+            batch = [lines.get()]
+            try:
+                while len(batch) < WRITE_BATCH:
+                    batch.append(lines.get_nowait())
+            except queue.Empty:
+                pass
+            
+            streams: Dict[int, IO[str]] = {}
+            stop = False
+            for entry in batch:
+                if entry is None:
+                    stop = True
+                    continue
+                stream, text = entry
+                try:
+                    stream.write(text + "\n")
+                    streams[id(stream)] = stream
+                except (OSError, ValueError):  # closed or broken stream
+                    pass
+            for stream in streams.values():
+                try:
+                    stream.flush()
+                except (OSError, ValueError):
+                    pass
+            for _ in batch:
+                lines.task_done()
+            if stop:
+                return
+    
+    def flush(self, timeout: float = 5.0) -> None:
+        """Wait up to timeout seconds for the queued lines to be written"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and self._thread.is_alive() and time.monotonic() < deadline:
+            time.sleep(0.001)
+    
+    def close(self) -> None:
+        """Write what is queued and stop the writer thread"""
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self.flush()
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+            self._thread.join(timeout=1.0)
+        self._thread = None
+        self._pid = None
+        super().close()
+
+class Progress:
+    """Time gate for periodic summary lines
+    
+    check(count) is called as often as convenient (every record or batch)
+    and returns the rate since the previous summary once interval seconds
+    have passed, None otherwise.
+    """
+    
+    def __init__(self, interval: Optional[float] = None):
+        self.interval = _summary_interval if interval is None else interval
+        self._last = time.monotonic()
+        self._count = 0
+    
+    def check(self, count: int) -> Optional[float]:
+        now = time.monotonic()
+        elapsed = now - self._last
+        if elapsed < self.interval:
+            return None
+        rate = (count - self._count) / elapsed
+        self._last, self._count = now, count
+        return rate
+
+# Output shared by the producer, consumer and utilities; set up on first use
+_handler: Optional[QueueWriter] = None
+_limiter = RateLimiter()
+_summary_interval = SUMMARY_INTERVAL
+
+def configure_diagnostics(level: str = "info", quiet: bool = False, rate_limit: int = RATE_LIMIT,
+                          rate_interval: float = RATE_INTERVAL, summary_interval: float = SUMMARY_INTERVAL,
+                          stream: Optional[IO[str]] = None) -> None:
+    """Set the level, rate limit and summary interval of diagnostics output
+    
+    quiet keeps only warnings and errors. rate_limit lines per message
+    template are written per rate_interval seconds (0 writes every line).
+    Progress summaries are due every summary_interval seconds. stream
+    replaces sys.stdout as the output.
+    """
+    global _handler, _limiter, _summary_interval
+    if level not in LOG_LEVELS:
+        raise ValueError(f"Unknown log level {level!r}, expected one of {LOG_LEVELS}")
+    root = logging.getLogger(ROOT_LOGGER)
+    if _handler is None:
+        _handler = QueueWriter()
+        _handler.setFormatter(logging.Formatter("%(message)s"))
+        root.addHandler(_handler)
+        root.propagate = False
+        atexit.register(shutdown_diagnostics)
+    _limiter = RateLimiter(rate_limit, rate_interval)
+    _handler.stream = stream
+    root.setLevel(logging.WARNING if quiet else getattr(logging, level.upper()))
+    _summary_interval = summary_interval
+
+def get_logger(component: str) -> DiagnosticsLogger:
+    """Logger for one component ("producer", "consumer", ...), setting up default output on first use"""
+    if _handler is None:
+        configure_diagnostics()
+    return DiagnosticsLogger(logging.getLogger(f"{ROOT_LOGGER}.{component}"), {})
+
+def flush_diagnostics(timeout: float = 5.0) -> None:
+    """Wait for queued diagnostics to be written (before writing to stdout directly)"""
+    if _handler is not None:
+        _handler.flush(timeout)
+
+def shutdown_diagnostics() -> None:
+    """Report suppressed and dropped lines on stderr, then drain and stop the writer (runs at exit)"""
+    if _handler is None:
+        return
+    for template, count in _limiter.pending():
+        _handler.write_line(f"[Diagnostics] {count} more lines like {template!r} suppressed", sys.stderr)
+    _limiter.reset()
+    if _handler.dropped:
+        _handler.write_line(f"[Diagnostics] {_handler.dropped} lines dropped while output was blocked", sys.stderr)
+        _handler.dropped = 0
+    _handler.close()
@@ -0,0 +1,176 @@
+import glob
+import heapq
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from log_utils import SOURCE_FIELD, utc_times_to_epoch
+
+SOURCE_SUFFIXES = (".csv", ".csv.gz", ".csv.zst", ".csv.bz2", ".csv.xz")
+
+ChunkReader = Callable[[str, int], Iterator[pd.DataFrame]]
+
+def source_host(path: str) -> str:
+    """Host name of a per-host export: the file name up to its first dot (HOST01.csv.gz -> HOST01)"""
+    return os.path.basename(path).split(".", 1)[0]
+
+def _split_source(spec: str) -> Tuple[str, str]:
+    """(host, path) of an input; an existing path is never split, even if it contains '='"""
+    if os.path.exists(spec):
+        return "", spec
+    host, _, path = spec.rpartition("=")
+    return host, path
+
+def _is_pattern(path: str) -> bool:
+    """Whether path is a glob pattern rather than an existing file whose name has [ or *"""
+    return glob.has_magic(path) and not os.path.exists(path)
+
+def is_fan_in(inputs: Iterable[str]) -> bool:
+    """Whether inputs need the fan-in path: several paths, a directory, a glob pattern or a host= tag"""
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs)
+    if len(inputs) != 1:
+        return True
+    host, path = _split_source(inputs[0])
+    return bool(host) or os.path.isdir(path) or _is_pattern(path)
+
+def expand_sources(inputs: Iterable[str]) -> List[Tuple[str, str]]:
+    """(host, path) for every export named by inputs, in a stable order
+    
+    An input is a file, a directory (its CSV exports, compressed or not) or
+    a glob pattern. host=input tags every file it names with that host;
+    otherwise each file's host comes from its name (see source_host).
+    """
+    sources = []
+    for spec in [inputs] if isinstance(inputs, str) else inputs:
+        host, path = _split_source(spec)
+        if os.path.isdir(path):
+            paths = sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(SOURCE_SUFFIXES))
+        elif _is_pattern(path):
+            paths = sorted(glob.glob(path))
+        else:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"Input file not found: {path}")
+            paths = [path]
+        if not paths:
+            raise FileNotFoundError(f"No input files match {path}")
+        sources.extend((host or source_host(file_path), file_path) for file_path in paths)
+    return sources
+
+class _Source:
+    """One export being merged: its chunk reader and the current time-sorted chunk"""
+    
+    def __init__(self, order: int, host: str, path: str, chunks: Iterator[pd.DataFrame]):
+        self.order = order
+        self.host = host
+        self.path = path
+        self.chunks = chunks
+        self.frame: Optional[pd.DataFrame] = None
+        self.times: Optional[np.ndarray] = None
+        self.position = 0
+        self.pending: Optional[Future] = None
+        self.carry = float("-inf")  # time of the last record read, for records without a usable UtcTime
+    
+    def read_next(self) -> Optional[Tuple[pd.DataFrame, np.ndarray]]:
+        """Read, tag and time-sort the next chunk (runs on a reader thread, one call per source at a time)"""
+        for chunk in self.chunks:
+            if chunk.empty:
+                continue
+            if "UtcTime" in chunk.columns:
+                times = utc_times_to_epoch(chunk["UtcTime"])
+            else:
+                times = np.full(len(chunk), np.nan)
+            # Records without a usable UtcTime take the time of the record before them
+            times = pd.Series(times).ffill().fillna(self.carry).to_numpy()
+            self.carry = times[-1]
+            order = np.argsort(times, kind="stable")  # exports are nearly sorted; this fixes local jitter
+            frame = chunk.iloc[order] if (order[1:] < order[:-1]).any() else chunk
+            frame = frame.assign(**{SOURCE_FIELD: self.host})
+            return frame, times[order]
+        return None
+
+class MergeStats:
+    """Counters of a fan-in merge"""
+    
+    def __init__(self, sources: int):
+        self.sources = sources
+        self.records = 0
+        self.batches = 0
+        self.out_of_order = 0  # records older than ones already emitted (unsorted exports)
+
+def merge_sources(sources: List[Tuple[str, str]], read_chunks: ChunkReader, chunksize: int,
+                  workers: Optional[int] = None, stats: Optional[MergeStats] = None) -> Iterator[pd.DataFrame]:
+    """Merge per-host exports into one stream of UtcTime-ordered DataFrame batches
+    
+    A k-way merge over chunks: every source holds one time-sorted chunk,
+    and a heap keyed on the time of each chunk's last record gives the
+    bound up to which every source's records can be released. Each step
+    takes the records at or before that bound from all sources, orders them
+    with one stable sort (ties keep source order) and yields them as a
+    batch. The source whose chunk set the bound then moves to its next
+    chunk. Memory is bounded by sources x 2 chunks, not by the input size.
+    
+    Chunks are read, parsed and sorted on a pool of workers threads (pandas'
+    CSV tokenizer and gzip release the GIL), one chunk ahead of the merge for
+    each source, so reading overlaps merging across cores and disks. Each
+    batch carries a SourceHost column. Every export is assumed to be in
+    UtcTime order apart from jitter within a chunk; records older than ones
+    already released are emitted where they are found and counted in
+    stats.out_of_order.
+    """
+    if workers is None:
+        workers = min(len(sources), os.cpu_count() or 1)
+    stats = stats if stats is not None else MergeStats(len(sources))
+    
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        streams = [_Source(order, host, path, read_chunks(path, chunksize))
+                   for order, (host, path) in enumerate(sources)]
+        heap: List[Tuple[float, int]] = []
+        released = float("-inf")
+        
+        def advance(source: _Source) -> None:
+            result = source.pending.result()
+            if result is None:
+                source.frame = source.times = None
+                return
+            source.frame, source.times = result
+            source.position = 0
+            stats.out_of_order += int(np.searchsorted(source.times, released, side="left"))
+            source.pending = pool.submit(source.read_next)  # prefetch while this chunk is merged
+            heapq.heappush(heap, (source.times[-1], source.order))
+        
+        try:
+            for source in streams:
+                source.pending = pool.submit(source.read_next)
+            for source in streams:
+                advance(source)
+            
+            while heap:
+                bound, order = heapq.heappop(heap)
+                frames, times = [], []
+                for source in streams:
+                    if source.frame is None or source.position == len(source.times):
+                        continue
+                    end = source.position + int(np.searchsorted(source.times[source.position:], bound, side="right"))
+                    if end > source.position:
+                        frames.append(source.frame.iloc[source.position:end])
+                        times.append(source.times[source.position:end])
+                        source.position = end
+                
+                if frames:
+                    if len(frames) == 1:
+                        batch = frames[0]
+                    else:
+                        batch = pd.concat(frames, ignore_index=True)
+                        batch = batch.iloc[np.argsort(np.concatenate(times), kind="stable")]
+                    released = max(released, bound)
+                    stats.records += len(batch)
+                    stats.batches += 1
+                    yield batch
+                advance(streams[order])  # its chunk has been released up to its last record
+        finally:
+            for source in streams:
+                if source.pending is not None:
+                    source.pending.cancel()
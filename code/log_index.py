@@ -0,0 +1,305 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+from bisect import bisect_left, bisect_right
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+import log_codec
+from log_utils import parse_log_line, is_suspicious, utc_time_to_epoch
+from log_diagnostics import get_logger
+
+BUCKET_SECONDS = 60
+READ_SIZE = 1 << 20  # bytes read per block while indexing
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 2
+FINGERPRINT_BYTES = 4096  # hashed at each end of the indexed bytes to recognise the same buffer
+
+log = get_logger("index")
+
+# "UtcTime": "..." in a raw JSONL line, with or without the space json.dumps adds
+_UTC_TIME = re.compile(rb'"UtcTime": ?"([^"]*)"')
+
+class _EpochParser:
+    """Raw UtcTime bytes to epoch seconds, parsing the date and time of day once per distinct second"""
+    
+    def __init__(self):
+        self._prefix = None
+        self._second: Optional[float] = None
+    
+    def __call__(self, value: bytes) -> Optional[float]:
+        prefix = value[:19]  # b"2024-01-15 09:30:15"
+        if prefix != self._prefix:
+            self._prefix = prefix
+            self._second = utc_time_to_epoch(prefix.decode("utf-8", "replace"))
+        if self._second is not None:
+            rest = value[19:]
+            if not rest:
+                return self._second
+            if rest[:1] == b"." and rest[1:].isdigit():
+                return self._second + float(rest)
+        return utc_time_to_epoch(value.decode("utf-8", "replace"))  # time zones and other ISO forms
+
+def line_time(line: bytes, parser: _EpochParser) -> Optional[float]:
+    """Epoch seconds of a raw JSONL line's UtcTime without decoding the line"""
+    match = _UTC_TIME.search(line)
+    if match is None:
+        return None
+    return parser(match.group(1))
+
+class TimeIndex:
+    """Sparse index from UtcTime buckets to byte offsets in a JSONL buffer
+    
+    entries holds (bucket start, byte offset, line number) for the first line
+    at which the newest time seen so far reaches a bucket: every event of
+    that bucket or later starts at or after the offset. max_lag is the
+    furthest any event fell behind the newest one before it, so a reader
+    can stop once lines are max_lag past the end of its range. The index
+    covers the first size bytes; add_block extends it as the buffer grows.
+    fingerprint and mtime_ns (see stamp) tell whether those bytes are still
+    the ones that were indexed.
+    """
+    
+    def __init__(self, bucket_seconds: int = BUCKET_SECONDS):
+        self.bucket_seconds = bucket_seconds
+        self.buckets: List[int] = []
+        self.offsets: List[int] = []
+        self.line_nums: List[int] = []
+        self.max_lag = 0.0
+        self.size = 0
+        self.lines = 0
+        self.inode: Optional[int] = None
+        self.fingerprint: Optional[str] = None
+        self.mtime_ns: Optional[int] = None
+        self._newest: Optional[float] = None
+        self._parser = _EpochParser()
+    
+    def add_block(self, block: bytes) -> None:
+        """Account for a block of whole lines appended to the buffer
+        
+        UtcTimes are found with one regex scan over the block; line offsets
+        and numbers are only worked out for the few lines that start a bucket.
+        """
+        parser = self._parser
+        width = self.bucket_seconds
+        newest = self._newest
+        line_num, counted_to = self.lines, 0
+        for match in _UTC_TIME.finditer(block):
+            event_time = parser(match.group(1))
+            if event_time is None:
+                continue
+            if newest is None or event_time > newest:
+                bucket = int(event_time // width) * width
+                if not self.buckets or bucket > self.buckets[-1]:
+                    line_start = block.rfind(b"\n", 0, match.start()) + 1
+                    line_num += block.count(b"\n", counted_to, line_start)
+                    counted_to = line_start
+                    self.buckets.append(bucket)
+                    self.offsets.append(self.size + line_start)
+                    self.line_nums.append(line_num)
+                newest = event_time
+            elif newest - event_time > self.max_lag:
+                self.max_lag = newest - event_time
+        self._newest = newest
+        self.size += len(block)
+        self.lines += block.count(b"\n")
+    
+    def stamp(self, buffer_path: str) -> None:
+        """Record the identity of the indexed buffer: inode, content fingerprint and modification time"""
+        stat = os.stat(buffer_path)
+        with open(buffer_path, 'rb') as f:
+            self.fingerprint = buffer_fingerprint(f, self.size)
+        self.inode, self.mtime_ns = stat.st_ino, stat.st_mtime_ns
+    
+    def matches(self, buffer_path: str) -> bool:
+        """Whether buffer_path still holds the indexed bytes, possibly followed by more
+        
+        The inode alone is not enough: the producer truncates and rewrites the
+        buffer in place. An unchanged size must also keep its modification
+        time, and the first and last FINGERPRINT_BYTES of the indexed part
+        must hash the same.
+        """
+        stat = os.stat(buffer_path)
+        if self.inode != stat.st_ino or self.size > stat.st_size or self.fingerprint is None:
+            return False
+        if self.size == stat.st_size and self.mtime_ns != stat.st_mtime_ns:
+            return False
+        with open(buffer_path, 'rb') as f:
+            return buffer_fingerprint(f, self.size) == self.fingerprint
+    
+    def seek_range(self, start: float, end: float) -> Tuple[int, int, Optional[int]]:
+        """(offset, line number) to read from for [start, end), and the offset past which no event can match"""
+        position = bisect_right(self.buckets, start) - 1
+        if position < 0:
+            offset, line_num = 0, 0
+        else:
+            offset, line_num = self.offsets[position], self.line_nums[position]
+        # Every event is within max_lag of the newest time before it, so once
+        # that passes end + max_lag no later line can fall inside the range
+        stop = bisect_left(self.buckets, end + self.max_lag)
+        stop_offset = self.offsets[stop] if stop < len(self.offsets) else None
+        return offset, line_num, stop_offset
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": INDEX_VERSION,
+            "bucket_seconds": self.bucket_seconds,
+            "size": self.size,
+            "lines": self.lines,
+            "inode": self.inode,
+            "fingerprint": self.fingerprint,
+            "mtime_ns": self.mtime_ns,
+            "max_lag": self.max_lag,
+            "newest": self._newest,
+            "entries": [list(entry) for entry in zip(self.buckets, self.offsets, self.line_nums)],
+        }
+    
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "TimeIndex":
+        if state.get("version") != INDEX_VERSION:
+            raise ValueError(f"Unsupported index version {state.get('version')!r}")
+        index = cls(state["bucket_seconds"])
+        for bucket, offset, line_num in state["entries"]:
+            index.buckets.append(bucket)
+            index.offsets.append(offset)
+            index.line_nums.append(line_num)
+        index.size = state["size"]
+        index.lines = state["lines"]
+        index.inode = state.get("inode")
+        index.fingerprint = state.get("fingerprint")
+        index.mtime_ns = state.get("mtime_ns")
+        index.max_lag = state["max_lag"]
+        index._newest = state.get("newest")
+        return index
+    
+    def save(self, path: str) -> None:
+        """Atomically write the index to path"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+def buffer_fingerprint(f: BinaryIO, size: int) -> str:
+    """Hash of the first and last FINGERPRINT_BYTES of a buffer's first size bytes"""
+    digest = hashlib.blake2b(digest_size=16)
+    f.seek(0)
+    digest.update(f.read(min(size, FINGERPRINT_BYTES)))
+    if size > FINGERPRINT_BYTES:
+        tail_start = max(FINGERPRINT_BYTES, size - FINGERPRINT_BYTES)
+        f.seek(tail_start)
+        digest.update(f.read(size - tail_start))
+    return digest.hexdigest()
+
+def index_path_for(buffer_path: str) -> str:
+    return buffer_path + INDEX_SUFFIX
+
+def build_index(buffer_path: str, index_path: Optional[str] = None,
+                bucket_seconds: Optional[int] = None) -> TimeIndex:
+    """Index a buffer, extending an existing sidecar index when the buffer has only grown
+    
+    An index built for other contents (see TimeIndex.matches) is rebuilt.
+    bucket_seconds defaults to the existing index's, or BUCKET_SECONDS for a
+    new one; asking for a different size rebuilds the index.
+    """
+    index_path = index_path or index_path_for(buffer_path)
+    stat = os.stat(buffer_path)
+    index = None
+    if os.path.exists(index_path):
+        try:
+            with open(index_path, 'r') as f:
+                index = TimeIndex.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError) as e:
+            log.warning("[Index] Warning: Rebuilding unreadable index %s: %s", index_path, e)
+        if index is not None and (bucket_seconds not in (None, index.bucket_seconds)
+                                  or not index.matches(buffer_path)):
+            index = None  # the buffer was replaced, truncated or rewritten
+    if index is None:
+        index = TimeIndex(bucket_seconds or BUCKET_SECONDS)
+    
+    if index.size < stat.st_size or index.fingerprint is None:
+        with open(buffer_path, 'rb') as f:
+            f.seek(index.size)
+            tail = b""
+            while True:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                data = tail + data
+                end = data.rfind(b"\n") + 1
+                tail = data[end:]  # a partial line, possibly still being written
+                if end:
+                    index.add_block(data[:end])
+        index.stamp(buffer_path)
+        index.save(index_path)
+    return index
+
+def iter_range_lines(f: BinaryIO, index: TimeIndex, start: float,
+                     end: float) -> Iterator[Tuple[int, bytes]]:
+    """Yield (line number, raw line) for the lines of an open buffer with start <= UtcTime < end"""
+    offset, line_num, stop_offset = index.seek_range(start, end)
+    parser = _EpochParser()
+    f.seek(offset)
+    position = offset
+    for line in f:
+        if stop_offset is not None and position >= stop_offset:
+            break
+        position += len(line)
+        line_num += 1
+        event_time = line_time(line, parser)
+        if event_time is not None and start <= event_time < end:
+            yield line_num, line
+
+def _epoch(value: str) -> float:
+    epoch = utc_time_to_epoch(value)
+    if epoch is None:
+        raise ValueError(f"Not a UtcTime: {value!r}")
+    return epoch
+
+def query_time_range(buffer_path: str, start: str, end: str,
+                     index_path: Optional[str] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, parsed event) for events with start <= UtcTime < end
+    
+    The sidecar index is built or brought up to date first, then only the
+    lines inside the range are decoded and parsed.
+    """
+    start_epoch, end_epoch = _epoch(start), _epoch(end)
+    index = build_index(buffer_path, index_path)
+    with open(buffer_path, 'rb') as f:
+        for line_num, line in iter_range_lines(f, index, start_epoch, end_epoch):
+            try:
+                yield line_num, parse_log_line(log_codec.loads(line))
+            except log_codec.DecodeError as e:
+                log.warning("[Index] JSON decode error at line %d: %s", line_num, e)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a sparse UtcTime index for a JSONL buffer and query time ranges")
+    parser.add_argument("command", choices=("build", "query"))
+    parser.add_argument("buffer_file", nargs="?", default="stream_buffer.jsonl")
+    parser.add_argument("--index", default=None, help=f"index file (default: buffer_file{INDEX_SUFFIX})")
+    parser.add_argument("--bucket-seconds", type=int, default=None,
+                        help=f"index granularity (default {BUCKET_SECONDS})")
+    parser.add_argument("--start", default=None, help='first UtcTime, e.g. "2024-01-15 09:30:00"')
+    parser.add_argument("--end", default=None, help="UtcTime to stop before")
+    parser.add_argument("--suspicious", action="store_true", help="only print events is_suspicious flags")
+    args = parser.parse_args()
+    
+    try:
+        if args.command == "build":
+            index = build_index(args.buffer_file, args.index, args.bucket_seconds)
+            print(f"[Index] Indexed {index.lines} lines in {len(index.buckets)} buckets of {index.bucket_seconds}s "
+                  f"(max lag {index.max_lag:.3f}s) -> {args.index or index_path_for(args.buffer_file)}")
+        else:
+            if not args.start or not args.end:
+                parser.error("query needs --start and --end")
+            count = 0
+            for _, event in query_time_range(args.buffer_file, args.start, args.end, args.index):
+                if args.suspicious and not is_suspicious(event):
+                    continue
+                sys.stdout.buffer.write(log_codec.dumps_line(event.to_dict()))
+                count += 1
+            print(f"[Index] {count} events between {args.start} and {args.end}", file=sys.stderr)
+    except (OSError, ValueError) as e:
+        print(f"[Index] Error: {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,627 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import re
+import socket
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+import log_codec
+from log_consumer import LogProcessor, consume_queue_async, make_processor, print_summary
+from log_correlation import CorrelationEngine, load_correlation_rules
+from log_metrics import MetricsExporter, METRICS_FORMATS, enable_metrics, get_registry
+from log_pipeline import run_until_failure
+from log_rules import RULE_LOAD_ERRORS, RuleEngine
+from log_sinks import AlertSink, JsonlAlertSink, build_sink
+from log_utils import SOURCE_FIELD, load_iocs
+from log_diagnostics import LOG_LEVELS, UNLIMITED, configure_diagnostics, flush_diagnostics, get_logger
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 5514
+BATCH_SIZE = 1000  # decoded records handed to detection at once
+FLUSH_INTERVAL = 0.05  # seconds before a partial batch is handed over anyway
+QUEUE_BATCHES = 8  # batches waiting for detection before TCP readers pause
+MAX_CONNECTIONS = 256
+MAX_FRAME_BYTES = 64 << 10  # longest event line or syslog frame accepted
+READ_SIZE = 256 << 10  # bytes read from a connection at a time
+UDP_RECEIVE_BUFFER = 8 << 20  # socket buffer requested for UDP bursts (capped by net.core.rmem_max)
+UDP_READS_PER_WAKEUP = 1024  # datagrams drained per readiness callback before yielding to the loop
+FRAMINGS = ("json", "syslog", "octet")  # load generator message formats
+LOAD_PROTOCOLS = ("tcp", "udp")
+
+log = get_logger("listener")
+
+# Hostname of a syslog header: RFC 5424 (<PRI>1 TIMESTAMP HOST ...) or RFC 3164 (<PRI>Mmm dd hh:mm:ss HOST ...)
+_SYSLOG_5424_HOST = re.compile(rb"<\d{1,3}>\d{1,2} \S+ (\S+) ")
+_SYSLOG_3164_HOST = re.compile(rb"<\d{1,3}>[A-Z][a-z]{2} [ \d]\d \d\d:\d\d:\d\d (\S+) ")
+_DIGITS = frozenset(b"0123456789")
+
+def decode_message(message: bytes) -> Dict[str, Any]:
+    """Decode one event: a JSON object, or a syslog message with a JSON payload
+    
+    Syslog messages (RFC 3164 or 5424 header) are tagged with the sending
+    host as SourceHost unless the payload already carries one.
+    """
+    message = message.strip()
+    if message[:1] != b"<":
+        return log_codec.loads(message)
+    start = message.find(b"{")
+    if start < 0:
+        raise ValueError("syslog message has no JSON payload")
+    record = log_codec.loads(message[start:])
+    if isinstance(record, dict) and SOURCE_FIELD not in record:
+        header = _SYSLOG_5424_HOST.match(message) or _SYSLOG_3164_HOST.match(message)
+        if header is not None and header.end() <= start:
+            record[SOURCE_FIELD] = header.group(1).decode("utf-8", "replace")
+    return record
+
+class FrameReader:
+    """Per-connection buffer splitting a TCP byte stream into messages
+    
+    The framing is taken from the first byte (RFC 6587): a digit starts
+    octet counting ("LEN message"), anything else newline-delimited
+    messages. The unconsumed tail is kept between reads; a frame longer than
+    max_frame_bytes raises ValueError so the connection can be dropped
+    instead of buffering without bound.
+    """
+    
+    def __init__(self, max_frame_bytes: int = MAX_FRAME_BYTES):
+        self.max_frame_bytes = max_frame_bytes
+        self.buffer = bytearray()
+        self.octet_counted: Optional[bool] = None
+    
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add received bytes and return the complete messages in them"""
+        buffer = self.buffer
+        buffer += data
+        if self.octet_counted is None:
+            stripped = buffer.lstrip()
+            if not stripped:
+                return []
+            self.octet_counted = stripped[0] in _DIGITS
+        if self.octet_counted:
+            return self._split_octet_counted()
+        
+        end = buffer.rfind(b"\n") + 1
+        if not end:
+            if len(buffer) > self.max_frame_bytes:
+                raise ValueError(f"message exceeds {self.max_frame_bytes} bytes")
+            return []
+        messages = bytes(buffer[:end]).split(b"\n")
+        del buffer[:end]
+        if len(buffer) > self.max_frame_bytes:
+            raise ValueError(f"message exceeds {self.max_frame_bytes} bytes")
+        return [message for message in messages if message.strip()]
+    
+    def _split_octet_counted(self) -> List[bytes]:
+        buffer = self.buffer
+        messages = []
+        position = 0
+        while True:
+            # Separators between frames (some senders add a newline) are skipped
+            while position < len(buffer) and buffer[position] in b" \r\n":
+                position += 1
+            space = buffer.find(b" ", position, position + 12)
+            if space < 0:
+                if len(buffer) - position >= 12:
+                    raise ValueError("bad octet count in syslog frame")
+                break
+            try:
+                length = int(buffer[position:space])
+            except ValueError:
+                raise ValueError("bad octet count in syslog frame") from None
+            if length > self.max_frame_bytes:
+                raise ValueError(f"message exceeds {self.max_frame_bytes} bytes")
+            end = space + 1 + length
+            if end > len(buffer):
+                break
+            messages.append(bytes(buffer[space + 1:end]))
+            position = end
+        del buffer[:position]
+        return messages
+    
+    def finish(self) -> List[bytes]:
+        """The tail left when the stream ends: a last message without its newline
+        
+        An incomplete octet-counted frame is returned as well; it fails to
+        decode and is reported like any other undecodable message.
+        """
+        tail = bytes(self.buffer)
+        self.buffer.clear()
+        return [tail] if tail.strip() else []
+
+class IngestListener:
+    """Accept Sysmon events over TCP and UDP and pass them to a LogProcessor
+    
+    Messages are newline-delimited JSON or syslog-framed events with a JSON
+    payload (newline or octet-counted framing on TCP, one or more
+    newline-separated messages per UDP datagram). Decoded records are
+    collected into batches of batch_size, or whatever arrived within
+    flush_interval, and go through a queue of queue_size batches to
+    consume_queue_async, which validates, parses and checks them as the
+    consumer does.
+    
+    Memory is bounded: each of at most max_connections connections buffers
+    one partial frame of at most max_frame_bytes plus one read, and the
+    queue holds queue_size batches. When detection falls behind, TCP
+    connections stop being read, so TCP flow control pushes back on the
+    senders. UDP cannot push back: datagrams that arrive while the queue is
+    full are dropped and counted. Connections beyond max_connections are
+    closed on accept and counted.
+    
+    tcp_port / udp_port of 0 bind a free port; the bound ports are set on
+    the listener after start(). None disables that protocol.
+    """
+    
+    def __init__(self, processor: LogProcessor, host: str = DEFAULT_HOST, tcp_port: Optional[int] = DEFAULT_PORT,
+                 udp_port: Optional[int] = None, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL, queue_size: int = QUEUE_BATCHES,
+                 max_connections: int = MAX_CONNECTIONS, max_frame_bytes: int = MAX_FRAME_BYTES):
+        if tcp_port is None and udp_port is None:
+            raise ValueError("Listen on at least one of TCP and UDP")
+        if queue_size < 1 or batch_size < 1:
+            raise ValueError("queue_size and batch_size must be at least 1")
+        self.processor = processor
+        self.host = host
+        self.tcp_port = tcp_port
+        self.udp_port = udp_port
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.max_connections = max_connections
+        self.max_frame_bytes = max_frame_bytes
+        self.messages = 0
+        self.bytes_received = 0
+        self.connections = 0
+        self.active_connections = 0
+        self.rejected_connections = 0
+        self.dropped_connections = 0  # closed for an oversized or malformed frame
+        self.dropped_datagrams = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._udp_socket: Optional[socket.socket] = None
+        self._handlers: Set[asyncio.Task] = set()
+        self._tasks: List[asyncio.Task] = []
+    
+    async def start(self) -> "IngestListener":
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.tcp_port is not None:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.tcp_port)
+            self.tcp_port = self._server.sockets[0].getsockname()[1]
+        if self.udp_port is not None:
+            # A plain non-blocking socket rather than a datagram transport, which reads one
+            # datagram per wakeup: _read_datagrams drains everything queued at once
+            family, _, _, _, address = (await loop.getaddrinfo(self.host, self.udp_port,
+                                                               type=socket.SOCK_DGRAM))[0]
+            self._udp_socket = socket.socket(family, socket.SOCK_DGRAM)
+            self._udp_socket.setblocking(False)
+            with contextlib.suppress(OSError):
+                self._udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, UDP_RECEIVE_BUFFER)
+            self._udp_socket.bind(address)
+            self.udp_port = self._udp_socket.getsockname()[1]
+            loop.add_reader(self._udp_socket.fileno(), self._read_datagrams)
+        self._tasks = [asyncio.create_task(consume_queue_async(self._queue, self.processor)),
+                       asyncio.create_task(self._flush_periodically())]
+        self._add_metrics()
+        return self
+    
+    def _add_metrics(self) -> None:
+        registry = get_registry()
+        if registry is None:
+            return
+        messages = registry.counter("sysmon_listener_messages_total", "Messages received by the listener").labels()
+        dropped = registry.counter("sysmon_listener_dropped_total",
+                                   "Datagrams and connections dropped by the listener", ("kind",))
+        active = registry.gauge("sysmon_listener_connections", "Open TCP connections").labels()
+        depth = registry.gauge("sysmon_listener_queue_batches", "Record batches waiting for detection").labels()
+        
+        def collect() -> None:
+            messages.set_total(self.messages)
+            dropped.labels("datagram").set_total(self.dropped_datagrams)
+            dropped.labels("connection").set_total(self.dropped_connections)
+            dropped.labels("rejected").set_total(self.rejected_connections)
+            active.set(self.active_connections)
+            depth.set(self._queue.qsize())
+        registry.add_collector(collect, key="listener")
+    
+    async def close(self) -> None:
+        """Stop accepting, close connections and wait until every received record is processed"""
+        if self._server is not None:
+            self._server.close()
+        if self._udp_socket is not None:
+            asyncio.get_running_loop().remove_reader(self._udp_socket.fileno())
+            self._udp_socket.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        consumer, flusher = self._tasks
+        flusher.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await flusher
+        
+        async def drain() -> None:
+            if self._batch:
+                await self._queue.put(self._take_batch())
+            await self._queue.put(None)
+        
+        # A failed consumer no longer empties the queue: raise its error instead of waiting on put()
+        try:
+            await run_until_failure(drain(), consumer)
+        finally:
+            if self._server is not None:
+                await self._server.wait_closed()
+    
+    async def serve(self, duration: Optional[float] = None) -> None:
+        """Run until duration seconds pass, detection fails or the task is cancelled (Ctrl-C)
+        
+        A detection failure is raised by close().
+        """
+        try:
+            await asyncio.wait([self._tasks[0]], timeout=duration)
+        except asyncio.CancelledError:
+            pass
+    
+    def stats(self) -> Dict[str, int]:
+        return {"messages": self.messages, "bytes": self.bytes_received, "connections": self.connections,
+                "rejected_connections": self.rejected_connections,
+                "dropped_connections": self.dropped_connections, "dropped_datagrams": self.dropped_datagrams}
+    
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        batch, self._batch = self._batch, []
+        return batch
+    
+    def _add_messages(self, messages: List[bytes]) -> None:
+        """Decode messages into the current batch, reporting undecodable ones as the consumer does"""
+        batch = self._batch
+        for message in messages:
+            self.messages += 1
+            try:
+                batch.append(decode_message(message))
+            except (log_codec.DecodeError, ValueError) as e:
+                self.processor.error("decode", self.messages, e)
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if self.active_connections >= self.max_connections:
+            self.rejected_connections += 1
+            writer.close()
+            return
+        self.connections += 1
+        self.active_connections += 1
+        self._handlers.add(asyncio.current_task())
+        frames = FrameReader(self.max_frame_bytes)
+        try:
+            while True:
+                data = await reader.read(READ_SIZE)
+                if not data:
+                    self._add_messages(frames.finish())
+                    break
+                self.bytes_received += len(data)
+                self._add_messages(frames.feed(data))
+                if len(self._batch) >= self.batch_size:
+                    # Waits while the queue is full, so this connection is not read meanwhile
+                    await self._queue.put(self._take_batch())
+        except ValueError as e:
+            self.dropped_connections += 1
+            peer = writer.get_extra_info("peername")
+            log.warning("[Listener] Dropping connection from %s: %s", peer, e)
+        except (asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            self.active_connections -= 1
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+    
+    def _read_datagrams(self) -> None:
+        recv = self._udp_socket.recv
+        for _ in range(UDP_READS_PER_WAKEUP):
+            try:
+                data = recv(65535)
+            except OSError:  # BlockingIOError once the socket is drained
+                return
+            self.receive_datagram(data)
+    
+    def receive_datagram(self, data: bytes) -> None:
+        if len(self._batch) >= self.batch_size:
+            if self._queue.full():
+                self.dropped_datagrams += 1
+                return
+            self._queue.put_nowait(self._take_batch())
+        self.bytes_received += len(data)
+        if data[:1] == b"<" or b"\n" not in data.rstrip():
+            self._add_messages([data])
+        else:
+            self._add_messages([message for message in data.split(b"\n") if message.strip()])
+    
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            if self._batch:
+                await self._queue.put(self._take_batch())
+
+async def run_listener_async(host: str = DEFAULT_HOST, tcp_port: Optional[int] = DEFAULT_PORT,
+                             udp_port: Optional[int] = None, output_path: Optional[str] = 'alerts.json',
+                             sink: Optional[AlertSink] = None, duration: Optional[float] = None,
+                             correlator: Optional[CorrelationEngine] = None,
+                             suppress_ttl: Optional[float] = None, rules: Optional[RuleEngine] = None,
+                             **options) -> LogProcessor:
+    """Listen for events until duration passes or the run is interrupted, then print the summary
+    
+    options are passed to IngestListener (batch_size, queue_size,
+    max_connections, ...). Alerts go to output_path and sink as in
+    consume_logs; correlator, suppress_ttl and rules work as there too.
+    """
+    alert_sink = build_sink(output_path, sink, suppress_ttl, suppress_clock=time.monotonic)
+    processor = make_processor(alert_sink, correlator, rules)
+    listener = IngestListener(processor, host, tcp_port, udp_port, **options)
+    alert_sink.open()
+    try:
+        await listener.start()
+        bound = [f"{protocol} {host}:{port}" for protocol, port in
+                 (("tcp", listener.tcp_port), ("udp", listener.udp_port)) if port is not None]
+        log.info("[Listener] Listening on %s", ', '.join(bound))
+        try:
+            await listener.serve(duration)
+        finally:
+            await listener.close()
+    finally:
+        alert_sink.close()
+    
+    stats = listener.stats()
+    log.info("[Listener] Received %d messages (%d bytes) over %d connections",
+             stats['messages'], stats['bytes'], stats['connections'], extra=UNLIMITED)
+    if stats['rejected_connections'] or stats['dropped_connections'] or stats['dropped_datagrams']:
+        log.warning("[Listener] Dropped %d datagrams and %d connections; rejected %d connections over the limit",
+                    stats['dropped_datagrams'], stats['dropped_connections'], stats['rejected_connections'],
+                    extra=UNLIMITED)
+    print_summary(processor)
+    return processor
+
+def run_listener(host: str = DEFAULT_HOST, tcp_port: Optional[int] = DEFAULT_PORT, udp_port: Optional[int] = None,
+                 output_path: Optional[str] = 'alerts.json', **options) -> LogProcessor:
+    """Synchronous wrapper for the network listener"""
+    try:
+        return asyncio.run(run_listener_async(host, tcp_port, udp_port, output_path, **options))
+    except KeyboardInterrupt:
+        log.info("\n[Listener] Interrupted")
+        raise
+
+def encode_messages(records: List[Dict[str, Any]], framing: str = "json", host: str = "HOST01") -> List[bytes]:
+    """Frame records for sending: JSON lines, newline-terminated RFC 5424 syslog, or octet-counted syslog"""
+    if framing not in FRAMINGS:
+        raise ValueError(f"Unknown framing {framing!r}, expected one of {FRAMINGS}")
+    if framing == "json":
+        return [log_codec.dumps_line(record) for record in records]
+    header = f"<14>1 - {host} Sysmon - - - ".encode()
+    messages = [header + log_codec.dumps(record) for record in records]
+    if framing == "syslog":
+        return [message + b"\n" for message in messages]
+    return [str(len(message)).encode() + b" " + message for message in messages]
+
+def synthetic_messages(events: int, framing: str = "json", seed: int = 0) -> Iterator[bytes]:
+    """Seeded synthetic events (see log_synth), framed for sending"""
+    from log_synth import generate_chunks
+    
+    for chunk in generate_chunks(events, chunksize=10_000, seed=seed):
+        yield from encode_messages(chunk.astype(object).to_dict("records"), framing)
+
+async def send_load(messages: List[bytes], host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                    protocol: str = "tcp", connections: int = 4, rate: Optional[float] = None) -> Dict[str, Any]:
+    """Send pre-encoded messages to a listener, split over connections, and time it
+    
+    TCP messages are written in blocks of up to 64 KB per connection; UDP
+    sends one message per datagram. rate caps the total messages/sec.
+    """
+    if protocol not in LOAD_PROTOCOLS:
+        raise ValueError(f"Unknown protocol {protocol!r}, expected one of {LOAD_PROTOCOLS}")
+    loop = asyncio.get_running_loop()
+    connections = max(1, min(connections, len(messages) or 1))
+    shares = [messages[index::connections] for index in range(connections)]
+    per_connection_rate = rate / connections if rate else None
+    
+    async def pace(sent: int, started: float) -> None:
+        if per_connection_rate:
+            ahead = sent / per_connection_rate - (loop.time() - started)
+            if ahead > 0:
+                await asyncio.sleep(ahead)
+    
+    async def send_tcp(share: List[bytes]) -> None:
+        _, writer = await asyncio.open_connection(host, port)
+        started = loop.time()
+        block: List[bytes] = []
+        size = sent = 0
+        for message in share:
+            block.append(message)
+            size += len(message)
+            if size >= 64 << 10:
+                writer.write(b"".join(block))
+                sent += len(block)
+                block, size = [], 0
+                await writer.drain()
+                await pace(sent, started)
+        if block:
+            writer.write(b"".join(block))
+        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
+    
+    async def send_udp(share: List[bytes]) -> None:
+        transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol, remote_addr=(host, port))
+        started = loop.time()
+        try:
+            for sent, message in enumerate(share, 1):
+                transport.sendto(message)
+                if sent % 32 == 0:
+                    await asyncio.sleep(0)  # let the socket drain (and an in-process listener read it)
+                    await pace(sent, started)
+        finally:
+            transport.close()
+    
+    send = send_tcp if protocol == "tcp" else send_udp
+    started = time.perf_counter()
+    await asyncio.gather(*(send(share) for share in shares))
+    seconds = time.perf_counter() - started
+    return {"messages": len(messages), "bytes": sum(len(message) for message in messages),
+            "connections": connections, "seconds": round(seconds, 6),
+            "messages_per_sec": round(len(messages) / seconds, 1) if seconds else None}
+
+async def measure_loopback(events: int = 100_000, protocol: str = "tcp", framing: str = "json",
+                           connections: int = 4, rate: Optional[float] = None, seed: int = 0,
+                           idle_timeout: float = 1.0, **options) -> Dict[str, Any]:
+    """Send synthetic events to an in-process listener on loopback and measure sustained events/sec
+    
+    The rate counts events that made it through detection, from the first
+    send until the last record was processed. Alerts go to a discarded
+    JSONL file. For UDP, records lost to full socket buffers or a full
+    queue show up as the difference between sent and processed.
+    """
+    import tempfile
+    
+    messages = list(synthetic_messages(events, framing, seed))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        sink = JsonlAlertSink(os.path.join(temp_dir, "alerts.jsonl"), batch_size=1000)
+        processor = make_processor(sink)
+        tcp_port, udp_port = (0, None) if protocol == "tcp" else (None, 0)
+        listener = IngestListener(processor, DEFAULT_HOST, tcp_port, udp_port, **options)
+        
+        def done() -> int:
+            return processor.processed_count + processor.error_count
+        
+        sink.open()
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                await listener.start()
+                started = time.perf_counter()
+                # The sender gets its own thread and loop, as an outside forwarder would
+                port = listener.tcp_port or listener.udp_port
+                sent = await asyncio.get_running_loop().run_in_executor(None, lambda: asyncio.run(
+                    send_load(messages, DEFAULT_HOST, port, protocol, connections, rate)))
+                # Wait until everything sent is processed, or nothing has arrived for idle_timeout (UDP loss)
+                last, last_change = done(), time.perf_counter()
+                while done() < len(messages) and time.perf_counter() - last_change < idle_timeout:
+                    await asyncio.sleep(0.01)
+                    if done() != last:
+                        last, last_change = done(), time.perf_counter()
+                await listener.close()
+                seconds = time.perf_counter() - started
+        finally:
+            sink.close()
+    
+    return {
+        "protocol": protocol,
+        "framing": framing,
+        "sent": sent,
+        "processed": processor.processed_count,
+        "alerts": processor.alert_count,
+        "errors": processor.error_count,
+        "listener": listener.stats(),
+        "seconds": round(seconds, 6),
+        "events_per_sec": round(processor.processed_count / seconds, 1) if seconds else None,
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive Sysmon events over TCP/UDP and check them as they arrive")
+    parser.add_argument("command", nargs="?", choices=("listen", "load", "bench"), default="listen",
+                        help="listen for events, send synthetic load to a listener, or measure loopback throughput")
+    parser.add_argument("output_file", nargs="?", default="alerts.json")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="interface to listen on or send to (0.0.0.0 for all)")
+    parser.add_argument("--tcp-port", type=int, default=DEFAULT_PORT, help="TCP port (-1 disables TCP)")
+    parser.add_argument("--udp-port", type=int, default=None, help="UDP port (off by default)")
+    parser.add_argument("--duration", type=float, default=None, help="stop listening after this many seconds")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="records handed to detection at once")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_BATCHES,
+                        help="batches waiting for detection before TCP senders are held back")
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS)
+    parser.add_argument("--max-frame-bytes", type=int, default=MAX_FRAME_BYTES, help="longest message accepted")
+    parser.add_argument("--events", type=int, default=100_000, help="load/bench: synthetic events to send")
+    parser.add_argument("--protocol", choices=LOAD_PROTOCOLS, default="tcp", help="load/bench: protocol to send over")
+    parser.add_argument("--framing", choices=FRAMINGS, default="json", help="load/bench: message format")
+    parser.add_argument("--connections", type=int, default=4, help="load/bench: parallel connections or sockets")
+    parser.add_argument("--rate", type=float, default=None, help="load/bench: cap on events/sec sent")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--correlation-rules", default=None, help="JSON file of threshold/sequence correlation rules")
+    parser.add_argument("--allowed-lateness", type=float, default=0.0,
+                        help="seconds of UtcTime disorder tolerated by correlation windows")
+    parser.add_argument("--iocs", nargs="+", default=None,
+                        help="IOC feeds checked by the built-in detection: a compiled .ioc index or text feed files")
+    parser.add_argument("--rules", default=None,
+                        help="JSON/YAML detection rule file or directory, replacing the built-in detection")
+    parser.add_argument("--alerts-jsonl", default=None, help="append alerts to this JSONL file as they are found")
+    parser.add_argument("--suppress-ttl", type=float, default=None,
+                        help="collapse repeats of an alert within this many seconds into one alert with a count")
+    parser.add_argument("--no-export", action="store_true", help="do not write the pretty-printed alerts.json")
+    parser.add_argument("--metrics-file", default=None, help="write Prometheus text or JSON metrics to this file")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between metrics writes")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="info", help="console diagnostics level")
+    parser.add_argument("--quiet", action="store_true", help="only print warnings and errors")
+    parser.add_argument("--summary-interval", type=float, default=5.0, help="seconds between progress summary lines")
+    args = parser.parse_args()
+    
+    configure_diagnostics(args.log_level, args.quiet, summary_interval=args.summary_interval)
+    listener_options = dict(batch_size=args.batch_size, queue_size=args.queue_size,
+                            max_connections=args.max_connections, max_frame_bytes=args.max_frame_bytes)
+    try:
+        flush_diagnostics()  # results go straight to stdout
+        if args.command == "load":
+            port = args.tcp_port if args.protocol == "tcp" else args.udp_port
+            if port is None or port < 0:
+                parser.error(f"load needs --{args.protocol}-port")
+            messages = list(synthetic_messages(args.events, args.framing, args.seed))
+            result = asyncio.run(send_load(messages, args.host, port, args.protocol, args.connections, args.rate))
+            print(json.dumps(result, indent=2))
+            sys.exit(0)
+        if args.command == "bench":
+            result = asyncio.run(measure_loopback(args.events, args.protocol, args.framing, args.connections,
+                                                  args.rate, args.seed, **listener_options))
+            print(json.dumps(result, indent=2))
+            sys.exit(0)
+    except (OSError, ValueError) as e:
+        log.error("[Listener] Error: %s", e)
+        sys.exit(1)
+    
+    correlator = None
+    if args.correlation_rules:
+        try:
+            correlator = CorrelationEngine(load_correlation_rules(args.correlation_rules), args.allowed_lateness)
+        except (OSError, ValueError, TypeError) as e:
+            log.error("[Listener] Error loading correlation rules: %s", e)
+            sys.exit(1)
+    if args.iocs:
+        try:
+            iocs = load_iocs(args.iocs)
+        except (OSError, ValueError) as e:
+            log.error("[Listener] Error loading IOC feeds: %s", e)
+            sys.exit(1)
+        log.info("[Listener] Loaded %d indicators (%s)", len(iocs), ', '.join(iocs.categories))
+    rules = None
+    if args.rules:
+        try:
+            rules = RuleEngine.from_path(args.rules)
+        except RULE_LOAD_ERRORS as e:
+            log.error("[Listener] Error loading detection rules: %s", e)
+            sys.exit(1)
+    
+    exporter = None
+    if args.metrics_file:
+        exporter = MetricsExporter(enable_metrics(), args.metrics_file, args.metrics_format,
+                                   args.metrics_interval).start()
+    
+    jsonl_sink = JsonlAlertSink(args.alerts_jsonl) if args.alerts_jsonl else None
+    output_file = None if args.no_export else args.output_file
+    tcp_port = args.tcp_port if args.tcp_port >= 0 else None
+    try:
+        run_listener(args.host, tcp_port, args.udp_port, output_file, sink=jsonl_sink, duration=args.duration,
+                     correlator=correlator, suppress_ttl=args.suppress_ttl, rules=rules, **listener_options)
+    except KeyboardInterrupt:
+        pass
+    except (OSError, ValueError) as e:
+        log.error("[Listener] Error: %s", e)
+        sys.exit(1)
+    finally:
+        if exporter is not None:
+            exporter.stop()
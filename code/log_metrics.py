@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from log_diagnostics import get_logger
+
+METRICS_FORMATS = ("prometheus", "json")
+# Upper bounds (seconds) for per-record stage latencies, 1 us to 1 s
+LATENCY_BUCKETS = (1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 1e-3, 1e-2, 0.1, 1.0)
+# Upper bounds (seconds) for per-chunk and per-batch timings, 100 us to 10 s
+CHUNK_BUCKETS = (1e-4, 1e-3, 1e-2, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0)
+SAMPLE_EVERY = 10  # time one record in N; counters stay exact
+
+log = get_logger("metrics")
+
+class Counter:
+    """Monotonically increasing value"""
+    
+    kind = "counter"
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+    
+    def set_total(self, value: float) -> None:
+        """Overwrite with a total tracked elsewhere (e.g. a processor's own count)"""
+        self.value = value
+
+class Gauge:
+    """Value that can go up and down"""
+    
+    kind = "gauge"
+    
+    def __init__(self):
+        self.value = 0.0
+    
+    def set(self, value: float) -> None:
+        self.value = value
+
+class Histogram:
+    """Bucketed distribution of observations, exported with cumulative buckets"""
+    
+    kind = "histogram"
+    
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+    
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def cumulative(self) -> List[Tuple[str, int]]:
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+_KINDS = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+class MetricFamily:
+    """A named metric with optional labels; labels(...) returns the child for a label set"""
+    
+    def __init__(self, name: str, kind: str, help_text: str, label_names: Sequence[str] = (), **options):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._options = options
+        self._children: Dict[Tuple[str, ...], Any] = {}
+    
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.label_names):
+                raise ValueError(f"{self.name} expects labels {self.label_names}, got {values!r}")
+            child = self._children[key] = _KINDS[self.kind](**self._options)
+        return child
+    
+    def children(self) -> List[Tuple[Dict[str, str], Any]]:
+        # list() copies in one step, so an exporter thread never sees the dict resize
+        return [(dict(zip(self.label_names, key)), child) for key, child in list(self._children.items())]
+
+def _label_text(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class MetricsRegistry:
+    """Holds metric families and renders them as Prometheus text or a JSON snapshot
+    
+    Collectors registered with add_collector() run before every export, to
+    copy in values that are cheaper to keep elsewhere (such as a processor's
+    record count) and to derive rates. A collector registered under a key
+    replaces the previous one with that key, so each new processor or
+    stream in a process takes over its metrics instead of adding another
+    collector; the last one keeps reporting its final values after it ends.
+    """
+    
+    def __init__(self, sample_every: int = SAMPLE_EVERY):
+        self.sample_every = max(1, sample_every)
+        self.started = time.time()
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: Dict[Any, Callable[[], None]] = {}
+        self._lock = threading.Lock()
+    
+    def _family(self, name: str, kind: str, help_text: str, label_names: Sequence[str], **options) -> MetricFamily:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = MetricFamily(name, kind, help_text, label_names, **options)
+        elif family.kind != kind:
+            raise ValueError(f"Metric {name} is already registered as a {family.kind}")
+        return family
+    
+    def counter(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._family(name, "counter", help_text, label_names)
+    
+    def gauge(self, name: str, help_text: str, label_names: Sequence[str] = ()) -> MetricFamily:
+        return self._family(name, "gauge", help_text, label_names)
+    
+    def histogram(self, name: str, help_text: str, label_names: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> MetricFamily:
+        return self._family(name, "histogram", help_text, label_names, buckets=buckets)
+    
+    def add_collector(self, collector: Callable[[], None], key: Any = None) -> None:
+        with self._lock:
+            self._collectors[collector if key is None else key] = collector
+    
+    def remove_collector(self, key: Any) -> None:
+        with self._lock:
+            self._collectors.pop(key, None)
+    
+    def collect(self) -> None:
+        for collector in list(self._collectors.values()):
+            collector()
+    
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            self.collect()
+            lines = []
+            for family in list(self._families.values()):
+                lines.append(f"# HELP {family.name} {family.help}")
+                lines.append(f"# TYPE {family.name} {family.kind}")
+                for labels, metric in family.children():
+                    if family.kind == "histogram":
+                        for bound, count in metric.cumulative():
+                            lines.append(f"{family.name}_bucket{_label_text(labels, ('le', bound))} {count}")
+                        lines.append(f"{family.name}_sum{_label_text(labels)} {metric.sum!r}")
+                        lines.append(f"{family.name}_count{_label_text(labels)} {metric.count}")
+                    else:
+                        lines.append(f"{family.name}{_label_text(labels)} {metric.value!r}")
+            return "\n".join(lines) + "\n"
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready snapshot of every metric"""
+        with self._lock:
+            self.collect()
+            metrics: Dict[str, Any] = {}
+            for family in list(self._families.values()):
+                samples = []
+                for labels, metric in family.children():
+                    if family.kind == "histogram":
+                        samples.append({"labels": labels, "count": metric.count, "sum": metric.sum,
+                                        "buckets": dict(metric.cumulative())})
+                    else:
+                        samples.append({"labels": labels, "value": metric.value})
+                metrics[family.name] = {"type": family.kind, "help": family.help, "samples": samples}
+            return {"timestamp": time.time(), "uptime_seconds": time.time() - self.started, "metrics": metrics}
+    
+    def write(self, path: str, metrics_format: str = "prometheus") -> None:
+        """Atomically write the current metrics to path"""
+        if metrics_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format {metrics_format!r}, expected one of {METRICS_FORMATS}")
+        text = self.to_prometheus() if metrics_format == "prometheus" else json.dumps(self.snapshot(), indent=2)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+
+class RateTracker:
+    """Collector that turns a total into a per-second gauge between exports"""
+    
+    def __init__(self, gauge: Gauge, total: Callable[[], float]):
+        self.gauge = gauge
+        self.total = total
+        self._last_total = total()
+        self._last_time = time.monotonic()
+    
+    def __call__(self) -> None:
+        now = time.monotonic()
+        total = self.total()
+        if now > self._last_time:
+            self.gauge.set((total - self._last_total) / (now - self._last_time))
+        self._last_total, self._last_time = total, now
+
+def timed_iter(iterable: Any, histogram: Histogram, sample_every: int = 1) -> Iterator[Any]:
+    """Yield from iterable, observing how long one next() in sample_every takes"""
+    iterator = iter(iterable)
+    tick = 0
+    while True:
+        tick += 1
+        if tick >= sample_every:
+            tick = 0
+            started = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            histogram.observe(time.perf_counter() - started)
+        else:
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+class MetricsExporter:
+    """Background thread that writes the registry to a file every interval seconds"""
+    
+    def __init__(self, registry: MetricsRegistry, path: str, metrics_format: str = "prometheus",
+                 interval: float = 10.0):
+        if metrics_format not in METRICS_FORMATS:
+            raise ValueError(f"Unknown metrics format {metrics_format!r}, expected one of {METRICS_FORMATS}")
+        self.registry = registry
+        self.path = path
+        self.metrics_format = metrics_format
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+    
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.write(self.path, self.metrics_format)
+            except OSError as e:
+                log.warning("[Metrics] Warning: Could not write %s: %s", self.path, e)
+    
+    def start(self) -> "MetricsExporter":
+        self._thread.start()
+        return self
+    
+    def stop(self) -> None:
+        """Stop the thread and write a final snapshot"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.registry.write(self.path, self.metrics_format)
+
+# The registry the producer and consumer report to; None keeps instrumentation off
+_registry: Optional[MetricsRegistry] = None
+
+def enable_metrics(registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """Turn instrumentation on for processors and producers created from now on"""
+    global _registry
+    _registry = registry or MetricsRegistry()
+    return _registry
+
+def disable_metrics() -> None:
+    global _registry
+    _registry = None
+
+def get_registry() -> Optional[MetricsRegistry]:
+    """The active registry, or None when metrics are disabled"""
+    return _registry
@@ -0,0 +1,127 @@
+import asyncio
+import time
+from typing import Dict, Any, List, AsyncIterator, Optional
+
+import numpy as np
+import pandas as pd
+from log_utils import utc_times_to_epoch
+
+RELEASE_INTERVAL = 0.01  # target seconds of events released per batch
+MAX_BATCH = 10_000
+
+class Pacer:
+    """Base class: releases records in batches and tracks the achieved rate"""
+    
+    def __init__(self):
+        self.released = 0
+        self.started: Optional[float] = None
+    
+    def target_rate(self) -> Optional[float]:
+        return None
+    
+    def achieved_rate(self) -> float:
+        if self.started is None:
+            return 0.0
+        elapsed = time.monotonic() - self.started
+        return self.released / elapsed if elapsed > 0 else 0.0
+    
+    def pace(self, records: List[Dict[str, Any]], chunk: pd.DataFrame) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Yield slices of records as they become due"""
+        raise NotImplementedError
+    
+    def summary(self) -> str:
+        target = self.target_rate()
+        target_text = f"target {target:.0f}" if target else "no fixed target"
+        return f"{self.released} records at {self.achieved_rate():.0f} events/sec ({target_text})"
+
+class RatePacer(Pacer):
+    """Release records at a fixed events/sec rate
+    
+    Record k is due at start + k / rate, and everything due within the next
+    RELEASE_INTERVAL goes out as one batch. High rates therefore cost a
+    handful of sleeps and writes per second rather than one per record.
+    Time lost to reading and converting chunks is made up with larger
+    batches, so the average rate holds.
+    """
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+    
+    def target_rate(self) -> Optional[float]:
+        return self.rate
+    
+    async def pace(self, records: List[Dict[str, Any]], chunk: pd.DataFrame) -> AsyncIterator[List[Dict[str, Any]]]:
+        if self.started is None:
+            self.started = time.monotonic()
+        start = 0
+        while start < len(records):
+            now = time.monotonic()
+            due = self.started + self.released / self.rate
+            if due > now:
+                await asyncio.sleep(due - now)
+                now = time.monotonic()
+            count = int((now + RELEASE_INTERVAL - self.started) * self.rate) - self.released
+            end = start + min(max(count, 1), MAX_BATCH)
+            batch = records[start:end]
+            self.released += len(batch)
+            yield batch
+            start = end
+
+class TimestampPacer(Pacer):
+    """Replay records on the original UtcTime schedule, sped up by speed
+    
+    Each record is due at start + (UtcTime - first UtcTime) / speed. All
+    records due within the next RELEASE_INTERVAL go out together.
+    Unparsable times reuse the previous record's time, and records that are
+    out of order are released immediately.
+    """
+    
+    def __init__(self, speed: float = 1.0):
+        super().__init__()
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.speed = speed
+        self._origin_time: Optional[float] = None
+        self._last_time: Optional[float] = None
+    
+    async def pace(self, records: List[Dict[str, Any]], chunk: pd.DataFrame) -> AsyncIterator[List[Dict[str, Any]]]:
+        if self.started is None:
+            self.started = time.monotonic()
+        if not records:
+            return
+        
+        if "UtcTime" in chunk.columns:
+            times = pd.Series(utc_times_to_epoch(chunk["UtcTime"])).ffill()
+        else:
+            times = pd.Series(np.nan, index=range(len(records)))
+        if self._origin_time is None:
+            first = times.first_valid_index()
+            self._origin_time = times[first] if first is not None else 0.0
+        times = times.fillna(self._last_time if self._last_time is not None else self._origin_time).to_numpy()
+        self._last_time = times[-1]
+        
+        due = self.started + np.maximum.accumulate((times - self._origin_time) / self.speed)
+        start = 0
+        while start < len(records):
+            now = time.monotonic()
+            if due[start] > now:
+                await asyncio.sleep(due[start] - now)
+                now = time.monotonic()
+            end = int(np.searchsorted(due, now + RELEASE_INTERVAL, side="right"))
+            end = min(max(end, start + 1), start + MAX_BATCH)
+            self.released += end - start
+            yield records[start:end]
+            start = end
+
+def make_pacer(rate: Optional[float] = None, speed: Optional[float] = None) -> Optional[Pacer]:
+    """Return a rate- or timestamp-driven pacer, or None for unpaced streaming"""
+    if rate and speed:
+        raise ValueError("Use either rate or speed, not both")
+    if rate:
+        return RatePacer(rate)
+    if speed:
+        return TimestampPacer(speed)
+    return None
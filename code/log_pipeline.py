@@ -0,0 +1,178 @@
+import asyncio
+import argparse
+import sys
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from log_producer import stream_logs_async
+from log_consumer import LogProcessor, consume_queue_async, print_summary, make_processor
+from log_correlation import CorrelationEngine, load_correlation_rules
+from log_rules import RULE_LOAD_ERRORS, RuleEngine
+from log_utils import load_iocs
+from log_metrics import MetricsExporter, METRICS_FORMATS, enable_metrics, get_registry
+from log_sinks import AlertSink, JsonlAlertSink, build_sink
+from log_diagnostics import LOG_LEVELS, configure_diagnostics, get_logger
+
+QUEUE_BATCHES = 8  # record batches buffered between producer and consumer
+OFFLOAD_MODES = ("thread", "process")
+
+log = get_logger("pipeline")
+
+def _make_executor(offload: Optional[str], workers: int) -> Optional[Executor]:
+    if offload is None:
+        return None
+    if offload not in OFFLOAD_MODES:
+        raise ValueError(f"offload must be one of {OFFLOAD_MODES}, got {offload!r}")
+    if offload == "process":
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+async def run_until_failure(*aws) -> None:
+    """Run awaitables concurrently, cancelling the rest as soon as one fails
+    
+    A producer blocked on a full queue whose consumer died (or a consumer
+    waiting on a queue whose producer died) would otherwise wait forever.
+    The first failure is raised once the others have been cancelled.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()  # no-op for the tasks that finished
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+async def run_pipeline_async(input_path: str, output_path: Optional[str] = 'alerts.json',
+                             sink: Optional[AlertSink] = None, queue_size: int = QUEUE_BATCHES,
+                             offload: Optional[str] = None, workers: int = 1, delay: float = 0.0,
+                             chunksize: Optional[int] = None, rate: Optional[float] = None,
+                             speed: Optional[float] = None,
+                             correlator: Optional[CorrelationEngine] = None,
+                             suppress_ttl: Optional[float] = None,
+                             rules: Optional[RuleEngine] = None) -> LogProcessor:
+    """Stream a CSV export straight into detection, without the on-disk buffer
+    
+    The producer puts batches of records on a queue of queue_size batches and
+    the consumer checks them as they arrive. When detection falls behind, the
+    full queue blocks the producer. offload "thread" or "process" runs
+    detection in an executor of workers, leaving the event loop free for
+    the producer. correlator adds time-windowed correlation alerts and needs
+    detection on the loop, in queue order, so it cannot be combined with
+    offload. suppress_ttl collapses repeated alerts and rules replaces the
+    built-in detection, as in consume_logs; rules also need detection on
+    the loop.
+    """
+    if queue_size < 1:
+        raise ValueError("queue_size must be at least 1 so backpressure can apply")
+    if correlator is not None and offload is not None:
+        raise ValueError("correlation needs events in order and cannot run with offload")
+    if rules is not None and offload is not None:
+        raise ValueError("detection rules cannot run with offload")
+    alert_sink = build_sink(output_path, sink, suppress_ttl)
+    processor = make_processor(alert_sink, correlator, rules)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    registry = get_registry()
+    if registry is not None:
+        depth = registry.gauge("sysmon_pipeline_queue_batches", "Record batches waiting between producer and consumer")
+        registry.add_collector(lambda: depth.labels().set(queue.qsize()), key="pipeline_queue")
+    
+    async def produce() -> None:
+        # On failure no end-of-stream marker is queued: run_until_failure cancels the consumer
+        await stream_logs_async(input_path, delay=delay, chunksize=chunksize, rate=rate, speed=speed,
+                                queue=queue)
+        await queue.put(None)
+    
+    executor = _make_executor(offload, workers)
+    alert_sink.open()
+    try:
+        await run_until_failure(produce(), consume_queue_async(queue, processor, executor, workers))
+    finally:
+        alert_sink.close()
+        if executor is not None:
+            executor.shutdown()
+    
+    print_summary(processor)
+    return processor
+
+def run_pipeline(input_path: str, output_path: Optional[str] = 'alerts.json', **options) -> LogProcessor:
+    """Synchronous wrapper for the in-process pipeline"""
+    return asyncio.run(run_pipeline_async(input_path, output_path, **options))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a Sysmon CSV export straight into detection")
+    parser.add_argument("input_file", nargs="?", default="sample_data.csv")
+    parser.add_argument("output_file", nargs="?", default="alerts.json")
+    parser.add_argument("--queue-size", type=int, default=QUEUE_BATCHES,
+                        help="record batches buffered before the producer waits")
+    parser.add_argument("--offload", choices=OFFLOAD_MODES, default=None,
+                        help="run detection in a thread or process pool")
+    parser.add_argument("--workers", type=int, default=1, help="executor workers for --offload")
+    parser.add_argument("--delay", type=float, default=0.0, help="seconds per record")
+    parser.add_argument("--chunksize", type=int, default=None, help="rows read from the CSV per batch")
+    parser.add_argument("--rate", type=float, default=None, help="replay at this many events/sec")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="replay at N times the original UtcTime spacing (1 = original speed)")
+    parser.add_argument("--correlation-rules", default=None, help="JSON file of threshold/sequence correlation rules")
+    parser.add_argument("--allowed-lateness", type=float, default=0.0,
+                        help="seconds of UtcTime disorder tolerated by correlation windows")
+    parser.add_argument("--iocs", nargs="+", default=None,
+                        help="IOC feeds checked by the built-in detection: a compiled .ioc index or text feed files")
+    parser.add_argument("--rules", default=None,
+                        help="JSON/YAML detection rule file or directory, replacing the built-in detection")
+    parser.add_argument("--alerts-jsonl", default=None, help="append alerts to this JSONL file as they are found")
+    parser.add_argument("--suppress-ttl", type=float, default=None,
+                        help="collapse repeats of an alert within this many seconds into one alert with a count")
+    parser.add_argument("--no-export", action="store_true", help="do not write the pretty-printed alerts.json")
+    parser.add_argument("--metrics-file", default=None, help="write Prometheus text or JSON metrics to this file")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between metrics writes")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="info", help="console diagnostics level")
+    parser.add_argument("--quiet", action="store_true", help="only print warnings and errors")
+    parser.add_argument("--summary-interval", type=float, default=5.0, help="seconds between progress summary lines")
+    args = parser.parse_args()
+    
+    configure_diagnostics(args.log_level, args.quiet, summary_interval=args.summary_interval)
+    jsonl_sink = JsonlAlertSink(args.alerts_jsonl) if args.alerts_jsonl else None
+    output_file = None if args.no_export else args.output_file
+    
+    correlator = None
+    if args.correlation_rules:
+        try:
+            correlator = CorrelationEngine(load_correlation_rules(args.correlation_rules), args.allowed_lateness)
+        except (OSError, ValueError, TypeError) as e:
+            log.error("[Pipeline] Error loading correlation rules: %s", e)
+            sys.exit(1)
+    if args.iocs:
+        try:
+            iocs = load_iocs(args.iocs)
+        except (OSError, ValueError) as e:
+            log.error("[Pipeline] Error loading IOC feeds: %s", e)
+            sys.exit(1)
+        log.info("[Pipeline] Loaded %d indicators (%s)", len(iocs), ', '.join(iocs.categories))
+    rules = None
+    if args.rules:
+        try:
+            rules = RuleEngine.from_path(args.rules)
+        except RULE_LOAD_ERRORS as e:
+            log.error("[Pipeline] Error loading detection rules: %s", e)
+            sys.exit(1)
+    
+    exporter = None
+    if args.metrics_file:
+        exporter = MetricsExporter(enable_metrics(), args.metrics_file, args.metrics_format,
+                                   args.metrics_interval).start()
+    
+    log.info("[Pipeline] Starting in-process pipeline: %s -> %s", args.input_file, args.alerts_jsonl or output_file)
+    try:
+        run_pipeline(args.input_file, output_file, sink=jsonl_sink, queue_size=args.queue_size,
+                     offload=args.offload, workers=args.workers, delay=args.delay, chunksize=args.chunksize,
+                     rate=args.rate, speed=args.speed, correlator=correlator,
+                     suppress_ttl=args.suppress_ttl, rules=rules)
+    except (OSError, ValueError) as e:
+        log.error("[Pipeline] Error: %s", e)
+        sys.exit(1)
+    finally:
+        if exporter is not None:
+            exporter.stop()
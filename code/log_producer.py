@@ -1,62 +1,332 @@
 import pandas as pd
 import time
-import json
 import sys
 import os
-from typing import Optional
+import argparse
+import contextlib
+import log_codec
+from log_buffer import MsgpackBufferWriter, BUFFER_FORMATS
+from log_pacing import make_pacer, Pacer
+from log_segments import SegmentWriter, COMPRESSIONS, SEGMENT_BYTES
+from log_index import TimeIndex, index_path_for
+from log_fanin import MergeStats, expand_sources, is_fan_in, merge_sources
+from log_diagnostics import LOG_LEVELS, UNLIMITED, Progress, configure_diagnostics, get_logger
+from log_metrics import (
+    MetricsExporter, RateTracker, METRICS_FORMATS, CHUNK_BUCKETS, enable_metrics, get_registry, timed_iter
+)
+from typing import Optional, Dict, Any, List, Iterator, Tuple, Union
 import asyncio
 
-async def stream_logs_async(file_path: str, output_path: str = 'stream_buffer.jsonl', delay: float = 1.0) -> None:
-    """Async version of log streaming for better performance"""
+# Fixed schema for chunked ingestion. Known Sysmon columns are read as strings
+# so pandas skips per-chunk type inference; EventID is normalized separately.
+SYSMON_COLUMNS = ["EventID", "UtcTime", "Image", "ProcessName", "CommandLine"]
+SYSMON_DTYPES = {column: str for column in SYSMON_COLUMNS}
+DEFAULT_CHUNKSIZE = 50_000
+WRITE_BUFFER = 1 << 20  # bytes buffered between writes to the output buffer
+
+log = get_logger("producer")
+
+def read_csv_chunks(file_path: str, chunksize: int = DEFAULT_CHUNKSIZE) -> Iterator[pd.DataFrame]:
+    """Yield bounded DataFrame chunks of a Sysmon CSV export (plain, .gz or .zst)"""
     try:
-        if not os.path.exists(file_path):
+        # compression="infer" picks gzip/zstd/bz2/xz from the extension
+        reader = pd.read_csv(file_path, chunksize=chunksize, dtype=SYSMON_DTYPES, compression="infer")
+    except pd.errors.EmptyDataError:
+        return
+    
+    with reader:
+        for chunk in reader:
+            if "EventID" not in chunk.columns:
+                raise ValueError(f"{file_path} has no EventID column")
+            yield chunk
+
+def chunk_to_records(chunk: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Convert a chunk to JSON-ready records, mapping NaN to None column-wise"""
+    records = chunk.astype(object)
+    
+    # EventIDs that parse as whole numbers are emitted as ints, anything else as-is
+    event_ids = pd.to_numeric(chunk["EventID"], errors="coerce")
+    whole = event_ids.notna() & (event_ids % 1 == 0) & (event_ids.abs() < 2**53)
+    if whole.any():
+        records.loc[whole, "EventID"] = event_ids[whole].astype("int64").astype(object)
+    
+    records = records.where(records.notna(), None)
+    return records.to_dict("records")
+
+def records_to_jsonl(records: List[Dict[str, Any]]) -> bytes:
+    """Serialize a batch of records as one JSONL block"""
+    return log_codec.dumps_lines(records)
+
+async def stream_logs_async(file_path: Union[str, List[str]], output_path: str = 'stream_buffer.jsonl', delay: float = 1.0,
+                            chunksize: Optional[int] = None, buffer_format: str = "jsonl",
+                            rate: Optional[float] = None, speed: Optional[float] = None,
+                            queue: Optional[asyncio.Queue] = None, compression: Optional[str] = None,
+                            segment_bytes: Optional[int] = None, segment_seconds: Optional[float] = None,
+                            index: bool = False, merge_workers: Optional[int] = None) -> None:
+    """Async version of log streaming for better performance
+    
+    With chunksize set, the CSV is read and written in bounded chunks so peak
+    memory does not depend on the input size; delay is then applied per chunk
+    as delay * rows to keep the same average rate.
+    
+    buffer_format "msgpack" writes columnar msgpack record batches (one per
+    chunk) instead of JSONL; it always uses chunked ingestion.
+    
+    rate (events/sec) or speed (multiple of the original UtcTime spacing)
+    replace delay with a pacing engine that releases records in batches and
+    reports the achieved rate; both imply chunked ingestion.
+    
+    With queue set (see log_pipeline), record batches are put on the queue
+    instead of being written to output_path. The queue should be bounded:
+    a full queue blocks the producer until the consumer catches up. Errors
+    are then raised to the pipeline instead of exiting the process.
+    
+    file_path may be gzip (.gz) or zstd (.zst) compressed. With compression
+    ("none", "gzip" or "zstd"), segment_bytes or segment_seconds, output_path
+    is a directory of rotated JSONL segments with a manifest (see
+    log_segments) instead of one file.
+    
+    With index, a sparse UtcTime index of the JSONL buffer is written
+    alongside it as output_path.idx (see log_index).
+    
+    file_path may also be a list of exports, a directory of them or a glob
+    pattern (fan-in): the per-host exports are read concurrently by
+    merge_workers threads and merged into one UtcTime-ordered stream whose
+    records carry a SourceHost tag (see log_fanin). Fan-in always uses
+    chunked ingestion.
+    """
+    try:
+        sources = expand_sources(file_path) if is_fan_in(file_path) else None
+        if sources is None and not os.path.exists(file_path):
             raise FileNotFoundError(f"Input file not found: {file_path}")
+        if buffer_format not in BUFFER_FORMATS:
+            raise ValueError(f"Unknown buffer format {buffer_format!r}, expected one of {BUFFER_FORMATS}")
+        segments = None
+        if compression or segment_bytes or segment_seconds:
+            if buffer_format != "jsonl":
+                raise ValueError("Segmented buffers use the jsonl format")
+            segments = SegmentWriter(output_path, compression or "none", segment_bytes or SEGMENT_BYTES,
+                                     segment_seconds)
+        if index and (buffer_format != "jsonl" or segments is not None or queue is not None):
+            raise ValueError("The time index covers a single jsonl buffer file")
+        if not index and queue is None and segments is None:
+            # The buffer is about to be truncated and rewritten; an index left from an earlier run would not fit it
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(index_path_for(output_path))
+        
+        if chunksize or buffer_format != "jsonl" or rate or speed or queue is not None or segments is not None \
+                or index or sources is not None:
+            pacer = make_pacer(rate, speed)
+            await _stream_chunks(file_path, output_path, delay, chunksize or DEFAULT_CHUNKSIZE, buffer_format,
+                                 pacer, queue, segments, TimeIndex() if index else None, sources, merge_workers)
+            return
         
-        print(f"[Producer] Loading data from {file_path}")
-        df = pd.read_csv(file_path)
+        log.info("[Producer] Loading data from %s", file_path)
+        df = pd.read_csv(file_path, compression="infer")
         
         if df.empty:
-            print("[Producer] Warning: Input file is empty")
+            log.warning("[Producer] Warning: Input file is empty")
             return
         
-        print(f"[Producer] Loaded {len(df)} records")
+        log.info("[Producer] Loaded %d records", len(df))
         
-        with open(output_path, 'w') as f:
+        progress = Progress()
+        with open(output_path, 'wb') as f:
             for idx, (_, row) in enumerate(df.iterrows()):
                 try:
-                    log = row.to_dict()
+                    record = row.to_dict()
                     # Convert NaN values to None for proper JSON serialization
-                    log = {k: (None if pd.isna(v) else v) for k, v in log.items()}
+                    record = {k: (None if pd.isna(v) else v) for k, v in record.items()}
                     
-                    f.write(json.dumps(log) + '\n')
-                    print(f"[Producer] Sent {idx+1}/{len(df)}: EventID {log.get('EventID', 'Unknown')}")
+                    f.write(log_codec.dumps_line(record))
+                    log.debug("[Producer] Sent %d/%d: EventID %s", idx + 1, len(df), record.get('EventID', 'Unknown'))
+                    rate = progress.check(idx + 1)
+                    if rate is not None:
+                        log.info("[Producer] Progress: %d/%d records (%.0f records/sec)", idx + 1, len(df), rate)
                     
                     if delay > 0:
                         await asyncio.sleep(delay)
-                        
+                
                 except Exception as e:
-                    print(f"[Producer] Error processing row {idx}: {e}")
+                    log.warning("[Producer] Error processing row %d: %s", idx, e)
                     continue
-                    
-        print(f"[Producer] Completed streaming to {output_path}")
         
+        log.info("[Producer] Completed streaming to %s", output_path, extra=UNLIMITED)
+    
     except FileNotFoundError as e:
-        print(f"[Producer] Error: {e}")
+        if queue is not None:
+            raise  # the pipeline reports it and stops the consumer
+        log.error("[Producer] Error: %s", e)
         sys.exit(1)
     except pd.errors.EmptyDataError:
-        print(f"[Producer] Error: {file_path} is empty or invalid CSV")
+        if queue is not None:
+            raise
+        log.error("[Producer] Error: %s is empty or invalid CSV", file_path)
         sys.exit(1)
     except Exception as e:
-        print(f"[Producer] Unexpected error: {e}")
+        if queue is not None:
+            raise
+        log.error("[Producer] Unexpected error: %s", e)
         sys.exit(1)
 
-def stream_logs(file_path: str, output_path: str = 'stream_buffer.jsonl', delay: float = 1.0) -> None:
+async def _stream_chunks(file_path: Union[str, List[str]], output_path: str, delay: float, chunksize: int,
+                         buffer_format: str = "jsonl", pacer: Optional[Pacer] = None,
+                         queue: Optional[asyncio.Queue] = None, segments: Optional[SegmentWriter] = None,
+                         time_index: Optional[TimeIndex] = None, sources: Optional[List[Tuple[str, str]]] = None,
+                         merge_workers: Optional[int] = None) -> None:
+    """Chunked ingestion: one vectorized conversion and one write per chunk or paced batch"""
+    target = "the pipeline queue" if queue is not None else output_path
+    if segments is not None:
+        target = f"segments in {output_path} ({segments.compression})"
+    if sources is not None:
+        hosts = len({host for host, _ in sources})
+        file_path = f"{len(sources)} exports from {hosts} hosts, merged on UtcTime,"
+    log.info("[Producer] Streaming %s in chunks of %d rows (%s)", file_path, chunksize,
+             'records' if queue is not None else buffer_format)
+    total = 0
+    backpressure = 0.0
+    
+    # Per-chunk instrumentation, only when metrics are enabled
+    registry = get_registry()
+    merge_stats = None
+    if sources is not None:
+        merge_stats = MergeStats(len(sources))
+        chunks = merge_sources(sources, read_csv_chunks, chunksize, merge_workers, merge_stats)
+    else:
+        chunks = read_csv_chunks(file_path, chunksize)
+    if registry is not None:
+        stages = registry.histogram("sysmon_producer_stage_seconds", "Time per chunk or batch in each producer stage",
+                                    ("stage",), buckets=CHUNK_BUCKETS)
+        convert_time, write_time = stages.labels("convert"), stages.labels("write")
+        sent = registry.counter("sysmon_producer_records_total", "Records written to the buffer or queue").labels()
+        rate = registry.gauge("sysmon_producer_events_per_second", "Records sent per second since the last export")
+        registry.add_collector(RateTracker(rate.labels(), lambda: sent.value), key="producer_rate")
+        chunks = timed_iter(chunks, stages.labels("read"))
+    
+    with contextlib.ExitStack() as stack:
+        f = writer = None
+        if segments is not None:
+            stack.enter_context(segments)
+        elif queue is None:
+            f = stack.enter_context(open(output_path, 'wb', buffering=WRITE_BUFFER))
+            writer = MsgpackBufferWriter(f) if buffer_format == "msgpack" else None
+        
+        async def emit(records: List[Dict[str, Any]], flush: bool = False) -> None:
+            nonlocal backpressure
+            started = time.monotonic()
+            if queue is not None:
+                # A full queue means detection is behind: wait for it instead of buffering
+                await queue.put(records)
+                backpressure += time.monotonic() - started
+            elif segments is not None:
+                segments.write(records_to_jsonl(records), len(records))
+            elif writer is not None:
+                writer.write_batch(records)
+            else:
+                block = records_to_jsonl(records)
+                f.write(block)
+                if time_index is not None:
+                    time_index.add_block(block)
+            if flush and f is not None:
+                f.flush()  # make each paced batch visible to a following consumer
+            if registry is not None:
+                write_time.observe(time.monotonic() - started)
+                sent.inc(len(records))
+        
+        progress = Progress()
+        for chunk_num, chunk in enumerate(chunks, 1):
+            converting = time.monotonic()
+            records = chunk_to_records(chunk)
+            if registry is not None:
+                convert_time.observe(time.monotonic() - converting)
+            total += len(records)
+            
+            if pacer is None:
+                await emit(records)
+                log.info("[Producer] Sent chunk %d: %d records (%d total)", chunk_num, len(records), total)
+                if delay > 0:
+                    await asyncio.sleep(delay * len(records))
+                continue
+            
+            async for batch in pacer.pace(records, chunk):
+                await emit(batch, flush=True)
+                if progress.check(pacer.released) is not None:
+                    log.info("[Producer] Sent %d records at %.0f events/sec", pacer.released, pacer.achieved_rate())
+    
+    if time_index is not None:
+        time_index.stamp(output_path)
+        time_index.save(index_path_for(output_path))
+        log.info("[Producer] Indexed %d lines in %d UtcTime buckets", time_index.lines, len(time_index.buckets))
+    if merge_stats is not None and merge_stats.out_of_order:
+        log.warning("[Producer] Warning: %d records were older than records already sent "
+                    "(exports not in UtcTime order)", merge_stats.out_of_order)
+    if total == 0:
+        log.warning("[Producer] Warning: Input file is empty")
+    log.info("[Producer] Completed streaming %d records to %s", total, target, extra=UNLIMITED)
+    if queue is not None:
+        log.info("[Producer] Waited %.2fs on consumer backpressure", backpressure, extra=UNLIMITED)
+    if pacer is not None:
+        log.info("[Producer] Achieved rate: %s", pacer.summary(), extra=UNLIMITED)
+    if segments is not None:
+        written = sum(entry["bytes"] for entry in segments.segments)
+        stored = sum(entry["size"] for entry in segments.segments)
+        log.info("[Producer] Wrote %d segments: %d bytes of JSONL stored in %d bytes", len(segments.segments),
+                 written, stored, extra=UNLIMITED)
+
+def stream_logs(file_path: Union[str, List[str]], output_path: str = 'stream_buffer.jsonl', delay: float = 1.0,
+                chunksize: Optional[int] = None, buffer_format: str = "jsonl",
+                rate: Optional[float] = None, speed: Optional[float] = None, compression: Optional[str] = None,
+                segment_bytes: Optional[int] = None, segment_seconds: Optional[float] = None,
+                index: bool = False, merge_workers: Optional[int] = None) -> None:
     """Synchronous wrapper for async streaming"""
-    asyncio.run(stream_logs_async(file_path, output_path, delay))
+    asyncio.run(stream_logs_async(file_path, output_path, delay, chunksize, buffer_format, rate, speed,
+                                  compression=compression, segment_bytes=segment_bytes,
+                                  segment_seconds=segment_seconds, index=index, merge_workers=merge_workers))
 
 if __name__ == "__main__":
-    input_file = sys.argv[1] if len(sys.argv) > 1 else "sample_data.csv"
-    output_file = sys.argv[2] if len(sys.argv) > 2 else "stream_buffer.jsonl"
+    parser = argparse.ArgumentParser(description="Stream Sysmon CSV logs to a JSONL buffer")
+    parser.add_argument("input_file", nargs="?", default="sample_data.csv",
+                        help="CSV export, or a directory or quoted glob of per-host exports to merge")
+    parser.add_argument("output_file", nargs="?", default="stream_buffer.jsonl")
+    parser.add_argument("--inputs", nargs="+", default=None,
+                        help="more exports (files, directories, globs or host=path) merged with input_file on UtcTime")
+    parser.add_argument("--merge-workers", type=int, default=None,
+                        help="threads reading exports concurrently in fan-in mode (default: one per CPU)")
+    parser.add_argument("--delay", type=float, default=1.0, help="seconds per record")
+    parser.add_argument("--chunksize", type=int, default=None,
+                        help=f"stream in bounded chunks of N rows (e.g. {DEFAULT_CHUNKSIZE})")
+    parser.add_argument("--format", choices=BUFFER_FORMATS, default="jsonl", help="buffer format to write")
+    parser.add_argument("--rate", type=float, default=None, help="replay at this many events/sec")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="replay at N times the original UtcTime spacing (1 = original speed)")
+    parser.add_argument("--compress", choices=COMPRESSIONS, default=None,
+                        help="write output_file as a directory of compressed segments")
+    parser.add_argument("--segment-bytes", type=int, default=None,
+                        help=f"rotate buffer segments after this many JSONL bytes (default {SEGMENT_BYTES})")
+    parser.add_argument("--segment-seconds", type=float, default=None, help="rotate buffer segments this often")
+    parser.add_argument("--index", action="store_true",
+                        help="write a sparse UtcTime index next to the buffer (output_file.idx)")
+    parser.add_argument("--metrics-file", default=None,
+                        help="write Prometheus text or JSON metrics to this file (chunked mode)")
+    parser.add_argument("--metrics-format", choices=METRICS_FORMATS, default="prometheus")
+    parser.add_argument("--metrics-interval", type=float, default=10.0, help="seconds between metrics writes")
+    parser.add_argument("--log-level", choices=LOG_LEVELS, default="info", help="console diagnostics level")
+    parser.add_argument("--quiet", action="store_true", help="only print warnings and errors")
+    parser.add_argument("--summary-interval", type=float, default=5.0, help="seconds between progress summary lines")
+    args = parser.parse_args()
+    
+    configure_diagnostics(args.log_level, args.quiet, summary_interval=args.summary_interval)
+    exporter = None
+    if args.metrics_file:
+        exporter = MetricsExporter(enable_metrics(), args.metrics_file, args.metrics_format,
+                                   args.metrics_interval).start()
     
-    print(f"[Producer] Starting log stream: {input_file} -> {output_file}")
-    stream_logs(input_file, output_file)
+    inputs = [args.input_file] + args.inputs if args.inputs else args.input_file
+    log.info("[Producer] Starting log stream: %s -> %s", args.input_file, args.output_file)
+    try:
+        stream_logs(inputs, args.output_file, args.delay, args.chunksize, args.format,
+                    args.rate, args.speed, args.compress, args.segment_bytes, args.segment_seconds, args.index,
+                    args.merge_workers)
+    finally:
+        if exporter is not None:
+            exporter.stop()
@@ -0,0 +1,472 @@
+import fnmatch
+import json
+import os
+import re
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import yaml  # optional: PyYAML for .yml/.yaml rule files
+except ImportError:
+    yaml = None
+
+from log_diagnostics import get_logger
+
+_YAML_ERRORS = (yaml.YAMLError,) if yaml is not None else ()
+RULE_LOAD_ERRORS = (OSError, ValueError, *_YAML_ERRORS)  # RuleError is a ValueError
+
+RULE_SUFFIXES = (".json", ".yml", ".yaml")
+LEVELS = {"informational": 0, "low": 1, "medium": 2, "high": 3, "critical": 4}
+MODIFIERS = ("contains", "startswith", "endswith", "re", "all")
+RELOAD_CHECK_EVERY = 1000  # match() calls between rule file mtime checks
+RELOAD_CHECK_SECONDS = 2.0  # ...or seconds, whichever comes first on a slow stream
+SAMPLE_EVERY = 16  # time one evaluation in N per rule; counts stay exact
+
+log = get_logger("rules")
+
+# A rule (JSON or YAML), Sigma-like:
+#   id: encoded_powershell
+#   title: Encoded PowerShell command line
+#   level: high
+#   detection:
+#     selection:                       # a map ANDs its fields; a list of maps ORs them
+#       EventID: [1, 4688]             # a list ORs its values
+#       Image|endswith: \powershell.exe
+#       CommandLine|contains: [" -enc ", " -encodedcommand "]
+#     filter:
+#       CommandLine|contains|all: ["-enc", "legit"]
+#     condition: selection and not filter
+# String comparisons ignore case. Conditions combine selection names with
+# and, or, not, parentheses, "1 of name*", "all of name*" and "1 of them".
+# Every rule needs an id.
+
+Predicate = Callable[[Any, "_Lowered"], bool]
+
+class RuleError(ValueError):
+    """A rule file or rule that cannot be compiled"""
+
+class _Lowered(dict):
+    """Per-event cache of lower-cased field values, filled on first use"""
+    
+    __slots__ = ("event",)
+    
+    def __init__(self, event: Any):
+        super().__init__()
+        self.event = event
+    
+    def __missing__(self, field: str) -> str:
+        value = self.event.get(field)
+        text = "" if value is None else (value if type(value) is str else str(value)).lower()
+        self[field] = text
+        return text
+
+def _field_predicate(field: str, modifiers: List[str], values: Any) -> Predicate:
+    """Compile one "Field|modifier: value(s)" condition"""
+    for modifier in modifiers:
+        if modifier not in MODIFIERS:
+            raise RuleError(f"Unknown modifier {modifier!r} on {field}, expected one of {MODIFIERS}")
+    values = values if isinstance(values, list) else [values]
+    combine = all if "all" in modifiers else any
+    
+    if None in values:
+        if len(values) > 1 or modifiers:
+            raise RuleError(f"{field}: null can only be used alone, to match a missing or empty field")
+        return lambda event, lowered: lowered[field] == ""
+    
+    if "re" in modifiers:
+        patterns = [re.compile(str(value), re.IGNORECASE) for value in values]
+        return lambda event, lowered: combine(pattern.search(lowered[field]) is not None for pattern in patterns)
+    
+    needles = [str(value).lower() for value in values]
+    if "contains" in modifiers:
+        if combine is any and len(needles) == 1:
+            needle = needles[0]
+            return lambda event, lowered: needle in lowered[field]
+        return lambda event, lowered: combine(needle in lowered[field] for needle in needles)
+    if "startswith" in modifiers:
+        prefixes = tuple(needles)
+        if combine is all:
+            return lambda event, lowered: all(lowered[field].startswith(prefix) for prefix in prefixes)
+        return lambda event, lowered: lowered[field].startswith(prefixes)
+    if "endswith" in modifiers:
+        suffixes = tuple(needles)
+        if combine is all:
+            return lambda event, lowered: all(lowered[field].endswith(suffix) for suffix in suffixes)
+        return lambda event, lowered: lowered[field].endswith(suffixes)
+    
+    if combine is all and len(set(needles)) > 1:
+        return lambda event, lowered: False  # one value cannot equal several
+    if field == "EventID":
+        event_ids = frozenset(_event_id(value) for value in values)
+        return lambda event, lowered: event.get("EventID") in event_ids
+    choices = frozenset(needles)
+    return lambda event, lowered: lowered[field] in choices
+
+def _event_id(value: Any) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RuleError(f"EventID must be a number, got {value!r}") from None
+
+def _compile_map(selection: Dict[str, Any]) -> Tuple[Predicate, Dict[str, List[Any]]]:
+    """AND of the field conditions of one selection map, and its plain equality conditions"""
+    predicates = []
+    equalities: Dict[str, List[Any]] = {}
+    for key, values in selection.items():
+        field, *modifiers = str(key).split("|")
+        predicates.append(_field_predicate(field, modifiers, values))
+        if not modifiers and values is not None:
+            equalities[field] = values if isinstance(values, list) else [values]
+    return _all_of(predicates), equalities
+
+def _all_of(predicates: List[Predicate]) -> Predicate:
+    """AND of predicates as nested closures, cheaper to call than all() over a generator"""
+    combined = predicates[-1]
+    for predicate in reversed(predicates[:-1]):
+        combined = (lambda first, rest: lambda event, lowered: first(event, lowered) and rest(event, lowered))(
+            predicate, combined)
+    return combined
+
+def _any_of(predicates: List[Predicate]) -> Predicate:
+    combined = predicates[-1]
+    for predicate in reversed(predicates[:-1]):
+        combined = (lambda first, rest: lambda event, lowered: first(event, lowered) or rest(event, lowered))(
+            predicate, combined)
+    return combined
+
+def _compile_selection(name: str, selection: Any) -> Tuple[Predicate, Dict[str, List[Any]]]:
+    if isinstance(selection, dict):
+        return _compile_map(selection)
+    if isinstance(selection, list) and selection and all(isinstance(item, dict) for item in selection):
+        return _any_of([_compile_map(item)[0] for item in selection]), {}
+    raise RuleError(f"Selection {name!r} must be a map of field conditions or a list of maps")
+
+_TOKEN = re.compile(r"\s*(\(|\)|[A-Za-z0-9_*]+)")
+
+def _parse_condition(text: str, names: List[str]) -> Any:
+    """Parse a condition into a tree of ("and"|"or", a, b), ("not", a) and ("sel", name) nodes"""
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            if text[position:].strip():
+                raise RuleError(f"Cannot parse condition {text!r} at {text[position:]!r}")
+            break
+        tokens.append(match.group(1))
+        position = match.end()
+    tokens.append(None)
+    cursor = 0
+    
+    def peek() -> Optional[str]:
+        return tokens[cursor]
+    
+    def take() -> Optional[str]:
+        nonlocal cursor
+        cursor += 1
+        return tokens[cursor - 1]
+    
+    def expression() -> Any:
+        node = conjunction()
+        while peek() == "or":
+            take()
+            node = ("or", node, conjunction())
+        return node
+    
+    def conjunction() -> Any:
+        node = negation()
+        while peek() == "and":
+            take()
+            node = ("and", node, negation())
+        return node
+    
+    def negation() -> Any:
+        if peek() == "not":
+            take()
+            return ("not", negation())
+        return primary()
+    
+    def primary() -> Any:
+        token = take()
+        if token == "(":
+            node = expression()
+            if take() != ")":
+                raise RuleError(f"Unbalanced parentheses in condition {text!r}")
+            return node
+        if token in ("1", "all") and peek() == "of":
+            take()
+            target = take()
+            if target is None:
+                raise RuleError(f"Missing selection after 'of' in condition {text!r}")
+            matched = names if target == "them" else fnmatch.filter(names, target)
+            if not matched:
+                raise RuleError(f"No selection matches {target!r} in condition {text!r}")
+            node = ("sel", matched[0])
+            for name in matched[1:]:
+                node = ("or" if token == "1" else "and", node, ("sel", name))
+            return node
+        if token not in names:
+            raise RuleError(f"Unknown selection {token!r} in condition {text!r}")
+        return ("sel", token)
+    
+    tree = expression()
+    if peek() is not None:
+        raise RuleError(f"Unexpected {peek()!r} in condition {text!r}")
+    return tree
+
+def _compile_tree(tree: Any, selections: Dict[str, Predicate]) -> Predicate:
+    op = tree[0]
+    if op == "sel":
+        return selections[tree[1]]
+    if op == "not":
+        inner = _compile_tree(tree[1], selections)
+        return lambda event, lowered: not inner(event, lowered)
+    left, right = _compile_tree(tree[1], selections), _compile_tree(tree[2], selections)
+    if op == "and":
+        return lambda event, lowered: left(event, lowered) and right(event, lowered)
+    return lambda event, lowered: left(event, lowered) or right(event, lowered)
+
+def _required_selections(tree: Any) -> List[str]:
+    """Selections every match must satisfy (those reached through and only)"""
+    if tree[0] == "sel":
+        return [tree[1]]
+    if tree[0] == "and":
+        return _required_selections(tree[1]) + _required_selections(tree[2])
+    return []
+
+class Rule:
+    """A compiled rule with its index key and evaluation counters"""
+    
+    def __init__(self, rule_id: str, title: str, level: str, predicate: Predicate,
+                 index_field: Optional[str] = None, index_values: Iterable[Any] = ()):
+        self.id = rule_id
+        self.title = title
+        self.level = level
+        self.predicate = predicate
+        # An equality every match needs; the engine only evaluates the rule
+        # for events whose index_field has one of index_values
+        self.index_field = index_field
+        self.index_values = list(dict.fromkeys(index_values))
+        self.evaluations = 0
+        self.matches = 0
+        self.samples = 0
+        self.sampled_seconds = 0.0
+    
+    def inherit(self, other: "Rule") -> None:
+        """Carry over the counters of the rule this one replaces"""
+        self.evaluations, self.matches = other.evaluations, other.matches
+        self.samples, self.sampled_seconds = other.samples, other.sampled_seconds
+    
+    def estimated_seconds(self) -> float:
+        """Total evaluation time, extrapolated from the sampled evaluations"""
+        if not self.samples:
+            return 0.0
+        return self.sampled_seconds / self.samples * self.evaluations
+    
+    def stats(self) -> Dict[str, Any]:
+        seconds = self.estimated_seconds()
+        return {
+            "id": self.id,
+            "evaluations": self.evaluations,
+            "matches": self.matches,
+            "seconds": seconds,
+            "us_per_evaluation": seconds / self.evaluations * 1e6 if self.evaluations else 0.0,
+        }
+    
+    def __repr__(self) -> str:
+        return f"Rule({self.id!r})"
+
+def compile_rule(spec: Dict[str, Any]) -> Rule:
+    """Compile one rule spec into predicate closures and pick its index key"""
+    if not isinstance(spec, dict):
+        raise RuleError(f"Rule must be a map: {spec!r}")
+    rule_id = spec.get("id")
+    if not rule_id:
+        raise RuleError(f"Rule without an id: {spec!r}")
+    detection = spec.get("detection")
+    if not isinstance(detection, dict):
+        raise RuleError(f"Rule {rule_id}: detection must be a map of selections and a condition")
+    
+    detection = dict(detection)
+    condition = detection.pop("condition", "all of them")
+    if not detection:
+        raise RuleError(f"Rule {rule_id}: no selections")
+    selections: Dict[str, Predicate] = {}
+    equalities: Dict[str, Dict[str, List[Any]]] = {}
+    for name, selection in detection.items():
+        try:
+            selections[name], equalities[name] = _compile_selection(name, selection)
+        except (RuleError, re.error) as e:
+            raise RuleError(f"Rule {rule_id}: {e}") from None
+    try:
+        tree = _parse_condition(str(condition), list(selections))
+    except RuleError as e:
+        raise RuleError(f"Rule {rule_id}: {e}") from None
+    
+    # Index on EventID when a required selection pins it, else on another equality
+    index_field, index_values = None, []
+    for name in _required_selections(tree):
+        for field, values in equalities[name].items():
+            if field == "EventID":
+                index_field, index_values = field, [_event_id(value) for value in values]
+                break
+            if index_field is None:
+                index_field, index_values = field, [str(value).lower() for value in values]
+        if index_field == "EventID":
+            break
+    
+    return Rule(rule_id, spec.get("title", rule_id), spec.get("level", "medium"),
+                _compile_tree(tree, selections), index_field, index_values)
+
+def _rule_files(path: str) -> List[str]:
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith(RULE_SUFFIXES))
+    return [path]
+
+def load_rule_specs(path: str) -> List[Dict[str, Any]]:
+    """Rule specs from a JSON/YAML file or a directory of them; a file holds one rule or a list"""
+    specs: List[Dict[str, Any]] = []
+    for file_path in _rule_files(path):
+        with open(file_path, 'r') as f:
+            if file_path.endswith((".yml", ".yaml")):
+                if yaml is None:
+                    raise RuleError(f"{file_path}: YAML rules require PyYAML (pip install pyyaml)")
+                documents = [document for document in yaml.safe_load_all(f) if document is not None]
+            else:
+                documents = [json.load(f)]
+        for document in documents:
+            specs.extend(document if isinstance(document, list) else [document])
+    return specs
+
+class RuleEngine:
+    """Evaluate compiled rules, checking each event only against the rules that can apply
+    
+    Rules are bucketed by their index key: EventID (a dict lookup on the
+    event's EventID), another required equality such as Image (a lookup on
+    the lower-cased field), or none (evaluated for every event). With a
+    source path, the rule files are checked for changes every
+    RELOAD_CHECK_EVERY events or RELOAD_CHECK_SECONDS, whichever comes
+    first, and recompiled in place; a broken edit keeps the previous rules.
+    """
+    
+    def __init__(self, rules: List[Rule], source: Optional[str] = None, sample_every: int = SAMPLE_EVERY):
+        self.source = source
+        self.sample_every = max(1, sample_every)
+        self.reloads = 0
+        self._calls = 0
+        self._next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+        self._signature = self._source_signature()
+        self._install(rules)
+    
+    @classmethod
+    def from_path(cls, path: str, **options) -> "RuleEngine":
+        return cls(load_rules(path), source=path, **options)
+    
+    def _install(self, rules: List[Rule]) -> None:
+        ids = [rule.id for rule in rules]
+        duplicates = sorted({rule_id for rule_id in ids if ids.count(rule_id) > 1})
+        if duplicates:
+            raise RuleError(f"Duplicate rule ids: {', '.join(duplicates)}")
+        by_event_id: Dict[int, List[Rule]] = {}
+        by_field: Dict[str, Dict[str, List[Rule]]] = {}
+        unindexed: List[Rule] = []
+        for rule in rules:
+            if rule.index_field == "EventID":
+                for event_id in rule.index_values:
+                    by_event_id.setdefault(event_id, []).append(rule)
+            elif rule.index_field is not None:
+                table = by_field.setdefault(rule.index_field, {})
+                for value in rule.index_values:
+                    table.setdefault(value, []).append(rule)
+            else:
+                unindexed.append(rule)
+        self.rules = rules
+        self._by_event_id = by_event_id
+        self._by_field = by_field
+        self._unindexed = unindexed
+        self._order = {id(rule): position for position, rule in enumerate(rules)}
+    
+    def match(self, event: Any) -> List[Rule]:
+        """Rules the event matches, in rule file order"""
+        self._calls += 1
+        if self.source is not None and (self._calls >= RELOAD_CHECK_EVERY or time.monotonic() >= self._next_check):
+            self._calls = 0
+            self._next_check = time.monotonic() + RELOAD_CHECK_SECONDS
+            self.maybe_reload()
+        
+        candidates = self._by_event_id.get(event.get("EventID"), [])
+        lowered = _Lowered(event)
+        if self._by_field:
+            candidates = list(candidates)
+            for field, table in self._by_field.items():
+                candidates.extend(table.get(lowered[field], ()))
+        if self._unindexed:
+            candidates = list(candidates) + self._unindexed
+        
+        matched = []
+        sample_every = self.sample_every
+        for rule in candidates:
+            rule.evaluations += 1
+            if rule.evaluations % sample_every == 0:  # each rule's own evaluations, whatever the candidate count
+                started = time.perf_counter()
+                hit = rule.predicate(event, lowered)
+                rule.sampled_seconds += time.perf_counter() - started
+                rule.samples += 1
+            else:
+                hit = rule.predicate(event, lowered)
+            if hit:
+                rule.matches += 1
+                matched.append(rule)
+        if len(matched) > 1:
+            matched.sort(key=lambda rule: self._order[id(rule)])
+        return matched
+    
+    def _source_signature(self) -> Optional[Tuple[Tuple[str, float], ...]]:
+        if self.source is None:
+            return None
+        try:
+            return tuple((path, os.stat(path).st_mtime) for path in _rule_files(self.source))
+        except OSError:
+            return None
+    
+    def maybe_reload(self) -> bool:
+        """Recompile the rules if their files changed; True when new rules were installed"""
+        signature = self._source_signature()
+        if signature is None or signature == self._signature:
+            return False
+        self._signature = signature
+        try:
+            rules = load_rules(self.source)
+            previous = {rule.id: rule for rule in self.rules}
+            self._install(rules)
+        except RULE_LOAD_ERRORS as e:
+            log.warning("[Rules] Warning: Keeping the previous rules, could not reload %s: %s", self.source, e)
+            return False
+        for rule in rules:  # keep the counters of rules that survive the reload
+            if rule.id in previous:
+                rule.inherit(previous[rule.id])
+        self.reloads += 1
+        log.info("[Rules] Reloaded %d rules from %s", len(rules), self.source)
+        return True
+    
+    def stats(self) -> List[Dict[str, Any]]:
+        """Per-rule evaluations, matches and estimated time, most expensive first"""
+        return sorted((rule.stats() for rule in self.rules), key=lambda stats: stats["seconds"], reverse=True)
+    
+    def index_summary(self) -> Dict[str, int]:
+        return {
+            "event_id": len({id(rule) for rules in self._by_event_id.values() for rule in rules}),
+            "field": len({id(rule) for table in self._by_field.values() for rules in table.values() for rule in rules}),
+            "unindexed": len(self._unindexed),
+        }
+
+def load_rules(path: str) -> List[Rule]:
+    """Compile every rule under path (a file or a directory)"""
+    return [compile_rule(spec) for spec in load_rule_specs(path)]
+
+def rule_alert(event: Any, matched: List[Rule]) -> Dict[str, Any]:
+    """Alert record for an event: its fields plus the ids and highest level of the rules it matched"""
+    alert = event.to_dict() if hasattr(event, "to_dict") else dict(event)
+    alert["Rules"] = [rule.id for rule in matched]
+    alert["Level"] = max((rule.level for rule in matched), key=lambda level: LEVELS.get(level, 0))
+    return alert
@@ -0,0 +1,175 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIONS = ("none", "gzip", "zstd")
+SEGMENT_SUFFIXES = {"none": ".jsonl", "gzip": ".jsonl.gz", "zstd": ".jsonl.zst"}
+SEGMENT_ACTIONS = ("keep", "delete", "archive")  # what the consumer does with a finished segment
+SEGMENT_BYTES = 64 << 20  # uncompressed bytes per segment before rotating
+MANIFEST_NAME = "manifest.json"
+ARCHIVE_DIR = "archive"
+GZIP_LEVEL = 1  # favour throughput; JSONL still shrinks several times
+ZSTD_LEVEL = 3
+MANIFEST_VERSION = 1
+
+# Segmented buffer layout (a directory):
+#   segment-000001.jsonl[.gz|.zst] ...  finished segments, JSONL lines
+#   segment-000007.jsonl.gz.part        the segment being written
+#   manifest.json                       {"version", "compression", "segments": [entry, ...]}
+# A segment is renamed from .part and listed in the manifest only once it is
+# complete, so readers never see a partial segment.
+
+def _require_zstandard() -> None:
+    if zstandard is None:
+        raise RuntimeError("zstd compression requires the zstandard package (pip install zstandard)")
+
+def compression_for(path: str) -> str:
+    """Compression implied by a file name (.gz, .zst or neither)"""
+    if path.endswith(".gz"):
+        return "gzip"
+    if path.endswith(".zst"):
+        return "zstd"
+    return "none"
+
+def open_compressed(path: str, mode: str = 'rb') -> BinaryIO:
+    """Open a plain, gzip or zstd file for binary reading or writing, chosen by extension"""
+    compression = compression_for(path.removesuffix(".part"))
+    if compression == "gzip":
+        return gzip.open(path, mode, compresslevel=GZIP_LEVEL) if 'w' in mode else gzip.open(path, mode)
+    if compression == "zstd":
+        _require_zstandard()
+        raw = open(path, mode)
+        if 'w' in mode:
+            return zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True))
+    return open(path, mode)
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+def read_manifest(directory: str) -> Dict[str, Any]:
+    """The manifest of a segmented buffer directory"""
+    path = os.path.join(directory, MANIFEST_NAME)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No {MANIFEST_NAME} in {directory}")
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def is_segmented(path: str) -> bool:
+    return os.path.isdir(path) and os.path.exists(os.path.join(path, MANIFEST_NAME))
+
+class SegmentWriter:
+    """Write a JSONL buffer as rotated, optionally compressed segments with a manifest
+    
+    A segment is finished once it holds max_bytes of uncompressed JSONL or,
+    with max_seconds, once it has been open that long. Blocks passed to
+    write() are never split, so every segment holds whole lines.
+    """
+    
+    def __init__(self, directory: str, compression: str = "none", max_bytes: int = SEGMENT_BYTES,
+                 max_seconds: Optional[float] = None, prefix: str = "segment"):
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, expected one of {COMPRESSIONS}")
+        if compression == "zstd":
+            _require_zstandard()
+        self.directory = directory
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.prefix = prefix
+        self.segments: List[Dict[str, Any]] = []
+        self._file: Optional[BinaryIO] = None
+        self._entry: Dict[str, Any] = {}
+        self._opened = 0.0
+    
+    def open(self) -> "SegmentWriter":
+        os.makedirs(self.directory, exist_ok=True)
+        manifest_path = os.path.join(self.directory, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            manifest = read_manifest(self.directory)
+            self.segments = manifest.get("segments", [])
+        return self
+    
+    def _next_name(self) -> str:
+        index = int(self.segments[-1]["name"].split("-")[-1].split(".")[0]) + 1 if self.segments else 1
+        return f"{self.prefix}-{index:06d}{SEGMENT_SUFFIXES[self.compression]}"
+    
+    def _start(self) -> None:
+        name = self._next_name()
+        self._file = open_compressed(os.path.join(self.directory, name + ".part"), 'wb')
+        self._entry = {"name": name, "records": 0, "bytes": 0, "opened": _now()}
+        self._opened = time.monotonic()
+    
+    def write(self, data: bytes, records: int) -> None:
+        """Append a block of records records (whole JSONL lines)"""
+        if self._file is not None and self.max_seconds is not None \
+                and time.monotonic() - self._opened >= self.max_seconds:
+            self.rotate()
+        if self._file is None:
+            self._start()
+        self._file.write(data)
+        self._entry["records"] += records
+        self._entry["bytes"] += len(data)
+        if self._entry["bytes"] >= self.max_bytes:
+            self.rotate()
+    
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+    
+    def rotate(self) -> None:
+        """Finish the current segment and list it in the manifest"""
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        path = os.path.join(self.directory, self._entry["name"])
+        os.replace(path + ".part", path)
+        self._entry["size"] = os.path.getsize(path)
+        self._entry["closed"] = _now()
+        self.segments.append(self._entry)
+        self._write_manifest()
+    
+    def _write_manifest(self) -> None:
+        manifest = {"version": MANIFEST_VERSION, "compression": self.compression, "segments": self.segments}
+        path = os.path.join(self.directory, MANIFEST_NAME)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(f"{path}.tmp", path)
+    
+    def close(self) -> None:
+        self.rotate()
+        if not os.path.exists(os.path.join(self.directory, MANIFEST_NAME)):
+            self._write_manifest()  # an empty buffer still gets a manifest
+    
+    def __enter__(self) -> "SegmentWriter":
+        return self.open()
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+def pending_segments(directory: str) -> List[str]:
+    """Paths of the manifest's segments still present (not yet deleted or archived), in order"""
+    paths = [os.path.join(directory, entry["name"]) for entry in read_manifest(directory).get("segments", [])]
+    return [path for path in paths if os.path.exists(path)]
+
+def finish_segment(path: str, action: str = "keep") -> None:
+    """Keep, delete or move a consumed segment to the archive/ subdirectory"""
+    if action not in SEGMENT_ACTIONS:
+        raise ValueError(f"Unknown segment action {action!r}, expected one of {SEGMENT_ACTIONS}")
+    if action == "delete":
+        os.remove(path)
+    elif action == "archive":
+        archive = os.path.join(os.path.dirname(path), ARCHIVE_DIR)
+        os.makedirs(archive, exist_ok=True)
+        shutil.move(path, os.path.join(archive, os.path.basename(path)))
@@ -0,0 +1,348 @@
+import json
+import os
+import log_codec
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+from log_utils import utc_time_to_epoch
+
+FSYNC_POLICIES = ("never", "batch", "close")
+SUPPRESS_MAX_KEYS = 10_000  # exact signatures tracked by SuppressingSink
+
+def _as_dict(alert: Any) -> Any:
+    """Plain dict for a SysmonEvent (or other record with to_dict), for the fast encoder path"""
+    to_dict = getattr(alert, "to_dict", None)
+    return to_dict() if to_dict is not None else alert
+
+class AlertSink:
+    """Base class for alert outputs; subclasses implement write()"""
+    
+    def open(self) -> None:
+        pass
+    
+    def write(self, alert: Dict[str, Any]) -> None:
+        raise NotImplementedError
+    
+    def admit(self, alert: Dict[str, Any]) -> bool:
+        """Whether alert should be reported and written (False when a wrapper suppresses it)"""
+        return True
+    
+    def flush(self) -> None:
+        pass
+    
+    def close(self) -> None:
+        self.flush()
+    
+    def describe(self) -> str:
+        return type(self).__name__
+    
+    def __enter__(self) -> "AlertSink":
+        self.open()
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+class JsonArraySink(AlertSink):
+    """Pretty-printed JSON array export (the alerts.json format), written one alert at a time"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        self.count = 0
+        self._file = None
+    
+    def open(self) -> None:
+        self._file = open(self.path, 'w')
+        self._file.write("[")
+        self.count = 0
+    
+    def write(self, alert: Dict[str, Any]) -> None:
+        # Same layout json.dump(alerts, indent=2) produces for the whole list
+        text = json.dumps(_as_dict(alert), indent=2, default=str).replace("\n", "\n  ")
+        self._file.write(("," if self.count else "") + "\n  " + text)
+        self.count += 1
+    
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+    
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.write("\n]" if self.count else "]")
+            self._file.close()
+            self._file = None
+    
+    def describe(self) -> str:
+        return self.path
+
+class JsonlAlertSink(AlertSink):
+    """Append-only JSONL alert file with batched writes, fsync policy and size-based rotation
+    
+    Alerts are buffered until batch_size alerts are pending or flush_interval
+    seconds have passed since the last flush. fsync is one of FSYNC_POLICIES:
+    "never" leaves syncing to the OS, "batch" syncs after every flushed batch
+    and "close" syncs once on close. With max_bytes set, the file is rotated
+    before it would grow past that size, keeping backup_count old files as
+    path.1 (newest) to path.N.
+    """
+    
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 fsync: str = "close", max_bytes: Optional[int] = None, backup_count: int = 5):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync must be one of {FSYNC_POLICIES}, got {fsync!r}")
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.count = 0
+        self._pending: List[bytes] = []
+        self._file = None
+        self._size = 0
+        self._last_flush = time.monotonic()
+    
+    def open(self) -> None:
+        self._file = open(self.path, 'ab')
+        self._size = os.fstat(self._file.fileno()).st_size
+        self._last_flush = time.monotonic()
+    
+    def write(self, alert: Dict[str, Any]) -> None:
+        self._pending.append(log_codec.dumps_line(_as_dict(alert)))
+        self.count += 1
+        if len(self._pending) >= self.batch_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._pending or self._file is None:
+            return
+        
+        data = b"".join(self._pending)
+        self._pending.clear()
+        if self.max_bytes and self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+        if self.fsync == "batch":
+            os.fsync(self._file.fileno())
+    
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self.flush()
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+    
+    def _rotate(self) -> None:
+        """Shift path -> path.1 -> ... -> path.N and start a new file"""
+        self._file.close()
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f"{self.path}.{index}"
+                if os.path.exists(source):
+                    os.replace(source, f"{self.path}.{index + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+        self._size = 0
+    
+    def describe(self) -> str:
+        return self.path
+
+class MultiSink(AlertSink):
+    """Send every alert to several sinks"""
+    
+    def __init__(self, sinks: List[AlertSink]):
+        self.sinks = sinks
+    
+    def open(self) -> None:
+        for sink in self.sinks:
+            sink.open()
+    
+    def write(self, alert: Dict[str, Any]) -> None:
+        for sink in self.sinks:
+            sink.write(alert)
+    
+    def flush(self) -> None:
+        for sink in self.sinks:
+            sink.flush()
+    
+    def close(self) -> None:
+        for sink in self.sinks:
+            sink.close()
+    
+    def describe(self) -> str:
+        return ", ".join(sink.describe() for sink in self.sinks)
+
+class CountMinSketch:
+    """Fixed-size frequency estimates for any number of keys
+    
+    Estimates never undercount; they overcount by at most about
+    2 * total / width with high probability. Every width * 10 additions all
+    counters are halved, so old heavy hitters fade.
+    """
+    
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+        self.additions = 0
+        self._age_every = width * 10
+    
+    def _indexes(self, key: Any) -> List[int]:
+        # Kirsch-Mitzenmacher: depth indexes from two halves of one 64-bit hash
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [(h1 + row * h2) % self.width for row in range(self.depth)]
+    
+    def add(self, key: Any) -> int:
+        """Count one occurrence of key, returning its new estimate"""
+        estimate = None
+        for row, index in zip(self.rows, self._indexes(key)):
+            row[index] += 1
+            if estimate is None or row[index] < estimate:
+                estimate = row[index]
+        self.additions += 1
+        if self.additions >= self._age_every:
+            self.additions = 0
+            for row in self.rows:
+                row[:] = [count >> 1 for count in row]
+        return estimate
+    
+    def estimate(self, key: Any) -> int:
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+class SuppressingSink(AlertSink):
+    """Collapse repeated alerts with the same signature within ttl seconds
+    
+    The signature is an alert's (EventID, Image, CommandLine). The first
+    alert of a signature is admitted and written at once; repeats within
+    ttl seconds of it are only counted. When the window closes, one
+    collapsed alert is written: the first alert with Count (all occurrences),
+    SuppressedCount and LastUtcTime added.
+    
+    At most max_keys signatures are tracked exactly. When the map is full,
+    a count-min sketch of the signatures seen outside it decides admission:
+    a new signature replaces the oldest one only if it has been seen more
+    often than the oldest has repeated, so a flood of one-off signatures
+    cannot push out the heavy hitters. Memory is fixed by max_keys and the
+    sketch size.
+    
+    Windows are measured in event time: the latest UtcTime seen so far
+    (alerts without a parsable UtcTime count as happening then), so a replayed
+    buffer collapses alerts that were ttl seconds apart when they happened,
+    however fast it is read. Pass clock (e.g. time.monotonic) to measure
+    windows in processing time instead, as live inputs do.
+    """
+    
+    def __init__(self, sink: AlertSink, ttl: float = 60.0, max_keys: int = SUPPRESS_MAX_KEYS,
+                 sketch: Optional[CountMinSketch] = None, clock: Optional[Callable[[], float]] = None):
+        if ttl <= 0 or max_keys < 1:
+            raise ValueError("ttl must be positive and max_keys at least 1")
+        self.sink = sink
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.sketch = sketch or CountMinSketch()
+        self.clock = clock
+        self._event_time = 0.0  # latest UtcTime seen (epoch seconds), without a clock
+        self.suppressed = 0
+        self.collapsed = 0
+        # signature -> [first alert, count, last UtcTime, window start], oldest window first
+        self._windows: "OrderedDict[Tuple[Any, ...], List[Any]]" = OrderedDict()
+    
+    def open(self) -> None:
+        self.sink.open()
+    
+    def _now(self, alert: Optional[Dict[str, Any]] = None) -> float:
+        if self.clock is not None:
+            return self.clock()
+        if alert is not None:
+            event_time = utc_time_to_epoch(alert["UtcTime"])
+            if event_time is not None and event_time > self._event_time:
+                self._event_time = event_time
+        return self._event_time
+    
+    def admit(self, alert: Dict[str, Any]) -> bool:
+        now = self._now(alert)
+        self._expire(now)
+        signature = (alert["EventID"], alert["Image"], alert["CommandLine"])
+        window = self._windows.get(signature)
+        if window is not None:
+            window[1] += 1
+            window[2] = alert["UtcTime"]
+            self.suppressed += 1
+            return False
+        
+        seen = self.sketch.add(signature)
+        if len(self._windows) >= self.max_keys:
+            oldest = next(iter(self._windows.values()))
+            if seen <= oldest[1]:
+                return True  # not admitted to the map: written, but not tracked
+            self._close_window(self._windows.popitem(last=False)[1])
+        self._windows[signature] = [alert, 1, alert["UtcTime"], now]
+        return True
+    
+    def write(self, alert: Dict[str, Any]) -> None:
+        self.sink.write(alert)
+    
+    def _expire(self, now: float) -> None:
+        windows = self._windows
+        cutoff = now - self.ttl
+        while windows:
+            window = next(iter(windows.values()))
+            if window[3] > cutoff:
+                break
+            windows.popitem(last=False)
+            self._close_window(window)
+    
+    def _close_window(self, window: List[Any]) -> None:
+        first, count, last_utc_time, _ = window
+        if count < 2:
+            return
+        collapsed = dict(_as_dict(first))
+        collapsed["Count"] = count
+        collapsed["SuppressedCount"] = count - 1
+        collapsed["LastUtcTime"] = last_utc_time
+        self.sink.write(collapsed)
+        self.collapsed += 1
+    
+    def flush(self) -> None:
+        self._expire(self._now())
+        self.sink.flush()
+    
+    def close(self) -> None:
+        while self._windows:
+            self._close_window(self._windows.popitem(last=False)[1])
+        self.sink.close()
+    
+    def stats(self) -> Dict[str, int]:
+        return {"suppressed": self.suppressed, "collapsed": self.collapsed, "tracked": len(self._windows)}
+    
+    def describe(self) -> str:
+        return self.sink.describe()
+
+def build_sink(output_path: Optional[str] = None, sink: Optional[AlertSink] = None,
+               suppress_ttl: Optional[float] = None, suppress_max_keys: int = SUPPRESS_MAX_KEYS,
+               suppress_clock: Optional[Callable[[], float]] = None) -> AlertSink:
+    """Combine an optional alerts.json export with an optional extra sink
+    
+    With suppress_ttl, the outputs are wrapped in a SuppressingSink, timed
+    by suppress_clock (event time when None).
+    """
+    sinks: List[AlertSink] = []
+    if sink is not None:
+        sinks.append(sink)
+    if output_path:
+        sinks.append(JsonArraySink(output_path))
+    if not sinks:
+        raise ValueError("No alert output configured")
+    combined = sinks[0] if len(sinks) == 1 else MultiSink(sinks)
+    if suppress_ttl is not None:
+        return SuppressingSink(combined, suppress_ttl, suppress_max_keys, clock=suppress_clock)
+    return combined
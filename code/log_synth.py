@@ -0,0 +1,169 @@
+import argparse
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import log_codec
+
+SYNTH_COLUMNS = ["EventID", "UtcTime", "Image", "ProcessName", "CommandLine"]
+DEFAULT_CHUNKSIZE = 100_000
+SYNTH_FORMATS = ("csv", "jsonl")
+
+# Sysmon event types not in SUSPICIOUS_EVENT_IDS, weighted roughly as they
+# occur in a workstation stream (image loads, process access and registry
+# events dominate)
+BENIGN_EVENT_MIX = {7: 0.35, 10: 0.2, 13: 0.15, 12: 0.1, 22: 0.1, 5: 0.05, 2: 0.05}
+# Event types flagged by EventID alone
+SUSPICIOUS_EVENT_MIX = {1: 0.4, 3: 0.3, 11: 0.2, 4688: 0.05, 4624: 0.03, 4663: 0.02}
+
+# (Image, command line template); a few images make up most of the stream
+BENIGN_PROCESSES = [
+    ("C:\\Windows\\System32\\svchost.exe", "svchost.exe -k netsvcs -p -s {arg}"),
+    ("C:\\Windows\\System32\\svchost.exe", "svchost.exe -k localservice -p"),
+    ("C:\\Windows\\System32\\taskhostw.exe", "taskhostw.exe {arg}"),
+    ("C:\\Windows\\explorer.exe", "explorer.exe"),
+    ("C:\\Program Files\\Agent\\agent.exe", "agent.exe /scan /quiet /id {arg}"),
+    ("C:\\Windows\\System32\\conhost.exe", "conhost.exe 0xffffffff -forcev1"),
+    ("C:\\Windows\\System32\\notepad.exe", "notepad.exe notes_{arg}.txt"),
+    ("C:\\Program Files\\Browser\\browser.exe", "browser.exe --type=renderer --lang=en-us --id={arg}"),
+    ("C:\\Windows\\System32\\backgroundtaskhost.exe", "backgroundtaskhost.exe -serverid {arg}"),
+    ("C:\\Windows\\System32\\searchindexer.exe", "searchindexer.exe /embedding"),
+]
+# Command lines that match SUSPICIOUS_PATTERNS
+SUSPICIOUS_PROCESSES = [
+    ("C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe", "powershell.exe -enc {arg}"),
+    ("C:\\Temp\\tunnel.exe", "tunnel.exe --remote-host 203.0.113.5 --port 443 {arg}"),
+    ("C:\\Tools\\dump.exe", "dump.exe lsass {arg}"),
+    ("C:\\Windows\\System32\\net.exe", "net user backup {arg} /add"),
+    ("C:\\Windows\\System32\\runas.exe", "runas /user:administrator {arg}"),
+    ("C:\\Windows\\System32\\whoami.exe", "whoami /priv {arg}"),
+]
+# Zipf-like weights so the first entries repeat far more often than the last
+_BENIGN_WEIGHTS = np.array([1.0 / (rank + 1) for rank in range(len(BENIGN_PROCESSES))])
+_BENIGN_WEIGHTS /= _BENIGN_WEIGHTS.sum()
+
+def _mix(mix: Dict[int, float]) -> Tuple[np.ndarray, np.ndarray]:
+    event_ids = np.array(list(mix), dtype=np.int64)
+    weights = np.array(list(mix.values()), dtype=float)
+    return event_ids, weights / weights.sum()
+
+def _padding(rng: np.random.Generator, lengths: np.ndarray) -> List[str]:
+    """Hex argument strings of the given lengths (hex cannot form a suspicious literal)"""
+    alphabet = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    text = alphabet[rng.integers(0, 16, size=int(lengths.sum()))].tobytes().decode("ascii")
+    ends = np.cumsum(lengths)
+    return [text[end - length:end] for end, length in zip(ends.tolist(), lengths.tolist())]
+
+def generate_frame(rows: int, seed: int = 0, suspicious_ratio: float = 0.05,
+                   pattern_share: float = 0.5, event_mix: Optional[Dict[int, float]] = None,
+                   arg_length_mean: float = 24.0, arg_length_sigma: float = 0.8,
+                   empty_cmdline_ratio: float = 0.1, start: Any = "2024-01-15 09:30:00",
+                   events_per_sec: float = 1000.0, chunk_index: int = 0) -> pd.DataFrame:
+    """One seeded DataFrame of synthetic Sysmon events in the sample_data.csv schema
+    
+    suspicious_ratio of the rows are flagged by is_suspicious: pattern_share
+    of those through a command line matching SUSPICIOUS_PATTERNS, the rest
+    through a suspicious EventID. Other rows draw their EventID from
+    event_mix (default BENIGN_EVENT_MIX). Command line arguments have
+    log-normal lengths around arg_length_mean; empty_cmdline_ratio of the
+    rows have no command line. UtcTime starts at start and advances by
+    exponential gaps averaging 1/events_per_sec seconds.
+    """
+    rng = np.random.default_rng([seed, chunk_index])
+    benign_ids, benign_weights = _mix(event_mix or BENIGN_EVENT_MIX)
+    suspicious_ids, suspicious_weights = _mix(SUSPICIOUS_EVENT_MIX)
+    
+    suspicious = rng.random(rows) < suspicious_ratio
+    by_pattern = suspicious & (rng.random(rows) < pattern_share)
+    by_event_id = suspicious & ~by_pattern
+    
+    event_ids = rng.choice(benign_ids, size=rows, p=benign_weights)
+    event_ids[by_event_id] = rng.choice(suspicious_ids, size=int(by_event_id.sum()), p=suspicious_weights)
+    
+    process_index = rng.choice(len(BENIGN_PROCESSES), size=rows, p=_BENIGN_WEIGHTS)
+    suspicious_index = rng.integers(0, len(SUSPICIOUS_PROCESSES), size=rows)
+    lengths = np.clip(rng.lognormal(np.log(arg_length_mean), arg_length_sigma, size=rows), 1, 4096).astype(np.int64)
+    arguments = _padding(rng, lengths)
+    empty = (rng.random(rows) < empty_cmdline_ratio) & ~by_pattern
+    
+    images: List[str] = []
+    command_lines: List[str] = []
+    for row in range(rows):
+        if by_pattern[row]:
+            image, template = SUSPICIOUS_PROCESSES[suspicious_index[row]]
+        else:
+            image, template = BENIGN_PROCESSES[process_index[row]]
+        images.append(image)
+        command_lines.append("" if empty[row] else template.format(arg=arguments[row]))
+    
+    gaps = rng.exponential(1.0 / events_per_sec, size=rows)
+    times = pd.Timestamp(start) + pd.to_timedelta(np.cumsum(gaps), unit="s")
+    frame = pd.DataFrame({
+        "EventID": event_ids,
+        "UtcTime": times.strftime("%Y-%m-%d %H:%M:%S.%f").str[:-3],
+        "Image": images,
+        "ProcessName": [image.rsplit("\\", 1)[-1] for image in images],
+        "CommandLine": command_lines,
+    }, columns=SYNTH_COLUMNS)
+    frame.attrs["end_time"] = times[-1] if rows else pd.Timestamp(start)
+    return frame
+
+def generate_chunks(rows: int, chunksize: int = DEFAULT_CHUNKSIZE, seed: int = 0,
+                    start: Any = "2024-01-15 09:30:00", **options) -> Iterator[pd.DataFrame]:
+    """Yield rows events in DataFrames of at most chunksize, with continuous UtcTime
+    
+    Output depends only on rows, chunksize, seed and options, so the same
+    arguments reproduce the same data.
+    """
+    produced = 0
+    chunk_index = 0
+    while produced < rows:
+        size = min(chunksize, rows - produced)
+        frame = generate_frame(size, seed=seed, start=start, chunk_index=chunk_index, **options)
+        start = frame.attrs["end_time"]
+        produced += size
+        chunk_index += 1
+        yield frame
+
+def write_synthetic(path: str, rows: int, output_format: str = "csv", chunksize: int = DEFAULT_CHUNKSIZE,
+                    **options) -> int:
+    """Write rows synthetic events to path as CSV or JSONL, returning the row count"""
+    if output_format not in SYNTH_FORMATS:
+        raise ValueError(f"Unknown output format {output_format!r}, expected one of {SYNTH_FORMATS}")
+    
+    written = 0
+    with open(path, 'wb') as f:
+        for chunk in generate_chunks(rows, chunksize, **options):
+            if output_format == "csv":
+                f.write(chunk.to_csv(index=False, header=written == 0).encode())
+            else:
+                records = chunk.astype(object).to_dict("records")
+                f.write(log_codec.dumps_lines(records))
+            written += len(chunk)
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic Sysmon events")
+    parser.add_argument("output_file")
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--format", choices=SYNTH_FORMATS, default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--suspicious-ratio", type=float, default=0.05,
+                        help="fraction of events is_suspicious should flag")
+    parser.add_argument("--pattern-share", type=float, default=0.5,
+                        help="fraction of suspicious events flagged by command line rather than EventID")
+    parser.add_argument("--arg-length-mean", type=float, default=24.0,
+                        help="typical length of generated command line arguments")
+    parser.add_argument("--events-per-sec", type=float, default=1000.0, help="average UtcTime event rate")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args()
+    
+    if not 0 <= args.suspicious_ratio <= 1 or not 0 <= args.pattern_share <= 1:
+        print("[Synth] Error: ratios must be between 0 and 1")
+        sys.exit(1)
+    count = write_synthetic(args.output_file, args.rows, args.format, args.chunksize, seed=args.seed,
+                            suspicious_ratio=args.suspicious_ratio, pattern_share=args.pattern_share,
+                            arg_length_mean=args.arg_length_mean, events_per_sec=args.events_per_sec)
+    print(f"[Synth] Wrote {count} events to {args.output_file}")
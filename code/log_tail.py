@@ -0,0 +1,196 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import sys
+import time
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+from log_diagnostics import get_logger
+from log_index import buffer_fingerprint
+
+READ_SIZE = 1 << 16
+
+log = get_logger("tail")
+
+# inotify event masks (linux/inotify.h)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+
+class PollingWatcher:
+    """Wait for file growth by polling with an adaptive interval.
+    
+    The interval starts at min_interval and doubles while the file stays
+    idle, up to max_interval, so an idle consumer does not busy-loop and a
+    busy one picks up new lines within a millisecond or two.
+    """
+    
+    def __init__(self, path: str, min_interval: float = 0.001, max_interval: float = 0.05):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+    
+    def wait(self, timeout: float) -> None:
+        """Sleep until the next poll, at most timeout seconds"""
+        time.sleep(max(0.0, min(self.interval, timeout)))
+        self.interval = min(self.interval * 2, self.max_interval)
+    
+    def reset(self) -> None:
+        """Go back to the shortest interval after the file grew"""
+        self.interval = self.min_interval
+    
+    def close(self) -> None:
+        pass
+
+class InotifyWatcher:
+    """Wait for file growth with Linux inotify (through libc, no extra dependency)"""
+    
+    def __init__(self, path: str):
+        self.path = path
+        libc_name = ctypes.util.find_library("c")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE
+        if libc.inotify_add_watch(self._fd, os.fsencode(path), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+    
+    def wait(self, timeout: float) -> None:
+        """Block until the file changes or timeout seconds pass"""
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if readable:
+            try:
+                while os.read(self._fd, 4096):
+                    pass
+            except BlockingIOError:
+                pass
+    
+    def reset(self) -> None:
+        pass
+    
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+def make_watcher(path: str) -> Any:
+    """Return an inotify watcher on Linux, falling back to adaptive polling"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(path)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(path)
+
+def load_checkpoint(checkpoint_path: str, input_path: str) -> Tuple[int, int]:
+    """Return the (byte offset, line number) to resume input_path from"""
+    try:
+        with open(checkpoint_path, 'r') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return 0, 0
+    except (OSError, ValueError) as e:
+        log.warning("[Consumer] Warning: Ignoring unreadable checkpoint %s: %s", checkpoint_path, e)
+        return 0, 0
+    
+    stat = os.stat(input_path)
+    offset = int(state.get("offset", 0))
+    fingerprint = state.get("fingerprint")
+    if (state.get("inode") != stat.st_ino or offset > stat.st_size
+            or (fingerprint is not None and _fingerprint(input_path, offset) != fingerprint)):
+        # Another file, or the same one rewritten in place (the producer truncates and rewrites it)
+        log.warning("[Consumer] Warning: Checkpoint does not match %s, starting from the beginning", input_path)
+        return 0, 0
+    return offset, int(state.get("line", 0))
+
+def _fingerprint(input_path: str, offset: int) -> str:
+    with open(input_path, 'rb') as f:
+        return buffer_fingerprint(f, offset)
+
+def save_checkpoint(checkpoint_path: str, input_path: str, offset: int, line_num: int) -> None:
+    """Atomically persist the byte offset and line number reached in input_path
+    
+    A fingerprint of the bytes before the offset (see log_index) lets
+    load_checkpoint tell a grown buffer from one rewritten in place.
+    """
+    state: Dict[str, Any] = {
+        "path": os.path.abspath(input_path),
+        "inode": os.stat(input_path).st_ino,
+        "offset": offset,
+        "line": line_num,
+        "fingerprint": _fingerprint(input_path, offset),
+    }
+    tmp_path = f"{checkpoint_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, checkpoint_path)
+
+def tail_lines(f: BinaryIO, offset: int = 0, follow: bool = False, watcher: Any = None,
+               idle_timeout: Optional[float] = None,
+               on_idle: Optional[Callable[[int], None]] = None,
+               on_truncate: Optional[Callable[[], None]] = None,
+               hold_partial: bool = False) -> Iterator[Tuple[int, bytes]]:
+    """Yield (end offset, line) for each line of a binary file from offset on.
+    
+    Without follow, reading stops at end of file and a trailing line without
+    a newline is yielded as-is, unless hold_partial is set: a run that will
+    be resumed from a checkpoint leaves it for the next run, as the writer
+    may be half-way through it. With follow, a partial trailing line is
+    always held back until its newline lands, and the generator waits on
+    watcher for the file to grow. It stops after idle_timeout seconds
+    without new data, or runs until the caller stops iterating. on_idle is
+    called with the current offset each time the reader catches up with the
+    writer. The file size is checked before every read; a file truncated
+    below the current offset is re-read from the start after calling
+    on_truncate.
+    """
+    if follow and watcher is None:
+        watcher = PollingWatcher(f.name)
+    f.seek(offset)
+    pending = b""
+    last_data = time.monotonic()
+    idle_offset = -1
+    
+    while True:
+        if os.fstat(f.fileno()).st_size < offset + len(pending):
+            log.warning("[Consumer] Warning: Input was truncated, re-reading from the start")
+            if on_truncate is not None:
+                on_truncate()
+            f.seek(0)
+            offset, pending, idle_offset = 0, b"", -1
+            continue
+        
+        chunk = f.read(READ_SIZE)
+        if chunk:
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                offset += len(line) + 1
+                yield offset, line
+            if watcher is not None:
+                watcher.reset()
+            last_data = time.monotonic()
+            continue
+        
+        if not follow:
+            if pending and not hold_partial:
+                yield offset + len(pending), pending
+            return
+        
+        if on_idle is not None and offset != idle_offset:
+            on_idle(offset)
+            idle_offset = offset
+        
+        timeout = 1.0
+        if idle_timeout is not None:
+            remaining = idle_timeout - (time.monotonic() - last_data)
+            if remaining <= 0:
+                return
+            timeout = min(timeout, remaining)
+        watcher.wait(timeout)
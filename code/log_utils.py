@@ -1,6 +1,34 @@
+import hashlib
 import json
+import math
+import mmap
+import os
 import re
-from typing import Dict, Any, List
+import sys
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from log_diagnostics import get_logger
+
+try:
+    from re import _parser as _sre_parse, _constants as _sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse as _sre_parse
+    import sre_constants as _sre_constants
+
+try:
+    import ahocorasick  # optional: pyahocorasick automaton for the literal prefilter
+except ImportError:
+    ahocorasick = None
+
+log = get_logger("utils")
 
 SUSPICIOUS_EVENT_IDS = [1, 3, 11, 4624, 4688, 4663]
 
@@ -13,31 +41,637 @@ SUSPICIOUS_PATTERNS = {
     "privilege_escalation": [r"runas", r"--admin", r"whoami\s+/priv"]
 }
 
-def parse_log_line(line_dict: Dict[str, Any]) -> Dict[str, Any]:
+def _required_literal(pattern: str) -> str:
+    """Longest run of top-level literal characters every match of pattern contains"""
+    try:
+        parsed = _sre_parse.parse(pattern)
+    except re.error:
+        return ""
+
+    best, run = "", []
+    for op, av in parsed:
+        if op is _sre_constants.LITERAL:
+            run.append(chr(av))
+            continue
+        if len(run) > len(best):
+            best = "".join(run)
+        run = []
+    if len(run) > len(best):
+        best = "".join(run)
+    return best.lower()
+
+def _literal_alternation(literals: List[str]) -> str:
+    """Build a prefix-factored alternation that prefers the longest literal"""
+    trie: Dict[str, Any] = {}
+    for literal in literals:
+        node = trie
+        for ch in literal:
+            node = node.setdefault(ch, {})
+        node[""] = {}  # end-of-literal marker
+
+    def build(node: Dict[str, Any]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return build(trie)
+
+class PatternMatcher:
+    """Precompiled matcher for a {category: [regex, ...]} rule set.
+
+    Every regex is compiled once. A literal prefilter (an Aho-Corasick
+    automaton when pyahocorasick is installed, otherwise one combined
+    alternation) finds the required literals present in the text, so only
+    regexes that can possibly match are evaluated.
+    """
+
+    def __init__(self, patterns: Dict[str, List[str]]):
+        self.source = patterns
+        self.rules: List[Tuple[str, str, "re.Pattern[str]"]] = []
+        self._always: List[int] = []
+        self._by_literal: Dict[str, List[int]] = {}
+
+        for category, category_patterns in patterns.items():
+            for pattern in category_patterns:
+                # IGNORECASE is still needed: rules such as "-[CR]\s" spell classes in upper case
+                self.rules.append((category, pattern, re.compile(pattern, re.IGNORECASE)))
+                literal = _required_literal(pattern)
+                if literal:
+                    self._by_literal.setdefault(literal, []).append(len(self.rules) - 1)
+                else:
+                    self._always.append(len(self.rules) - 1)
+
+        self._automaton = None
+        self._scanner = None
+        self._expand: Dict[str, List[int]] = {}
+        if not self._by_literal:
+            return
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for literal in self._by_literal:
+                self._automaton.add_word(literal, literal)
+            self._automaton.make_automaton()
+        else:
+            # The scanner reports the longest literal starting at each position,
+            # so each literal also stands for every other literal that prefixes it
+            self._scanner = re.compile(f"(?=({_literal_alternation(list(self._by_literal))}))")
+            for literal in self._by_literal:
+                self._expand[literal] = sorted(
+                    idx
+                    for prefix, indices in self._by_literal.items()
+                    if literal.startswith(prefix)
+                    for idx in indices
+                )
+
+    def candidates(self, text: str) -> List[int]:
+        """Indices of the rules whose required literal occurs in text, in rule order"""
+        found = set(self._always)
+        if self._automaton is not None:
+            for _, literal in self._automaton.iter(text):
+                found.update(self._by_literal[literal])
+        elif self._scanner is not None:
+            for literal in set(self._scanner.findall(text)):
+                found.update(self._expand[literal])
+        return sorted(found)
+
+    def search(self, text: str) -> bool:
+        """Return True as soon as any rule matches text (expected lower-cased)"""
+        rules = self.rules
+        return any(rules[idx][2].search(text) for idx in self.candidates(text))
+
+    def match(self, text: str) -> List[Tuple[str, str]]:
+        """Return every (category, pattern) pair that matches text (expected lower-cased)"""
+        rules = self.rules
+        return [rules[idx][:2] for idx in self.candidates(text) if rules[idx][2].search(text)]
+
+_pattern_matcher = PatternMatcher(SUSPICIOUS_PATTERNS)
+
+def get_pattern_matcher() -> PatternMatcher:
+    """Return the compiled matcher, recompiling if SUSPICIOUS_PATTERNS was rebound"""
+    global _pattern_matcher
+    if _pattern_matcher.source is not SUSPICIOUS_PATTERNS:
+        _pattern_matcher = PatternMatcher(SUSPICIOUS_PATTERNS)
+    return _pattern_matcher
+
+def invalidate_patterns() -> PatternMatcher:
+    """Recompile SUSPICIOUS_PATTERNS after editing it in place
+    
+    Lookups only check whether the dict was rebound, so that they stay
+    O(1) however many patterns there are; call this after appending to or
+    replacing a category of the current dict.
+    """
+    global _pattern_matcher
+    _pattern_matcher = PatternMatcher(SUSPICIOUS_PATTERNS)
+    return _pattern_matcher
+
+def load_patterns(patterns: Dict[str, List[str]]) -> PatternMatcher:
+    """Install a new pattern rule set and compile it once"""
+    global SUSPICIOUS_PATTERNS
+    SUSPICIOUS_PATTERNS = patterns
+    return invalidate_patterns()
+
+EVENT_FIELDS = ("EventID", "UtcTime", "Image", "ProcessName", "CommandLine")
+_EVENT_FIELD_SET = frozenset(EVENT_FIELDS)
+SOURCE_FIELD = "SourceHost"  # host tag the fan-in producer adds to records (see log_fanin)
+_SOURCE_EVENT_FIELDS = EVENT_FIELDS + (SOURCE_FIELD,)
+
+class SysmonEvent(Mapping):
+    """Parsed event with one slot per field, readable like the dict it replaces
+    
+    Supports event["Image"], event.get(), iteration, len(), dict(event) and
+    comparison with plain dicts. Image and ProcessName are interned, so the
+    few distinct paths and names repeated across millions of events are
+    stored once. SourceHost is a field only when the record had one.
+    """
+    
+    __slots__ = EVENT_FIELDS + (SOURCE_FIELD,)
+    
+    def __init__(self, EventID: int, UtcTime: str, Image: str, ProcessName: str, CommandLine: str,
+                 SourceHost: Optional[str] = None):
+        self.EventID = EventID
+        self.UtcTime = UtcTime
+        self.Image = sys.intern(Image)
+        self.ProcessName = sys.intern(ProcessName)
+        self.CommandLine = CommandLine
+        self.SourceHost = None if SourceHost is None else sys.intern(SourceHost)
+    
+    def __getitem__(self, key: str) -> Any:
+        if key in _EVENT_FIELD_SET:
+            return getattr(self, key)
+        if key == SOURCE_FIELD and self.SourceHost is not None:
+            return self.SourceHost
+        raise KeyError(key)
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        if key not in _EVENT_FIELD_SET:
+            if key == SOURCE_FIELD and self.SourceHost is not None:
+                return self.SourceHost
+            return default
+        return getattr(self, key)
+    
+    def __iter__(self) -> Iterator[str]:
+        return iter(EVENT_FIELDS if self.SourceHost is None else _SOURCE_EVENT_FIELDS)
+    
+    def __len__(self) -> int:
+        return len(EVENT_FIELDS) if self.SourceHost is None else len(_SOURCE_EVENT_FIELDS)
+    
+    def __contains__(self, key: object) -> bool:
+        return key in _EVENT_FIELD_SET or (key == SOURCE_FIELD and self.SourceHost is not None)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        fields = {"EventID": self.EventID, "UtcTime": self.UtcTime, "Image": self.Image,
+                  "ProcessName": self.ProcessName, "CommandLine": self.CommandLine}
+        if self.SourceHost is not None:
+            fields[SOURCE_FIELD] = self.SourceHost
+        return fields
+    
+    def __repr__(self) -> str:
+        return f"SysmonEvent({self.to_dict()!r})"
+    
+    def __reduce__(self):
+        return SysmonEvent, tuple(getattr(self, field) for field in _SOURCE_EVENT_FIELDS)
+
+def _event_fields(event: Dict[str, Any]) -> Tuple[str, str, str]:
+    """(CommandLine, Image, ProcessName) of an event, the fields patterns run over"""
+    if type(event) is SysmonEvent:
+        return event.CommandLine, event.Image, event.ProcessName
+    return event.get("CommandLine", ""), event.get("Image", ""), event.get("ProcessName", "")
+
+def _event_text(event: Dict[str, Any]) -> str:
+    """Lower-cased text fields of an event, joined for pattern matching"""
+    command_line, image, process_name = _event_fields(event)
+    return f"{command_line.lower()} {image.lower()} {process_name.lower()}"
+
+IOC_MAGIC = b"SYSIOC01"
+IOC_SUFFIX = ".ioc"  # compiled, memory-mappable index (see IocIndex.save)
+IOC_VERSION = 1
+IOC_FALSE_POSITIVE_RATE = 0.01  # Bloom filter target; misses cost an exact lookup, never a wrong verdict
+IOC_MIN_TOKEN = 3  # shorter tokens (drive letters, switches) are not looked up
+
+# Text-field tokens: runs without whitespace, quotes or shell punctuation.
+# Each is also split on URL and path separators, so "http://evil.com:8080/x"
+# yields evil.com and "C:\Temp\mal.exe" yields mal.exe.
+_IOC_TOKEN = re.compile(r"[^\s\"'`<>|,;()\[\]{}]+")
+_IOC_PART = re.compile(r"[^\s\"'`<>|,;()\[\]{}/\\:=@?&#]+")
+_IOC_STRIP = ".,'\"`"
+IOC_TOKEN_CACHE = 65536  # distinct tokens whose lookup result is kept; streams repeat most tokens
+
+_MASK64 = (1 << 64) - 1
+
+def _ioc_digest(token: str) -> Tuple[int, int]:
+    """Two independent 64-bit hashes of a token, stable across processes (unlike hash())"""
+    digest = hashlib.blake2b(token.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little")
+
+def normalize_indicator(value: str) -> str:
+    """Indicators are matched as lower-cased whole tokens"""
+    return value.strip().strip(_IOC_STRIP).lower()
+
+def ioc_tokens(command_line: str, image: str, process_name: str) -> set:
+    """Distinct lower-cased tokens of an event's text fields, to look up in IOC feeds
+    
+    The whole Image and ProcessName are tokens (paths may contain spaces),
+    as is every command-line token and each of its URL/path components.
+    """
+    text = f"{command_line} {image}".lower()
+    tokens = set(_IOC_TOKEN.findall(text))
+    tokens.update(_IOC_PART.findall(text))
+    tokens.add(image.lower())
+    tokens.add(process_name.lower())
+    return {token.strip(".") for token in tokens if len(token) >= IOC_MIN_TOKEN}
+
+class IocIndex:
+    """Exact IOC membership behind a Bloom filter, over a compact (optionally memory-mapped) layout
+    
+    Each indicator is stored as a 64-bit blake2b key in a sorted array, with
+    a parallel byte array of category numbers. A token is hashed once; the
+    Bloom filter rejects almost every clean token with a few bit tests, and
+    only tokens that pass are binary-searched in the key array. Lookup
+    cost is O(tokens), independent of the feed size in practice.
+    
+    On disk (see save) the header, filter and arrays are laid out so load()
+    can memory-map the file and use it in place: startup does no parsing
+    or hashing and the pages are shared between worker processes.
+    """
+    
+    def __init__(self, bloom: Any, bloom_bits: int, hashes: int, keys: Any, category_ids: Any,
+                 categories: List[str], mapped: Optional[mmap.mmap] = None, source: Optional[str] = None):
+        self.bloom = bloom
+        self.bloom_bits = bloom_bits
+        self.hashes = hashes
+        self.keys = keys
+        self.category_ids = category_ids
+        self.categories = categories
+        self.source = source
+        self._mapped = mapped
+        self.lookups = 0
+        self.cache_hits = 0
+        self.bloom_passes = 0
+        self.hits = 0
+        self._probe_hits = 0
+        # Lookup results: a bounded set of clean tokens and the (few) matching ones
+        self._clean: set = set()
+        self._known: Dict[str, List[str]] = {}
+    
+    @classmethod
+    def from_indicators(cls, feeds: Dict[str, Iterable[str]],
+                        false_positive_rate: float = IOC_FALSE_POSITIVE_RATE) -> "IocIndex":
+        """Build an in-memory index from {category: indicators}"""
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("false_positive_rate must be between 0 and 1")
+        categories = list(feeds)
+        if len(categories) > 255:
+            raise ValueError("At most 255 IOC categories are supported")
+        entries = set()
+        for category_id, category in enumerate(categories):
+            for indicator in feeds[category]:
+                indicator = normalize_indicator(indicator)
+                if indicator:
+                    entries.add((_ioc_digest(indicator), category_id))
+        
+        count = max(len(entries), 1)
+        bloom_bits = max(64, math.ceil(-count * math.log(false_positive_rate) / math.log(2) ** 2))
+        hashes = max(1, round(bloom_bits / count * math.log(2)))
+        digests = np.array([digest for digest, _ in entries], dtype=np.uint64).reshape(-1, 2)
+        ids = np.array([category_id for _, category_id in entries], dtype=np.uint8)
+        
+        # Bit i of a token is (h1 + i * h2) mod 2**64 mod bloom_bits, as in lookup()
+        bits = np.zeros(bloom_bits, dtype=bool)
+        with np.errstate(over="ignore"):
+            for i in range(hashes):
+                bits[(digests[:, 0] + np.uint64(i) * digests[:, 1]) % np.uint64(bloom_bits)] = True
+        bloom = np.packbits(bits, bitorder="little").tobytes()
+        order = np.argsort(digests[:, 0], kind="stable")
+        keys = array("Q", digests[order, 0].tobytes())
+        return cls(bloom, bloom_bits, hashes, keys, ids[order].tobytes(), categories)
+    
+    @classmethod
+    def load(cls, path: str) -> "IocIndex":
+        """Memory-map an index written by save()"""
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if mapped[:len(IOC_MAGIC)] != IOC_MAGIC:
+                raise ValueError(f"{path} is not a compiled IOC index")
+            header_end = len(IOC_MAGIC) + 4
+            header_size = int.from_bytes(mapped[len(IOC_MAGIC):header_end], "little")
+            header = json.loads(mapped[header_end:header_end + header_size])
+            if header.get("version") != IOC_VERSION:
+                raise ValueError(f"Unsupported IOC index version {header.get('version')!r}")
+            count, bloom_bits = header["count"], header["bloom_bits"]
+            view = memoryview(mapped)
+            bloom_at = _align8(header_end + header_size)
+            keys_at = _align8(bloom_at + (bloom_bits + 7) // 8)
+            ids_at = keys_at + 8 * count
+            keys = view[keys_at:ids_at].cast("Q")
+            if sys.byteorder == "big":  # keys are stored little-endian
+                keys = array("Q", keys)
+                keys.byteswap()
+            return cls(view[bloom_at:bloom_at + (bloom_bits + 7) // 8], bloom_bits, header["hashes"], keys,
+                       view[ids_at:ids_at + count], header["categories"], mapped, path)
+        except (ValueError, KeyError, TypeError) as e:
+            mapped.close()
+            raise ValueError(f"Cannot load IOC index {path}: {e}") from None
+    
+    def save(self, path: str) -> None:
+        """Write the index in the memory-mappable layout, atomically
+        
+        Layout: magic, header length (uint32), JSON header, then at 8-byte
+        aligned offsets the Bloom filter bits, the sorted uint64 keys
+        (little-endian) and one category byte per key.
+        """
+        header = json.dumps({"version": IOC_VERSION, "count": len(self), "bloom_bits": self.bloom_bits,
+                             "hashes": self.hashes, "categories": self.categories}).encode()
+        keys = array("Q", self.keys)
+        if sys.byteorder == "big":
+            keys.byteswap()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(IOC_MAGIC + len(header).to_bytes(4, "little") + header)
+            f.write(b"\0" * (_align8(f.tell()) - f.tell()))
+            f.write(self.bloom)
+            f.write(b"\0" * (_align8(f.tell()) - f.tell()))
+            f.write(keys.tobytes())
+            f.write(self.category_ids)
+        os.replace(tmp_path, path)
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def lookup(self, token: str) -> List[str]:
+        """Categories whose feeds contain token (already normalized), [] for a clean token"""
+        self.lookups += 1
+        if token in self._clean:
+            self.cache_hits += 1
+            return []
+        return self._resolve(token)
+    
+    def _resolve(self, token: str) -> List[str]:
+        """Look up a token not in the clean-token cache"""
+        found = self._known.get(token)
+        if found is not None:
+            self.cache_hits += 1
+        else:
+            found = self._probe(token)
+            if found:
+                self._known[token] = found
+            else:
+                if len(self._clean) >= IOC_TOKEN_CACHE:
+                    self._clean.clear()
+                self._clean.add(token)
+        if found:
+            self.hits += 1
+        return found
+    
+    def _probe(self, token: str) -> List[str]:
+        h1, h2 = _ioc_digest(token)
+        bloom, bits = self.bloom, self.bloom_bits
+        for i in range(self.hashes):
+            position = ((h1 + i * h2) & _MASK64) % bits
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return []
+        self.bloom_passes += 1
+        keys = self.keys
+        position = bisect_left(keys, h1)
+        found = []
+        while position < len(keys) and keys[position] == h1:
+            found.append(self.categories[self.category_ids[position]])
+            position += 1
+        if found:
+            self._probe_hits += 1
+        return found
+    
+    def search(self, tokens: set) -> bool:
+        """Whether any of a set of tokens is a known indicator
+        
+        Tokens already known to be clean are removed with one set difference,
+        so only new tokens and matches are looked up one by one.
+        """
+        unknown = tokens - self._clean
+        self.lookups += len(tokens)
+        self.cache_hits += len(tokens) - len(unknown)
+        return any(self._resolve(token) for token in unknown)
+    
+    def match(self, tokens: Iterable[str]) -> Dict[str, List[str]]:
+        """{category: [matching tokens]} for the tokens that are known indicators"""
+        matches: Dict[str, List[str]] = {}
+        for token in sorted(tokens):
+            for category in self.lookup(token):
+                matches.setdefault(category, []).append(token)
+        return {category: matches[category] for category in self.categories if category in matches}
+    
+    def stats(self) -> Dict[str, Any]:
+        """Indicator count and token lookups: cached, past the Bloom filter, matched
+        
+        bloom_passes and false_positives count probes of the index, not cached repeats.
+        """
+        return {
+            "indicators": len(self),
+            "categories": list(self.categories),
+            "lookups": self.lookups,
+            "cache_hits": self.cache_hits,
+            "bloom_passes": self.bloom_passes,
+            "hits": self.hits,
+            "false_positives": self.bloom_passes - self._probe_hits,
+        }
+    
+    def close(self) -> None:
+        """Release the memory map of a loaded index"""
+        if self._mapped is not None:
+            self.bloom = self.keys = self.category_ids = b""
+            self._clean.clear()
+            self._known.clear()
+            try:
+                self._mapped.close()
+            except BufferError:
+                pass  # still referenced by a view; freed with it
+            self._mapped = None
+
+def _align8(offset: int) -> int:
+    return (offset + 7) & ~7
+
+def read_ioc_feeds(paths: Iterable[str]) -> Dict[str, List[str]]:
+    """{category: indicators} from text feeds, one indicator per line
+    
+    A path may be given as category=path; otherwise the category is the file
+    name without its extension (domains.txt -> domains). Blank lines and #
+    comments are skipped, and only the first comma or whitespace separated
+    field of a line is used, so simple CSV exports work as they are.
+    """
+    feeds: Dict[str, List[str]] = {}
+    for path in paths:
+        category, _, file_path = path.rpartition("=")
+        category = category or os.path.splitext(os.path.basename(file_path))[0]
+        indicators = feeds.setdefault(category, [])
+        with open(file_path, 'r', encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith("#"):
+                    indicators.append(line.replace(",", " ").split()[0])
+    return feeds
+
+_ioc_index: Optional[IocIndex] = None
+
+def get_ioc_index() -> Optional[IocIndex]:
+    """Return the IOC index is_suspicious checks, None when no feeds are loaded"""
+    return _ioc_index
+
+def load_iocs(paths: Iterable[str]) -> Optional[IocIndex]:
+    """Install IOC feeds: one compiled .ioc index (memory-mapped) or text feeds built in memory
+    
+    An empty list removes the feeds. The verdict cache empties itself when
+    the index changes.
+    """
+    global _ioc_index
+    paths = list(paths)
+    previous = _ioc_index
+    if not paths:
+        _ioc_index = None
+    elif len(paths) == 1 and paths[0].endswith(IOC_SUFFIX):
+        _ioc_index = IocIndex.load(paths[0])
+    else:
+        _ioc_index = IocIndex.from_indicators(read_ioc_feeds(paths))
+    if previous is not None:
+        previous.close()
+    return _ioc_index
+
+def _match_categories(matcher: PatternMatcher, command_line: str, image: str, process_name: str) -> Tuple[str, ...]:
+    """Categories of the patterns and IOC feeds matching an event's text fields
+    
+    Clean text costs the same to match in full as to search. IOC tokens are
+    searched first and matched one by one only when a known one is present.
+    """
+    text = f"{command_line.lower()} {image.lower()} {process_name.lower()}"
+    categories = tuple(dict.fromkeys(category for category, _ in matcher.match(text)))
+    if _ioc_index is not None:
+        tokens = ioc_tokens(command_line, image, process_name)
+        if _ioc_index.search(tokens):
+            categories += tuple(f"ioc_{category}" for category in _ioc_index.match(tokens))
+    return categories
+
+class VerdictCache:
+    """Bounded LRU of pattern verdicts for repeated (CommandLine, Image, ProcessName) fields
+    
+    Real streams repeat the same few text combinations (svchost, scheduled
+    tasks, agents) thousands of times; a hit skips lower-casing and every
+    regex and IOC lookup. Entries are keyed by the raw field tuple, whose
+    hash is cached on the strings. The cache empties itself when the
+    compiled pattern set changes (SUSPICIOUS_PATTERNS rebound, load_patterns
+    or invalidate_patterns) or other IOC feeds are loaded. EventIDs are
+    not part of a verdict, so SUSPICIOUS_EVENT_IDS changes apply
+    immediately. maxsize 0 disables caching.
+    """
+    
+    def __init__(self, maxsize: int = 65536):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._verdicts: "OrderedDict[Tuple[str, str, str], Tuple[str, ...]]" = OrderedDict()
+        self._matcher: Optional[PatternMatcher] = None
+        self._iocs: Optional[IocIndex] = None
+    
+    def verdict(self, command_line: str, image: str, process_name: str) -> bool:
+        """Whether any pattern or IOC matches the fields, from the cache when possible"""
+        return bool(self.categories(command_line, image, process_name))
+    
+    def categories(self, command_line: str, image: str, process_name: str) -> Tuple[str, ...]:
+        """Pattern categories (and ioc_<feed> categories) matching the fields, () for clean fields
+        
+        The same as the keys of match_suspicious_patterns, cached per field
+        tuple, so asking why an event was flagged after is_suspicious costs
+        one lookup.
+        """
+        matcher = get_pattern_matcher()
+        if matcher is not self._matcher or _ioc_index is not self._iocs:
+            self._verdicts.clear()
+            self._matcher = matcher
+            self._iocs = _ioc_index
+        
+        key = (command_line, image, process_name)
+        categories = self._verdicts.get(key)
+        if categories is not None:
+            self.hits += 1
+            self._verdicts.move_to_end(key)
+            return categories
+        
+        self.misses += 1
+        categories = _match_categories(matcher, command_line, image, process_name)
+        if self.maxsize > 0:
+            self._verdicts[key] = categories
+            if len(self._verdicts) > self.maxsize:
+                self._verdicts.popitem(last=False)
+                self.evictions += 1
+        return categories
+    
+    def clear(self) -> None:
+        self._verdicts.clear()
+    
+    def counters(self) -> Tuple[int, int, int]:
+        """(hits, misses, evictions) so far, for workers to report their share"""
+        return self.hits, self.misses, self.evictions
+    
+    def add_counters(self, hits: int, misses: int, evictions: int) -> None:
+        """Count lookups made by worker processes, whose caches the parent cannot see"""
+        self.hits += hits
+        self.misses += misses
+        self.evictions += evictions
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters for sizing the cache: hits, misses, evictions, size and hit rate"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._verdicts),
+            "maxsize": self.maxsize,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+_verdict_cache = VerdictCache()
+
+def get_verdict_cache() -> VerdictCache:
+    """Return the verdict cache is_suspicious uses"""
+    return _verdict_cache
+
+def set_verdict_cache_size(maxsize: int) -> VerdictCache:
+    """Replace the verdict cache with an empty one holding at most maxsize entries"""
+    global _verdict_cache
+    if maxsize < 0:
+        raise ValueError("maxsize must be >= 0")
+    _verdict_cache = VerdictCache(maxsize)
+    return _verdict_cache
+
+def parse_log_line(line_dict: Dict[str, Any]) -> SysmonEvent:
     """Extract and normalize key fields with error handling"""
     try:
-        event_id = line_dict.get("EventID", -1)
+        get = line_dict.get
+        event_id = get("EventID", -1)
         if isinstance(event_id, str):
             event_id = int(event_id) if event_id.isdigit() else -1
         elif not isinstance(event_id, int):
             event_id = -1
             
-        return {
-            "EventID": event_id,
-            "UtcTime": str(line_dict.get("UtcTime", "")),
-            "Image": str(line_dict.get("Image", "")),
-            "ProcessName": str(line_dict.get("ProcessName", "")),
-            "CommandLine": str(line_dict.get("CommandLine", ""))
-        }
+        # str() only for values that are not already strings
+        utc_time = get("UtcTime", "")
+        image = get("Image", "")
+        process_name = get("ProcessName", "")
+        command_line = get("CommandLine", "")
+        source_host = get(SOURCE_FIELD)
+        return SysmonEvent(
+            event_id,
+            utc_time if type(utc_time) is str else str(utc_time),
+            image if type(image) is str else str(image),
+            process_name if type(process_name) is str else str(process_name),
+            command_line if type(command_line) is str else str(command_line),
+            source_host if source_host is None or type(source_host) is str else str(source_host)
+        )
     except (ValueError, TypeError) as e:
-        print(f"Warning: Error parsing log line: {e}")
-        return {
-            "EventID": -1,
-            "UtcTime": "",
-            "Image": "",
-            "ProcessName": "",
-            "CommandLine": ""
-        }
+        log.warning("Warning: Error parsing log line: %s", e)
+        return SysmonEvent(-1, "", "", "", "")
 
 def is_suspicious(event: Dict[str, Any]) -> bool:
     """Enhanced suspicious event detection"""
@@ -46,27 +680,173 @@ def is_suspicious(event: Dict[str, Any]) -> bool:
         if event["EventID"] in SUSPICIOUS_EVENT_IDS:
             return True
         
-        # Enhanced pattern-based detection
-        command_line = event.get("CommandLine", "").lower()
-        image = event.get("Image", "").lower()
-        process_name = event.get("ProcessName", "").lower()
-        
-        # Combine all text fields for pattern matching
-        all_text = f"{command_line} {image} {process_name}"
-        
-        # Check for suspicious patterns
-        for category, patterns in SUSPICIOUS_PATTERNS.items():
-            for pattern in patterns:
-                if re.search(pattern, all_text, re.IGNORECASE):
-                    return True
-        
-        return False
+        # Enhanced pattern-based detection over the combined text fields
+        return _verdict_cache.verdict(*_event_fields(event))
         
     except Exception as e:
-        print(f"Warning: Error in suspicious detection: {e}")
+        log.warning("Warning: Error in suspicious detection: %s", e)
         return False
 
+def suspicious_reasons(event: Dict[str, Any]) -> List[str]:
+    """Why is_suspicious flags an event: ["event_id"] or its pattern (and ioc_<feed>) categories
+    
+    Categories come from the verdict cache, so after is_suspicious this is
+    a lookup rather than another round of regex and IOC matching.
+    """
+    if event["EventID"] in SUSPICIOUS_EVENT_IDS:
+        return ["event_id"]
+    return list(_verdict_cache.categories(*_event_fields(event)))
+
+def match_suspicious_patterns(event: Dict[str, Any]) -> Dict[str, List[str]]:
+    """Return the pattern categories (and patterns) an event's text fields match
+    
+    IOC matches are reported as ioc_<feed category> with the matching tokens.
+    """
+    matches: Dict[str, List[str]] = {}
+    try:
+        for category, pattern in get_pattern_matcher().match(_event_text(event)):
+            matches.setdefault(category, []).append(pattern)
+        if _ioc_index is not None:
+            for category, tokens in _ioc_index.match(ioc_tokens(*_event_fields(event))).items():
+                matches[f"ioc_{category}"] = tokens
+    except Exception as e:
+        log.warning("Warning: Error in pattern matching: %s", e)
+    return matches
+
+def _text_column(frame: pd.DataFrame, field: str) -> pd.Series:
+    """str() of a column exactly as parse_log_line applies it, vectorized when possible"""
+    if field not in frame.columns:
+        return pd.Series("", index=frame.index, dtype=object)
+    column = frame[field]
+    if pd.api.types.infer_dtype(column, skipna=False) == "string" and not column.isna().any():
+        return column.astype(object)
+    return column.map(str).astype(object)
+
+def _event_id_column(frame: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """EventIDs normalized as parse_log_line does, plus a mask of rows it would reject"""
+    rejected = np.zeros(len(frame), dtype=bool)
+    if "EventID" not in frame.columns:
+        return np.full(len(frame), -1, dtype=np.int64), rejected
+    
+    column = frame["EventID"]
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(column):
+        if column.isna().any():  # nullable Int64: missing values are not ints
+            return column.astype("float64").fillna(-1).to_numpy(np.int64), rejected
+        return column.to_numpy(np.int64), rejected
+    if pd.api.types.is_float_dtype(column):
+        return np.full(len(frame), -1, dtype=np.int64), rejected
+    
+    # Mixed/object column: ints pass through, digit strings are converted, anything else is -1
+    values = column.astype(object)
+    is_int = values.map(lambda v: isinstance(v, int)).to_numpy(bool)
+    is_str = values.map(lambda v: isinstance(v, str)).to_numpy(bool)
+    event_ids = np.full(len(frame), -1, dtype=np.int64)
+    event_ids[is_int] = values[is_int].to_numpy(np.int64)
+    
+    strings = values[is_str].astype(str)
+    digits = strings.str.isdigit().to_numpy(bool)
+    converted = pd.to_numeric(strings[digits], errors="coerce")
+    string_ids = np.full(len(strings), -1, dtype=np.int64)
+    string_ids[digits] = converted.fillna(-1).to_numpy(np.int64)
+    event_ids[is_str] = string_ids
+    
+    # Digit strings int() cannot parse (e.g. superscripts) make parse_log_line fall back entirely
+    failed = np.zeros(len(strings), dtype=bool)
+    failed[digits] = converted.isna().to_numpy(bool)
+    rejected[np.flatnonzero(is_str)[failed]] = True
+    return event_ids, rejected
+
+def parse_log_batch(frame: pd.DataFrame) -> pd.DataFrame:
+    """Vectorized parse_log_line over a DataFrame of raw log records"""
+    event_ids, rejected = _event_id_column(frame)
+    parsed = pd.DataFrame({
+        "EventID": event_ids,
+        "UtcTime": _text_column(frame, "UtcTime"),
+        "Image": _text_column(frame, "Image"),
+        "ProcessName": _text_column(frame, "ProcessName"),
+        "CommandLine": _text_column(frame, "CommandLine"),
+    }, index=frame.index)
+    
+    if rejected.any():
+        log.warning("Warning: Error parsing %d log lines in batch", int(rejected.sum()))
+        parsed.loc[rejected, ["UtcTime", "Image", "ProcessName", "CommandLine"]] = ""
+    return parsed
+
+def is_suspicious_batch(parsed: pd.DataFrame) -> Tuple[np.ndarray, pd.Series]:
+    """Vectorized is_suspicious over parse_log_batch output
+    
+    Returns a boolean mask that agrees with is_suspicious row by row, and a
+    column of comma-separated pattern categories each row matches (computed
+    for every row, including those flagged by EventID alone). The text
+    columns are factorized so each distinct (CommandLine, Image, ProcessName)
+    combination is matched once, however often it repeats.
+    """
+    mask = np.isin(parsed["EventID"].to_numpy(), SUSPICIOUS_EVENT_IDS)
+    if parsed.empty:
+        return mask, pd.Series("", index=parsed.index, dtype=object)
+    
+    combo_codes = np.zeros(len(parsed), dtype=np.int64)
+    for field in ("CommandLine", "Image", "ProcessName"):
+        codes, uniques = pd.factorize(parsed[field])
+        combo_codes, _ = pd.factorize(combo_codes * len(uniques) + codes)
+    
+    # First row of every distinct combination stands in for all its repeats
+    combo_count = int(combo_codes.max()) + 1
+    first_rows = np.empty(combo_count, dtype=np.int64)
+    first_rows[combo_codes[::-1]] = np.arange(len(parsed) - 1, -1, -1)
+    representatives = parsed.iloc[first_rows]
+    
+    matcher = get_pattern_matcher()
+    combo_categories = np.empty(combo_count, dtype=object)
+    for combo, (command_line, image, process_name) in enumerate(zip(
+            representatives["CommandLine"], representatives["Image"], representatives["ProcessName"])):
+        text = f"{command_line.lower()} {image.lower()} {process_name.lower()}"
+        categories = list(dict.fromkeys(category for category, _ in matcher.match(text)))
+        if _ioc_index is not None:
+            tokens = ioc_tokens(command_line, image, process_name)
+            categories.extend(f"ioc_{category}" for category in _ioc_index.match(tokens))
+        combo_categories[combo] = ",".join(categories)
+    
+    mask |= combo_categories.astype(bool)[combo_codes]
+    return mask, pd.Series(combo_categories[combo_codes], index=parsed.index, dtype=object)
+
+def utc_time_to_epoch(value: Any) -> Optional[float]:
+    """Parse a Sysmon UtcTime ("2024-01-15 09:30:15.123") to epoch seconds, None if invalid"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+def utc_times_to_epoch(values: pd.Series) -> np.ndarray:
+    """Vectorized utc_time_to_epoch; NaN where a value does not parse"""
+    times = pd.to_datetime(values, errors="coerce", format="ISO8601", utc=True)
+    return (times - pd.Timestamp(0, tz="UTC")).dt.total_seconds().to_numpy(float)
+
 def validate_json_structure(data: Dict[str, Any]) -> bool:
     """Validate that log entry has required structure"""
     required_fields = ["EventID"]
-    return all(field in data for field in required_fields)
\ No newline at end of file
+    return all(field in data for field in required_fields)
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Compile IOC text feeds into a memory-mappable index")
+    parser.add_argument("feeds", nargs="+", help="feed files, one indicator per line (category=path to name them)")
+    parser.add_argument("-o", "--output", default="iocs" + IOC_SUFFIX, help=f"index file (default iocs{IOC_SUFFIX})")
+    parser.add_argument("--false-positive-rate", type=float, default=IOC_FALSE_POSITIVE_RATE,
+                        help="Bloom filter false positive rate")
+    args = parser.parse_args()
+    
+    try:
+        index = IocIndex.from_indicators(read_ioc_feeds(args.feeds), args.false_positive_rate)
+        index.save(args.output)
+    except (OSError, ValueError) as e:
+        log.error("[IOC] Error: %s", e)
+        sys.exit(1)
+    log.info("[IOC] Compiled %d indicators in %d categories (%d hashes, %d Bloom bytes) -> %s", len(index),
+             len(index.categories), index.hashes, index.bloom_bits // 8, args.output)
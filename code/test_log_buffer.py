@@ -0,0 +1,86 @@
+import unittest
+import tempfile
+import os
+import log_buffer
+from log_codec import dumps_lines
+from log_buffer import encode_batch, MsgpackBufferWriter, iter_msgpack_batches
+
+
+@unittest.skipIf(log_buffer.msgpack is None, "msgpack is not installed")
+class TestLogBuffer(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_buffer = os.path.join(self.temp_dir, "stream_buffer.mpk")
+        self.records = [
+            {"EventID": 1, "UtcTime": "2024-01-15 09:30:15.123", "Image": "C:\\Windows\\cmd.exe",
+             "ProcessName": "cmd.exe", "CommandLine": "cmd.exe /c dir"},
+            {"EventID": 3, "UtcTime": None, "Image": "C:\\Windows\\cmd.exe",
+             "ProcessName": None, "CommandLine": ""},
+            {"UtcTime": "2024-01-15 09:30:17.789", "Image": "C:\\Windows\\notepad.exe"}
+        ]
+    
+    def tearDown(self):
+        """Clean up test files"""
+        if os.path.exists(self.test_buffer):
+            os.remove(self.test_buffer)
+        os.rmdir(self.temp_dir)
+    
+    def write_buffer(self, *batches):
+        """Helper to write record batches to the test buffer"""
+        with open(self.test_buffer, 'wb') as f:
+            writer = MsgpackBufferWriter(f)
+            for batch in batches:
+                writer.write_batch(batch)
+    
+    def read_buffer(self):
+        """Helper to read all batches back"""
+        with open(self.test_buffer, 'rb') as f:
+            return list(iter_msgpack_batches(f))
+    
+    def test_roundtrip(self):
+        """Test batches decode to the records written, including missing keys"""
+        self.write_buffer(self.records, self.records[:1])
+        
+        self.assertEqual(self.read_buffer(), [self.records, self.records[:1]])
+    
+    def test_smaller_than_jsonl(self):
+        """Test field names and dictionary-encoded columns are not repeated per record"""
+        repeated = [dict(self.records[0]) for _ in range(1000)]
+        
+        self.assertLess(len(encode_batch(repeated)), len(dumps_lines(repeated)) / 2)
+    
+    def test_codes_are_little_endian_uint32(self):
+        """Test dictionary codes have the same layout on every host"""
+        payload = encode_batch(self.records)[4:]
+        codes = log_buffer.msgpack.unpackb(payload, raw=False)["columns"]["Image"]["codes"]
+        
+        self.assertEqual(codes, b"\x00\x00\x00\x00" * 2 + b"\x01\x00\x00\x00")
+    
+    def test_empty_file(self):
+        """Test an empty file has no batches"""
+        open(self.test_buffer, 'wb').close()
+        
+        self.assertEqual(self.read_buffer(), [])
+    
+    def test_bad_magic(self):
+        """Test a JSONL file is rejected"""
+        with open(self.test_buffer, 'wb') as f:
+            f.write(b'{"EventID": 1}\n')
+        
+        with self.assertRaises(ValueError):
+            self.read_buffer()
+    
+    def test_truncated_batch(self):
+        """Test a partially written batch is reported"""
+        self.write_buffer(self.records)
+        with open(self.test_buffer, 'r+b') as f:
+            f.truncate(os.path.getsize(self.test_buffer) - 5)
+        
+        with self.assertRaises(ValueError):
+            self.read_buffer()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+import importlib
+import json
+import sys
+from unittest.mock import patch
+import numpy as np
+import log_codec
+
+
+class TestLogCodec(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.record = {
+            "EventID": 1,
+            "UtcTime": "2024-01-15 09:30:15.123",
+            "Image": "C:\\Windows\\System32\\cmd.exe",
+            "CommandLine": "cmd.exe /c \"dir\" \u00e9",
+            "ProcessId": None
+        }
+    
+    def load_stdlib_codec(self):
+        """Helper to import the codec as if no fast JSON library were installed"""
+        with patch.dict(sys.modules, {"orjson": None, "msgspec": None}):
+            module = importlib.reload(log_codec)
+        self.addCleanup(importlib.reload, log_codec)
+        return module
+    
+    def test_roundtrip_bytes(self):
+        """Test records survive encode and decode from bytes"""
+        line = log_codec.dumps_line(self.record)
+        
+        self.assertTrue(line.endswith(b"\n"))
+        self.assertEqual(log_codec.loads(line), self.record)
+        self.assertEqual(json.loads(line), self.record)
+    
+    def test_decode_str(self):
+        """Test text input is still accepted"""
+        self.assertEqual(log_codec.loads(json.dumps(self.record)), self.record)
+    
+    def test_decode_error_is_catchable(self):
+        """Test malformed input raises the codec's DecodeError"""
+        with self.assertRaises(log_codec.DecodeError):
+            log_codec.loads(b'{"EventID": 2, invalid json')
+    
+    def test_numpy_and_unknown_values(self):
+        """Test numpy scalars encode as numbers and unknown objects as strings"""
+        decoded = log_codec.loads(log_codec.dumps({"EventID": np.int64(3), "Other": object}))
+        
+        self.assertEqual(decoded["EventID"], 3)
+        self.assertIsInstance(decoded["Other"], str)
+    
+    def test_dumps_lines(self):
+        """Test batches serialize to one JSONL block"""
+        block = log_codec.dumps_lines([self.record, {"EventID": 3}])
+        
+        self.assertEqual([json.loads(line) for line in block.splitlines()], [self.record, {"EventID": 3}])
+    
+    def test_stdlib_fallback(self):
+        """Test the stdlib backend is used when no fast library is available"""
+        codec = self.load_stdlib_codec()
+        
+        self.assertEqual(codec.BACKEND, "json")
+        self.assertEqual(codec.loads(codec.dumps_line(self.record)), self.record)
+        with self.assertRaises(codec.DecodeError):
+            codec.loads(b'{"EventID": 2, invalid json')
+
+
+if __name__ == '__main__':
+    unittest.main()
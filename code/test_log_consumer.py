@@ -1,10 +1,21 @@
 import unittest
+import io
 import json
 import tempfile
 import os
 import sys
+import threading
+import time
 from unittest.mock import patch, mock_open
-from log_consumer import consume_logs
+from log_consumer import consume_logs, shard_ranges
+from log_utils import set_verdict_cache_size
+from log_sinks import JsonlAlertSink
+from log_correlation import CorrelationEngine, ThresholdRule
+from log_rules import RuleEngine, compile_rule
+from log_segments import SegmentWriter, pending_segments
+from log_diagnostics import configure_diagnostics, flush_diagnostics
+import shutil
+import log_buffer
 
 
 class TestLogConsumer(unittest.TestCase):
@@ -108,5 +119,244 @@ class TestLogConsumer(unittest.TestCase):
                 mock_exit.assert_called_with(1)
 
 
+    def test_consume_logs_follow_appended_lines(self):
+        """Test follow mode processes lines appended while running"""
+        self.create_test_input_file(self.test_logs[:2])
+        
+        def append_later():
+            time.sleep(0.1)
+            with open(self.test_input, 'a') as f:
+                f.write(json.dumps(self.test_logs[3]) + '\n')
+        
+        thread = threading.Thread(target=append_later)
+        thread.start()
+        consume_logs(self.test_input, self.test_output, follow=True, idle_timeout=0.5)
+        thread.join()
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        
+        self.assertEqual(len(alerts), 3)
+        self.assertEqual(alerts[-1]['Image'], "C:\\Tools\\tunnel.exe")
+    
+    def test_consume_logs_checkpoint_resume(self):
+        """Test a restarted consumer resumes after the checkpointed offset"""
+        checkpoint = os.path.join(self.temp_dir, "consumer.ckpt")
+        self.create_test_input_file(self.test_logs[:2])
+        consume_logs(self.test_input, self.test_output, checkpoint_path=checkpoint)
+        
+        with open(self.test_input, 'a') as f:
+            f.write(json.dumps(self.test_logs[3]) + '\n')
+        consume_logs(self.test_input, self.test_output, checkpoint_path=checkpoint)
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        os.remove(checkpoint)
+        
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]['Image'], "C:\\Tools\\tunnel.exe")
+
+    def test_consume_logs_checkpoint_holds_partial_line(self):
+        """Test a record still being written is left for the next checkpointed run"""
+        checkpoint = os.path.join(self.temp_dir, "consumer.ckpt")
+        record = json.dumps(self.test_logs[3])
+        self.create_test_input_file(self.test_logs[:1])
+        with open(self.test_input, 'a') as f:
+            f.write(record[:20])
+        consume_logs(self.test_input, self.test_output, checkpoint_path=checkpoint)
+        
+        with open(self.test_input, 'a') as f:
+            f.write(record[20:] + '\n')
+        consume_logs(self.test_input, self.test_output, checkpoint_path=checkpoint)
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        os.remove(checkpoint)
+        
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]['Image'], "C:\\Tools\\tunnel.exe")
+    
+    def test_consume_logs_jsonl_sink_without_export(self):
+        """Test alerts stream to a JSONL sink with the alerts.json export disabled"""
+        alerts_jsonl = os.path.join(self.temp_dir, "alerts.jsonl")
+        self.create_test_input_file()
+        
+        consume_logs(self.test_input, None, sink=JsonlAlertSink(alerts_jsonl, batch_size=1))
+        
+        with open(alerts_jsonl, 'r') as f:
+            alerts = [json.loads(line) for line in f]
+        os.remove(alerts_jsonl)
+        
+        self.assertEqual(len(alerts), 3)
+        self.assertFalse(os.path.exists(self.test_output))
+
+    def test_shard_ranges_newline_aligned(self):
+        """Test shards cover the file and start at line boundaries"""
+        self.create_test_input_file(self.test_logs * 5)
+        with open(self.test_input, 'rb') as f:
+            data = f.read()
+        
+        ranges = shard_ranges(self.test_input, 4)
+        
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(data[start - 1:start], b'\n')
+    
+    def test_consume_logs_parallel_matches_serial(self):
+        """Test the sharded consumer writes the same alerts as the serial path"""
+        self.create_test_input_file(self.test_logs * 10)
+        consume_logs(self.test_input, self.test_output)
+        with open(self.test_output, 'r') as f:
+            serial_alerts = f.read()
+        
+        consume_logs(self.test_input, self.test_output, workers=2)
+        with open(self.test_output, 'r') as f:
+            parallel_alerts = f.read()
+        
+        self.assertEqual(parallel_alerts, serial_alerts)
+    
+    def test_consume_logs_keeps_source_host(self):
+        """Test the SourceHost tag of fan-in records reaches the alerts, serial and sharded"""
+        self.create_test_input_file([dict(log, SourceHost=f"HOST0{i % 2}") for i, log in enumerate(self.test_logs)])
+        for workers in (1, 2):
+            consume_logs(self.test_input, self.test_output, workers=workers)
+            with open(self.test_output, 'r') as f:
+                alerts = json.load(f)
+            self.assertEqual([alert["SourceHost"] for alert in alerts], ["HOST00", "HOST01", "HOST01"])
+        
+        self.create_test_input_file()
+        consume_logs(self.test_input, self.test_output, workers=2)
+        with open(self.test_output, 'r') as f:
+            self.assertNotIn("SourceHost", json.load(f)[0])
+    
+    def test_consume_logs_parallel_counts_worker_cache_lookups(self):
+        """Test verdict cache lookups made in worker processes reach the parent's statistics"""
+        self.create_test_input_file(self.test_logs * 10)
+        cache = set_verdict_cache_size(65536)
+        try:
+            consume_logs(self.test_input, self.test_output, workers=2)
+            stats = cache.stats()
+        finally:
+            set_verdict_cache_size(65536)
+        
+        # Only the EventID 999 records reach the pattern check
+        self.assertEqual(stats["hits"] + stats["misses"], 10)
+    
+    def test_consume_logs_parallel_reports_in_line_order(self):
+        """Test the sharded consumer reports alerts and errors interleaved as a serial run does"""
+        self.create_test_input_file()
+        with open(self.test_input, 'r') as f:
+            lines = f.read().splitlines()
+        with open(self.test_input, 'w') as f:
+            for line in lines * 5:
+                f.write(line + '\n{"Image": "no-event-id"}\n')
+        
+        def reports(**options):
+            output = io.StringIO()
+            configure_diagnostics(rate_limit=0, stream=output)
+            try:
+                consume_logs(self.test_input, self.test_output, **options)
+                flush_diagnostics()
+            finally:
+                configure_diagnostics()
+            return [line for line in output.getvalue().splitlines() if "Suspicious" in line or "line" in line]
+        
+        serial = reports()
+        self.assertEqual(reports(workers=2), serial)
+        self.assertIn("Invalid structure at line 2", serial[1])
+
+    @unittest.skipIf(log_buffer.msgpack is None, "msgpack is not installed")
+    def test_consume_logs_msgpack_buffer(self):
+        """Test a msgpack buffer produces the same alerts as JSONL"""
+        self.create_test_input_file()
+        consume_logs(self.test_input, self.test_output)
+        with open(self.test_output, 'r') as f:
+            jsonl_alerts = json.load(f)
+        
+        with open(self.test_input, 'wb') as f:
+            log_buffer.MsgpackBufferWriter(f).write_batch(self.test_logs)
+        consume_logs(self.test_input, self.test_output, buffer_format="msgpack")
+        with open(self.test_output, 'r') as f:
+            msgpack_alerts = json.load(f)
+        
+        self.assertEqual(msgpack_alerts, jsonl_alerts)
+
+    def test_consume_logs_correlation_alerts(self):
+        """Test correlation alerts are written next to per-event alerts"""
+        logs = [{"EventID": 3, "UtcTime": f"2024-01-15 09:30:{i:02d}.000", "Image": "C:\\Tools\\scan.exe",
+                 "CommandLine": ""} for i in range(6)]
+        self.create_test_input_file(logs)
+        correlator = CorrelationEngine([ThresholdRule("burst", [3], threshold=5, window=60)])
+        
+        consume_logs(self.test_input, self.test_output, correlator=correlator)
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        self.assertEqual(len(alerts), 7)
+        self.assertEqual(alerts[-1]["Rule"], "burst")
+        self.assertEqual(alerts[-1]["Count"], 6)
+    
+    def test_consume_logs_suppression(self):
+        """Test repeated alerts collapse into one alert with a count"""
+        self.create_test_input_file(self.test_logs * 20)
+        
+        consume_logs(self.test_input, self.test_output, suppress_ttl=60)
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        # 3 distinct alerts, each written once and then once collapsed
+        self.assertEqual(len(alerts), 6)
+        self.assertEqual(sorted(alert.get("Count", 1) for alert in alerts), [1, 1, 1, 20, 20, 20])
+    
+    def test_consume_logs_segmented_buffer(self):
+        """Test gzip segments are consumed in order, serially or in parallel, and deleted when done"""
+        self.create_test_input_file(self.test_logs * 10)
+        consume_logs(self.test_input, self.test_output)
+        with open(self.test_output, 'r') as f:
+            expected = f.read()
+        
+        segments_dir = os.path.join(self.temp_dir, "buffer")
+        lines = [(json.dumps(log) + "\n").encode() for log in self.test_logs * 10]
+        for workers in (1, 2):
+            with SegmentWriter(segments_dir, "gzip", max_bytes=500) as writer:
+                for line in lines:
+                    writer.write(line, 1)
+            
+            consume_logs(segments_dir, self.test_output, workers=workers, finished_segments="delete")
+            with open(self.test_output, 'r') as f:
+                self.assertEqual(f.read(), expected)
+            self.assertEqual(pending_segments(segments_dir), [])
+        shutil.rmtree(segments_dir)
+    
+    def test_consume_logs_time_range(self):
+        """Test a time range only processes the events inside it"""
+        logs = [dict(log, UtcTime=f"2024-01-15 09:{30 + i:02d}:00.000") for i, log in enumerate(self.test_logs)]
+        self.create_test_input_file(logs)
+        
+        consume_logs(self.test_input, self.test_output, time_range=("2024-01-15 09:31:00", "2024-01-15 09:33:00"))
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        os.remove(self.test_input + ".idx")
+        self.assertEqual([alert["UtcTime"] for alert in alerts], ["2024-01-15 09:31:00.000"])
+    
+    def test_consume_logs_detection_rules(self):
+        """Test detection rules replace the built-in detection and tag alerts with rule ids"""
+        self.create_test_input_file()
+        rules = RuleEngine([compile_rule({"id": "tunnel", "level": "high", "detection": {
+            "selection": {"EventID": 1, "CommandLine|contains": "--remote-host"}}})])
+        
+        consume_logs(self.test_input, self.test_output, rules=rules)
+        
+        with open(self.test_output, 'r') as f:
+            alerts = json.load(f)
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]["Image"], "C:\\Tools\\tunnel.exe")
+        self.assertEqual((alerts[0]["Rules"], alerts[0]["Level"]), (["tunnel"], "high"))
+        with self.assertRaises(SystemExit):
+            consume_logs(self.test_input, self.test_output, workers=2, rules=rules)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
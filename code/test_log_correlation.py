@@ -0,0 +1,144 @@
+import unittest
+import json
+import os
+import tempfile
+from log_utils import parse_log_line
+from log_correlation import (
+    CorrelationEngine, ThresholdRule, SequenceRule, build_rule, load_correlation_rules, format_utc_time
+)
+
+
+def event(event_id, second, image="C:\\Tools\\scan.exe"):
+    """Helper to build a parsed event second seconds after 09:30:00"""
+    minutes, seconds = divmod(second, 60)
+    return parse_log_line({"EventID": event_id, "UtcTime": f"2024-01-15 09:{30 + int(minutes):02d}:{seconds:06.3f}",
+                           "Image": image, "ProcessName": image.rsplit("\\", 1)[-1], "CommandLine": ""})
+
+
+class TestLogCorrelation(unittest.TestCase):
+    
+    def run_engine(self, engine, events):
+        """Helper to feed events, returning every correlation alert"""
+        alerts = []
+        for parsed in events:
+            alerts.extend(engine.process(parsed))
+        return alerts
+    
+    def test_threshold_sliding_window(self):
+        """Test more than threshold events for one key inside the window fire once"""
+        engine = CorrelationEngine([ThresholdRule("burst", [3], threshold=5, window=10)])
+        
+        alerts = self.run_engine(engine, [event(3, i) for i in range(6)])
+        
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]["Rule"], "burst")
+        self.assertEqual(alerts[0]["Count"], 6)
+        self.assertEqual(alerts[0]["Key"], "C:\\Tools\\scan.exe")
+        self.assertEqual(alerts[0]["FirstTime"], "2024-01-15 09:30:00.000")
+        self.assertEqual(alerts[0]["LastTime"], "2024-01-15 09:30:05.000")
+    
+    def test_threshold_spread_out_events(self):
+        """Test events spread wider than the window, other keys and other EventIDs do not fire"""
+        engine = CorrelationEngine([ThresholdRule("burst", [3], threshold=5, window=10)])
+        events = [event(3, i * 3) for i in range(10)]
+        events += [event(3, 40 + i * 0.1, image=f"C:\\Tools\\{i}.exe") for i in range(10)]
+        events += [event(1, 50 + i * 0.1) for i in range(10)]
+        
+        self.assertEqual(self.run_engine(engine, events), [])
+    
+    def test_threshold_tumbling_window(self):
+        """Test tumbling windows count per aligned window"""
+        engine = CorrelationEngine([ThresholdRule("burst", [3], threshold=3, window=10, tumbling=True)])
+        
+        # 3 events in 00-10 and 3 in 10-20: neither window has more than 3
+        self.assertEqual(self.run_engine(engine, [event(3, s) for s in (7, 8, 9, 10, 11, 12)]), [])
+        alerts = self.run_engine(engine, [event(3, 13)])
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]["FirstTime"], "2024-01-15 09:30:10.000")
+    
+    def test_sequence_within_limit(self):
+        """Test a sequence fires only when its steps follow in order within the time limit"""
+        engine = CorrelationEngine([SequenceRule("access", [1, 4663], within=5)])
+        
+        alerts = self.run_engine(engine, [event(1, 0), event(4663, 2)])
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]["Type"], "sequence")
+        
+        # Too late, wrong order and different key
+        events = [event(1, 10), event(4663, 16), event(4663, 20), event(1, 21),
+                  event(1, 30), event(4663, 31, image="C:\\Other.exe")]
+        self.assertEqual(self.run_engine(engine, events), [])
+    
+    def test_composite_key(self):
+        """Test rules keyed on several fields"""
+        engine = CorrelationEngine([SequenceRule("access", [1, 4663], key=["Image", "ProcessName"], within=5)])
+        
+        alerts = self.run_engine(engine, [event(1, 0), event(4663, 1)])
+        
+        self.assertEqual(alerts[0]["Key"], ["C:\\Tools\\scan.exe", "scan.exe"])
+    
+    def test_watermark_evicts_idle_keys(self):
+        """Test state for keys idle longer than the window is evicted as time advances"""
+        engine = CorrelationEngine([ThresholdRule("burst", [3], threshold=50, window=10)])
+        self.run_engine(engine, [event(3, i * 0.01, image=f"C:\\{i}.exe") for i in range(1000)])
+        self.assertEqual(engine.active_keys(), 1000)
+        
+        self.run_engine(engine, [event(3, 60)])
+        
+        self.assertEqual(engine.active_keys(), 1)
+        self.assertEqual(engine.stats()["evicted_keys"], 1000)
+    
+    def test_max_keys_bounds_state(self):
+        """Test the least recently updated keys are dropped beyond max_keys"""
+        rule = ThresholdRule("burst", [3], threshold=50, window=60, max_keys=100)
+        engine = CorrelationEngine([rule])
+        
+        self.run_engine(engine, [event(3, i * 0.001, image=f"C:\\{i}.exe") for i in range(500)])
+        
+        self.assertEqual(engine.active_keys(), 100)
+        self.assertEqual(rule.dropped_keys, 400)
+        self.assertIn("C:\\499.exe", rule.states)
+    
+    def test_late_events(self):
+        """Test events behind the watermark are skipped and counted"""
+        engine = CorrelationEngine([ThresholdRule("burst", [3], threshold=2, window=10)], allowed_lateness=2)
+        
+        self.run_engine(engine, [event(3, 10), event(3, 9), event(3, 5)])
+        
+        self.assertEqual(engine.late_events, 1)
+        self.assertEqual(len(engine.rules[0].states["C:\\Tools\\scan.exe"]), 2)
+    
+    def test_unparsable_time_ignored(self):
+        """Test events without a usable UtcTime are ignored"""
+        engine = CorrelationEngine([ThresholdRule("burst", [3], threshold=1, window=10)])
+        parsed = parse_log_line({"EventID": 3, "UtcTime": "not a time"})
+        
+        self.assertEqual(self.run_engine(engine, [parsed, parsed]), [])
+    
+    def test_load_correlation_rules(self):
+        """Test rules load from a JSON list and bad specs are rejected"""
+        specs = [
+            {"type": "threshold", "name": "burst", "event_ids": [3], "threshold": 50, "window": 60},
+            {"type": "sequence", "name": "access", "steps": [1, 4663], "key": "ProcessName", "within": 5},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix=".json", delete=False) as f:
+            json.dump(specs, f)
+        try:
+            rules = load_correlation_rules(f.name)
+        finally:
+            os.remove(f.name)
+        
+        self.assertIsInstance(rules[0], ThresholdRule)
+        self.assertEqual(rules[1].key_fields, ("ProcessName",))
+        with self.assertRaises(ValueError):
+            build_rule({"type": "unknown", "name": "x"})
+        with self.assertRaises(ValueError):
+            build_rule({"type": "sequence", "name": "x", "steps": [1]})
+    
+    def test_format_utc_time(self):
+        """Test epoch seconds format back to UtcTime"""
+        self.assertEqual(format_utc_time(1705311000.25), "2024-01-15 09:30:00.250")
+
+
+if __name__ == '__main__':
+    unittest.main()
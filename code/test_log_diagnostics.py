@@ -0,0 +1,124 @@
+import unittest
+import contextlib
+import io
+import threading
+import time
+import log_diagnostics
+from log_diagnostics import (
+    UNLIMITED, Progress, QueueWriter, RateLimiter, configure_diagnostics, flush_diagnostics, get_logger
+)
+
+
+class BlockingStream(io.StringIO):
+    """Stream whose writes wait until released, like a stalled pipe"""
+    
+    def __init__(self):
+        super().__init__()
+        self.released = threading.Event()
+    
+    def write(self, text):
+        self.released.wait()
+        return super().write(text)
+
+
+class TestLogDiagnostics(unittest.TestCase):
+    
+    def setUp(self):
+        """Send diagnostics to a buffer"""
+        self.output = io.StringIO()
+        configure_diagnostics(stream=self.output, rate_limit=3, rate_interval=60.0)
+        self.log = get_logger("test")
+    
+    def tearDown(self):
+        """Restore default diagnostics"""
+        flush_diagnostics()
+        log_diagnostics._limiter.reset()
+        configure_diagnostics()
+    
+    def lines(self):
+        """Helper: lines written so far"""
+        flush_diagnostics()
+        return self.output.getvalue().splitlines()
+    
+    def test_lines_keep_order_and_format(self):
+        """Test lines are written in order with arguments applied"""
+        for i in range(3):
+            self.log.info("[Test] line %d of %s", i, "three", extra=UNLIMITED)
+        self.log.warning("[Test] Warning: %s", "careful")
+        
+        self.assertEqual(self.lines(), ["[Test] line 0 of three", "[Test] line 1 of three",
+                                        "[Test] line 2 of three", "[Test] Warning: careful"])
+    
+    def test_rate_limit_per_template(self):
+        """Test repeats of a template over the limit are suppressed and counted"""
+        for i in range(10):
+            self.log.info("[Test] Alert %d", i)
+        self.log.info("[Test] Other %d", 1)
+        for i in range(5):
+            self.log.info("[Test] Unlimited %d", i, extra=UNLIMITED)
+        
+        lines = self.lines()
+        self.assertEqual([line for line in lines if "Alert" in line], ["[Test] Alert 0", "[Test] Alert 1",
+                                                                         "[Test] Alert 2"])
+        self.assertEqual(len([line for line in lines if "Unlimited" in line]), 5)
+        self.assertIn("[Test] Other 1", lines)
+        self.assertEqual(log_diagnostics._limiter.pending(), [("[Test] Alert %d", 7)])
+    
+    def test_rate_limiter_reports_count_when_window_reopens(self):
+        """Test the first line of a new window carries the suppressed count"""
+        limiter = RateLimiter(limit=1, interval=0.05)
+        key = ("sysmon.test", "[Test] %d")
+        self.assertEqual([limiter.admit(key) for _ in range(4)], [0, -1, -1, -1])
+        time.sleep(0.06)
+        self.assertEqual(limiter.admit(key), 3)
+        self.assertEqual(RateLimiter(limit=0).admit(key), 0)
+    
+    def test_levels_and_quiet(self):
+        """Test debug is off by default and quiet keeps only warnings and errors"""
+        self.log.debug("[Test] debug")
+        configure_diagnostics(stream=self.output, quiet=True)
+        self.log.info("[Test] info")
+        self.log.error("[Test] error")
+        configure_diagnostics("debug", stream=self.output)
+        self.log.debug("[Test] debug again")
+        
+        self.assertEqual(self.lines(), ["[Test] error", "[Test] debug again"])
+    
+    def test_follows_redirected_stdout(self):
+        """Test lines go to sys.stdout as it was when they were logged"""
+        configure_diagnostics()
+        captured = io.StringIO()
+        with contextlib.redirect_stdout(captured):
+            self.log.info("[Test] captured")
+        flush_diagnostics()
+        self.assertEqual(captured.getvalue(), "[Test] captured\n")
+    
+    def test_blocked_output_does_not_block_logging(self):
+        """Test a stalled stream makes lines drop instead of blocking the caller"""
+        stream = BlockingStream()
+        writer = QueueWriter(stream, maxsize=5)
+        
+        started = time.monotonic()
+        for i in range(20):
+            writer.write_line(f"line {i}")
+        elapsed = time.monotonic() - started
+        stream.released.set()
+        writer.close()
+        
+        self.assertLess(elapsed, 1.0)
+        self.assertGreater(writer.dropped, 0)
+        self.assertEqual(len(stream.getvalue().splitlines()), 20 - writer.dropped)
+    
+    def test_progress_is_time_gated(self):
+        """Test summaries are due once per interval with the rate since the last one"""
+        progress = Progress(interval=0.05)
+        self.assertIsNone(progress.check(100))
+        time.sleep(0.06)
+        rate = progress.check(100)
+        self.assertIsNotNone(rate)
+        self.assertGreater(rate, 0)
+        self.assertIsNone(progress.check(200))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import os
+import random
+import shutil
+import tempfile
+import pandas as pd
+from log_fanin import MergeStats, expand_sources, is_fan_in, merge_sources, source_host
+from log_producer import read_csv_chunks
+
+
+def utc(second):
+    """Helper for the UtcTime second seconds after 09:00:00"""
+    minutes, seconds = divmod(second, 60)
+    return f"2024-01-15 {9 + int(minutes) // 60:02d}:{int(minutes) % 60:02d}:{seconds:06.3f}"
+
+
+class TestLogFanIn(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.exports = os.path.join(self.temp_dir, "exports")
+        os.mkdir(self.exports)
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def write_export(self, name, seconds, **kwargs):
+        """Helper: write an export with one event per UtcTime offset"""
+        path = os.path.join(self.exports, name)
+        pd.DataFrame({
+            'EventID': [1] * len(seconds),
+            'UtcTime': [utc(second) for second in seconds],
+            'Image': [f"{name}:{i}" for i in range(len(seconds))],
+        }).to_csv(path, index=False, **kwargs)
+        return path
+    
+    def merged(self, sources, chunksize=7, workers=2, stats=None):
+        """Helper: concatenate the merged batches"""
+        return pd.concat(list(merge_sources(sources, read_csv_chunks, chunksize, workers, stats)), ignore_index=True)
+    
+    def test_source_host_and_detection(self):
+        """Test host names come from file names and fan-in is detected"""
+        self.assertEqual(source_host("/data/HOST01.csv.gz"), "HOST01")
+        first = self.write_export("HOST01.csv", [0])
+        self.assertFalse(is_fan_in(first))
+        self.assertTrue(is_fan_in([first, first]))
+        self.assertTrue(is_fan_in(f"dc1={first}"))
+        self.assertTrue(is_fan_in(self.exports))
+        self.assertTrue(is_fan_in(os.path.join(self.exports, "*.csv")))
+        
+        # An existing file whose name has '=' or '[' is a single input, not a tag or a pattern
+        tagged = self.write_export("dc1=HOST03[1].csv", [0])
+        self.assertFalse(is_fan_in(tagged))
+        self.assertEqual(expand_sources([tagged]), [("dc1=HOST03[1]", tagged)])
+    
+    def test_expand_sources(self):
+        """Test directories, globs and host= tags expand in a stable order"""
+        first = self.write_export("HOST01.csv", [0])
+        second = self.write_export("HOST02.csv.gz", [0], compression="gzip")
+        self.write_export("notes.txt", [0])
+        
+        self.assertEqual(expand_sources(self.exports), [("HOST01", first), ("HOST02", second)])
+        self.assertEqual(expand_sources([os.path.join(self.exports, "HOST0*.csv")]), [("HOST01", first)])
+        self.assertEqual(expand_sources([f"dc1={first}"]), [("dc1", first)])
+        with self.assertRaises(FileNotFoundError):
+            expand_sources([os.path.join(self.exports, "missing.csv")])
+        with self.assertRaises(FileNotFoundError):
+            expand_sources([os.path.join(self.exports, "*.zst")])
+    
+    def test_merge_is_time_ordered(self):
+        """Test the merge matches a full sort of all exports"""
+        rng = random.Random(7)
+        sources, expected = [], []
+        for host in range(5):
+            seconds = sorted(rng.uniform(0, 600) for _ in range(rng.randint(0, 60)))
+            path = self.write_export(f"HOST{host:02d}.csv", seconds)
+            sources.append((f"HOST{host:02d}", path))
+            expected.extend((second, host, i) for i, second in enumerate(seconds))
+        expected = [f"HOST{host:02d}.csv:{i}" for _, host, i in sorted(expected)]
+        
+        stats = MergeStats(len(sources))
+        merged = self.merged(sources, stats=stats)
+        
+        self.assertEqual(list(merged["Image"]), expected)
+        self.assertEqual(stats.records, len(expected))
+        self.assertEqual(stats.out_of_order, 0)
+        for host, image in zip(merged["SourceHost"], merged["Image"]):
+            self.assertTrue(image.startswith(host))
+    
+    def test_merge_ties_keep_source_order(self):
+        """Test records with equal UtcTime in one batch come out in source order"""
+        sources = [("a", self.write_export("a.csv", [1, 2, 2])), ("b", self.write_export("b.csv", [2, 2, 3]))]
+        
+        merged = self.merged(sources, chunksize=3)
+        
+        self.assertEqual(list(merged["Image"]), ["a.csv:0", "a.csv:1", "a.csv:2", "b.csv:0", "b.csv:1", "b.csv:2"])
+    
+    def test_merge_counts_unsorted_records(self):
+        """Test records older than ones already released are emitted and counted"""
+        sources = [("a", self.write_export("a.csv", [10, 11, 12, 1])), ("b", self.write_export("b.csv", [5, 20]))]
+        stats = MergeStats(len(sources))
+        
+        merged = self.merged(sources, chunksize=3, stats=stats)
+        
+        self.assertEqual(len(merged), 6)
+        self.assertEqual(stats.out_of_order, 1)
+    
+    def test_merge_carries_unparseable_times(self):
+        """Test records without a usable UtcTime stay after the record before them"""
+        path = os.path.join(self.exports, "a.csv")
+        pd.DataFrame({'EventID': [1, 1, 1], 'UtcTime': [utc(5), "garbage", utc(6)],
+                      'Image': ["x", "y", "z"]}).to_csv(path, index=False)
+        sources = [("a", path), ("b", self.write_export("b.csv", [0, 5.5]))]
+        
+        merged = self.merged(sources, chunksize=2)
+        
+        self.assertEqual(list(merged["Image"]), ["b.csv:0", "x", "y", "b.csv:1", "z"])
+
+
+if __name__ == '__main__':
+    unittest.main()
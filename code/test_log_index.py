@@ -0,0 +1,106 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from log_index import TimeIndex, build_index, query_time_range, index_path_for
+from log_utils import utc_time_to_epoch
+
+
+def utc(second):
+    """Helper for the UtcTime second seconds after 09:00:00"""
+    minutes, seconds = divmod(second, 60)
+    return f"2024-01-15 {9 + int(minutes) // 60:02d}:{int(minutes) % 60:02d}:{seconds:06.3f}"
+
+
+class TestLogIndex(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.buffer = os.path.join(self.temp_dir, "stream_buffer.jsonl")
+        # One event every 1.5s for an hour, with every 50th event 20s late
+        self.logs = [{"EventID": 1, "UtcTime": utc(i * 1.5 - (20 if i % 50 == 49 else 0)), "Image": f"img{i}"}
+                     for i in range(2400)]
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def write_buffer(self, logs, mode='w'):
+        """Helper to write JSONL lines"""
+        with open(self.buffer, mode) as f:
+            for log in logs:
+                f.write(json.dumps(log) + "\n")
+    
+    def expected(self, start, end):
+        """Helper: images in [start, end) by a full scan"""
+        low, high = utc_time_to_epoch(start), utc_time_to_epoch(end)
+        return [log["Image"] for log in self.logs if low <= utc_time_to_epoch(log["UtcTime"]) < high]
+    
+    def test_query_matches_full_scan(self):
+        """Test range queries return exactly the events a full scan finds, late ones included"""
+        self.write_buffer(self.logs)
+        
+        for start, end in ((utc(600), utc(1500)), (utc(0), utc(10)), (utc(3590), utc(4000)), (utc(-60), utc(0))):
+            images = [event["Image"] for _, event in query_time_range(self.buffer, start, end)]
+            self.assertEqual(sorted(images), sorted(self.expected(start, end)))
+    
+    def test_index_is_sparse(self):
+        """Test the index holds one entry per bucket and records the lateness seen"""
+        self.write_buffer(self.logs)
+        
+        index = build_index(self.buffer)
+        
+        self.assertEqual(len(index.buckets), 60)
+        self.assertEqual(index.lines, 2400)
+        self.assertAlmostEqual(index.max_lag, 18.5, places=3)
+        self.assertTrue(os.path.exists(index_path_for(self.buffer)))
+    
+    def test_query_reads_only_the_range(self):
+        """Test the seek range skips lines far outside the query"""
+        self.write_buffer(self.logs)
+        index = build_index(self.buffer)
+        
+        offset, line_num, stop = index.seek_range(utc_time_to_epoch(utc(1800)), utc_time_to_epoch(utc(1860)))
+        
+        self.assertGreater(offset, os.path.getsize(self.buffer) * 0.45)
+        self.assertLess(stop, os.path.getsize(self.buffer) * 0.55)
+        with open(self.buffer, 'rb') as f:
+            self.assertEqual(sum(1 for _ in f.read(offset).splitlines()), line_num)
+    
+    def test_index_extends_as_buffer_grows(self):
+        """Test an existing index is extended rather than rebuilt when lines are appended"""
+        self.write_buffer(self.logs[:1000])
+        first = build_index(self.buffer)
+        self.write_buffer(self.logs[1000:], mode='a')
+        
+        index = build_index(self.buffer)
+        
+        self.assertEqual(index.lines, 2400)
+        self.assertEqual(index.buckets[:len(first.buckets)], first.buckets)
+        self.assertEqual(index.to_dict()["entries"], TimeIndex.from_dict(index.to_dict()).to_dict()["entries"])
+    
+    def test_index_rebuilt_when_buffer_rewritten_in_place(self):
+        """Test a buffer truncated and rewritten with more lines is not treated as grown"""
+        self.write_buffer(self.logs[:10])
+        build_index(self.buffer)
+        inode = os.stat(self.buffer).st_ino
+        later = [dict(log, UtcTime=utc(3600 + i)) for i, log in enumerate(self.logs[:30])]
+        self.write_buffer(later)
+        self.assertEqual(os.stat(self.buffer).st_ino, inode)
+        
+        events = list(query_time_range(self.buffer, utc(3600), utc(3700)))
+        
+        self.assertEqual(len(events), 30)
+        self.assertEqual(build_index(self.buffer).lines, 30)
+    
+    def test_query_invalid_time(self):
+        """Test query bounds must be UtcTimes"""
+        self.write_buffer(self.logs[:10])
+        with self.assertRaises(ValueError):
+            list(query_time_range(self.buffer, "yesterday", utc(10)))
+
+
+if __name__ == '__main__':
+    unittest.main()
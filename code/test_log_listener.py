@@ -0,0 +1,210 @@
+import unittest
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+from log_listener import FrameReader, IngestListener, decode_message, encode_messages, measure_loopback
+from log_consumer import LogProcessor, consume_logs, make_processor
+from log_sinks import build_sink
+
+
+class TestLogListener(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_output = os.path.join(self.temp_dir, "alerts.json")
+        self.logs = [
+            {"EventID": 1, "UtcTime": "2024-01-15 10:00:00", "Image": "C:\\Windows\\cmd.exe", "CommandLine": "cmd.exe"},
+            {"EventID": 999, "UtcTime": "2024-01-15 10:00:01", "Image": "C:\\Tools\\normal.exe",
+             "CommandLine": "normal.exe"},
+            {"EventID": 999, "UtcTime": "2024-01-15 10:00:02", "Image": "C:\\Tools\\tunnel.exe",
+             "CommandLine": "tunnel.exe --remote-host example.com"},
+        ] * 20
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def read_alerts(self, path=None):
+        """Helper to load the alerts.json export"""
+        with open(path or self.test_output, 'r') as f:
+            return json.load(f)
+    
+    def buffered_alerts(self):
+        """Helper: alerts the file-based consumer writes for self.logs"""
+        buffer_path = os.path.join(self.temp_dir, "stream_buffer.jsonl")
+        expected_path = os.path.join(self.temp_dir, "expected.json")
+        with open(buffer_path, 'w') as f:
+            for log in self.logs:
+                f.write(json.dumps(log) + "\n")
+        consume_logs(buffer_path, expected_path)
+        return self.read_alerts(expected_path)
+    
+    def run_listener(self, send, **options):
+        """Helper: start a listener on free loopback ports, run send(listener), close it and return the processor"""
+        async def run():
+            sink = build_sink(self.test_output)
+            processor = make_processor(sink)
+            listener = IngestListener(processor, tcp_port=0, udp_port=0, flush_interval=0.01, **options)
+            sink.open()
+            await listener.start()
+            try:
+                await send(listener)
+            finally:
+                await listener.close()
+                sink.close()
+            return processor, listener
+        return asyncio.run(run())
+    
+    def test_frame_reader_newline_split_reads(self):
+        """Test newline framing across reads keeps the partial tail"""
+        frames = FrameReader()
+        self.assertEqual(frames.feed(b'{"a": 1}\n{"b"'), [b'{"a": 1}'])
+        self.assertEqual(frames.feed(b': 2}\n\n'), [b'{"b": 2}'])
+        self.assertEqual(frames.feed(b'{"c": 3}'), [])
+    
+    def test_frame_reader_octet_counting(self):
+        """Test RFC 6587 octet-counted frames, including one split across reads"""
+        messages = encode_messages(self.logs[:3], "octet")
+        stream = b"".join(messages)
+        frames = FrameReader()
+        received = frames.feed(stream[:50]) + frames.feed(stream[50:])
+        self.assertEqual(received, [message.split(b" ", 1)[1] for message in messages])
+    
+    def test_frame_reader_rejects_oversized_frames(self):
+        """Test a frame over max_frame_bytes raises instead of buffering"""
+        with self.assertRaises(ValueError):
+            FrameReader(max_frame_bytes=16).feed(b'{"CommandLine": "' + b"x" * 32)
+        with self.assertRaises(ValueError):
+            FrameReader(max_frame_bytes=16).feed(b"100 <14>1 - host")
+    
+    def test_frame_reader_finish_returns_tail(self):
+        """Test the unterminated tail is returned when the stream ends"""
+        frames = FrameReader()
+        frames.feed(b'{"a": 1}\n{"b": 2}')
+        self.assertEqual(frames.finish(), [b'{"b": 2}'])
+        self.assertEqual(frames.finish(), [])
+        frames.feed(b'{"c": 3}\n \r\n')
+        self.assertEqual(frames.finish(), [])
+    
+    def test_decode_message_syslog(self):
+        """Test syslog headers are stripped and the sending host is tagged"""
+        rfc5424 = b'<14>1 2024-01-15T10:00:00Z HOST01 Sysmon - - - {"EventID": 1}'
+        rfc3164 = b'<14>Jan 15 10:00:00 HOST02 Sysmon: {"EventID": 3}'
+        tagged = b'<14>1 - HOST03 Sysmon - - - {"EventID": 1, "SourceHost": "dc1"}'
+        self.assertEqual(decode_message(rfc5424), {"EventID": 1, "SourceHost": "HOST01"})
+        self.assertEqual(decode_message(rfc3164), {"EventID": 3, "SourceHost": "HOST02"})
+        self.assertEqual(decode_message(tagged)["SourceHost"], "dc1")
+        self.assertEqual(decode_message(b' {"EventID": 11}\r'), {"EventID": 11})
+        with self.assertRaises(ValueError):
+            decode_message(b"<14>1 - HOST01 Sysmon - - - no payload")
+    
+    def test_tcp_matches_file_consumer(self):
+        """Test events sent over TCP in every framing produce the alerts of a buffered run"""
+        expected = self.buffered_alerts()
+        for framing in ("json", "syslog", "octet"):
+            async def send(listener):
+                _, writer = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+                writer.write(b"".join(encode_messages(self.logs, framing)))
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+                while listener.processor.processed_count < len(self.logs):
+                    await asyncio.sleep(0.01)
+            
+            processor, _ = self.run_listener(send, batch_size=7)
+            
+            alerts = [{k: v for k, v in alert.items() if k != "SourceHost"} for alert in self.read_alerts()]
+            self.assertEqual(processor.processed_count, len(self.logs))
+            self.assertEqual(alerts, expected, framing)
+    
+    def test_udp_datagrams(self):
+        """Test UDP datagrams carrying one message or several JSON lines"""
+        async def send(listener):
+            loop = asyncio.get_running_loop()
+            transport, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                               remote_addr=("127.0.0.1", listener.udp_port))
+            for message in encode_messages(self.logs[:3], "syslog"):
+                transport.sendto(message)
+            transport.sendto(b"".join(encode_messages(self.logs[3:6], "json")))
+            transport.sendto(b"not json\n")
+            while listener.processor.processed_count + listener.processor.error_count < 7:
+                await asyncio.sleep(0.01)
+            transport.close()
+        
+        processor, listener = self.run_listener(send)
+        
+        self.assertEqual(processor.processed_count, 6)
+        self.assertEqual(processor.error_count, 1)
+        self.assertEqual(listener.stats()["messages"], 7)
+    
+    def test_connection_limit_and_oversized_frames(self):
+        """Test connections over the limit are closed and an oversized frame drops its connection"""
+        async def send(listener):
+            first_reader, first = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+            first.write(b'{"EventID": 1}\n')
+            while listener.active_connections < 1:
+                await asyncio.sleep(0.01)
+            second_reader, second = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+            self.assertEqual(await second_reader.read(), b"")  # closed by the listener
+            first.write(b"x" * 100)
+            self.assertEqual(await first_reader.read(), b"")
+            first.close()
+            second.close()
+        
+        processor, listener = self.run_listener(send, max_connections=1, max_frame_bytes=64)
+        
+        self.assertEqual(processor.processed_count, 1)
+        self.assertEqual(listener.rejected_connections, 1)
+        self.assertEqual(listener.dropped_connections, 1)
+    
+    def test_tcp_last_message_without_newline(self):
+        """Test a connection closed after an unterminated message still delivers it, or counts it as an error"""
+        async def send(listener):
+            for data in (b'{"EventID": 1}\n{"EventID": 3}', b'60 <14>1 - HOST01 Sysmon - - - {"EventID": 1}'):
+                _, writer = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+                writer.write(data)
+                await writer.drain()
+                writer.close()
+                await writer.wait_closed()
+            while listener.processor.processed_count + listener.processor.error_count < 3:
+                await asyncio.sleep(0.01)
+        
+        processor, _ = self.run_listener(send)
+        
+        self.assertEqual(processor.processed_count, 2)
+        self.assertEqual(processor.error_count, 1)  # the truncated octet-counted frame
+    
+    def test_detection_failure_stops_the_listener(self):
+        """Test a failing consumer ends serve() and is raised by close() instead of blocking the readers"""
+        class FailingProcessor(LogProcessor):
+            def process_record(self, log_raw, line_num):
+                raise RuntimeError("detection failed")
+        
+        async def run():
+            listener = IngestListener(FailingProcessor(None), tcp_port=0, batch_size=1, queue_size=1)
+            await listener.start()
+            _, writer = await asyncio.open_connection("127.0.0.1", listener.tcp_port)
+            writer.write(b"".join(encode_messages(self.logs, "json")))
+            try:
+                await listener.serve()
+            finally:
+                writer.close()
+                await listener.close()
+        
+        with self.assertRaises(RuntimeError):
+            asyncio.run(asyncio.wait_for(run(), timeout=10))
+    
+    def test_measure_loopback(self):
+        """Test the loopback benchmark processes every event sent over TCP"""
+        result = asyncio.run(measure_loopback(2000, "tcp", "octet", connections=2))
+        
+        self.assertEqual(result["sent"]["messages"], 2000)
+        self.assertEqual(result["processed"], 2000)
+        self.assertGreater(result["events_per_sec"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import unittest
+import tempfile
+import os
+import json
+import shutil
+from log_metrics import (
+    MetricsRegistry, MetricsExporter, RateTracker, enable_metrics, disable_metrics, timed_iter
+)
+from log_consumer import consume_logs, make_processor, LogProcessor, InstrumentedLogProcessor
+
+
+class TestLogMetrics(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.registry = MetricsRegistry(sample_every=1)
+    
+    def tearDown(self):
+        """Clean up test files and turn metrics back off"""
+        disable_metrics()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_prometheus_text(self):
+        """Test counters, gauges and histograms render in the exposition format"""
+        self.registry.counter("events_total", "Events", ("kind",)).labels("a").inc(3)
+        self.registry.gauge("lag", "Lag").labels().set(1.5)
+        histogram = self.registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0)).labels()
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value)
+        
+        text = self.registry.to_prometheus()
+        
+        self.assertIn("# TYPE events_total counter", text)
+        self.assertIn('events_total{kind="a"} 3.0', text)
+        self.assertIn("lag 1.5", text)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn("latency_seconds_count 3", text)
+    
+    def test_json_snapshot_and_collectors(self):
+        """Test snapshots run collectors and are JSON serializable"""
+        total = {"value": 0}
+        rate = self.registry.gauge("rate", "Rate").labels()
+        self.registry.add_collector(RateTracker(rate, lambda: total["value"]))
+        total["value"] = 100
+        
+        snapshot = json.loads(json.dumps(self.registry.snapshot()))
+        
+        self.assertGreater(snapshot["metrics"]["rate"]["samples"][0]["value"], 0)
+    
+    def test_exporter_writes_on_stop(self):
+        """Test the exporter leaves a final metrics file behind"""
+        path = os.path.join(self.temp_dir, "metrics.prom")
+        self.registry.counter("events_total", "Events").labels().inc()
+        
+        MetricsExporter(self.registry, path, interval=60).start().stop()
+        
+        with open(path, 'r') as f:
+            self.assertIn("events_total 1.0", f.read())
+    
+    def test_keyed_collectors_replace(self):
+        """Test a collector registered under an existing key replaces the old one"""
+        calls = []
+        for run in range(3):
+            self.registry.add_collector(lambda run=run: calls.append(run), key="consumer")
+        self.registry.collect()
+        self.assertEqual(calls, [2])
+        
+        self.registry.remove_collector("consumer")
+        self.registry.collect()
+        self.assertEqual(calls, [2])
+    
+    def test_repeated_runs_do_not_add_collectors(self):
+        """Test each consumer run takes over the collectors of the previous one"""
+        input_path = os.path.join(self.temp_dir, "buffer.jsonl")
+        with open(input_path, 'w') as f:
+            f.write(json.dumps({"EventID": 1, "Image": "C:\\Windows\\cmd.exe"}) + '\n')
+        enable_metrics(self.registry)
+        
+        consume_logs(input_path, os.path.join(self.temp_dir, "alerts.json"))
+        collectors = len(self.registry._collectors)
+        consume_logs(input_path, os.path.join(self.temp_dir, "alerts.json"))
+        
+        self.assertEqual(len(self.registry._collectors), collectors)
+    
+    def test_timed_iter(self):
+        """Test sampled iteration yields every item and times one in N"""
+        histogram = self.registry.histogram("read_seconds", "Read").labels()
+        
+        self.assertEqual(list(timed_iter(range(10), histogram, sample_every=5)), list(range(10)))
+        self.assertEqual(histogram.count, 2)
+    
+    def test_disabled_uses_plain_processor(self):
+        """Test no instrumentation is attached while metrics are disabled"""
+        self.assertIs(type(make_processor(None)), LogProcessor)
+        enable_metrics(self.registry)
+        self.assertIsInstance(make_processor(None), InstrumentedLogProcessor)
+    
+    def test_consumer_metrics(self):
+        """Test the consumer reports records, alerts by reason, errors and stage timings"""
+        input_path = os.path.join(self.temp_dir, "buffer.jsonl")
+        with open(input_path, 'w') as f:
+            f.write(json.dumps({"EventID": 1, "Image": "C:\\Windows\\cmd.exe"}) + '\n')
+            f.write(json.dumps({"EventID": 999, "Image": "C:\\Tools\\tunnel.exe", "CommandLine": "tunnel.exe"}) + '\n')
+            f.write(json.dumps({"EventID": 999, "Image": "C:\\Tools\\normal.exe"}) + '\n')
+            f.write('{"EventID": 2, invalid json\n')
+        enable_metrics(self.registry)
+        
+        consume_logs(input_path, os.path.join(self.temp_dir, "alerts.json"))
+        metrics = self.registry.snapshot()["metrics"]
+        
+        def values(name):
+            return {tuple(sample["labels"].values()): sample.get("value", sample.get("count"))
+                    for sample in metrics[name]["samples"]}
+        
+        self.assertEqual(values("sysmon_consumer_records_total"), {(): 3})
+        self.assertEqual(values("sysmon_consumer_alerts_total"),
+                         {("event_id",): 1, ("suspicious_processes",): 1})
+        self.assertEqual(values("sysmon_consumer_errors_total"), {("decode",): 1})
+        self.assertEqual(values("sysmon_consumer_stage_seconds")[("parse",)], 3)
+    
+    def test_suppressed_alerts_counted_apart(self):
+        """Test alerts dropped by suppression are not counted by reason"""
+        input_path = os.path.join(self.temp_dir, "buffer.jsonl")
+        with open(input_path, 'w') as f:
+            for second in range(3):
+                f.write(json.dumps({"EventID": 1, "UtcTime": f"2024-01-15 10:00:0{second}.000",
+                                    "Image": "C:\\Windows\\cmd.exe"}) + '\n')
+        enable_metrics(self.registry)
+        
+        consume_logs(input_path, os.path.join(self.temp_dir, "alerts.json"), suppress_ttl=60)
+        metrics = self.registry.snapshot()["metrics"]
+        
+        self.assertEqual([sample["value"] for sample in metrics["sysmon_consumer_alerts_total"]["samples"]], [1])
+        self.assertEqual(metrics["sysmon_consumer_alerts_suppressed_total"]["samples"][0]["value"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+import asyncio
+import time
+import pandas as pd
+from log_pacing import RatePacer, TimestampPacer, make_pacer
+
+
+class TestLogPacing(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.records = [{"EventID": 1, "UtcTime": f"2024-01-15 09:30:{i // 10:02d}.{i % 10}00"} for i in range(40)]
+        self.chunk = pd.DataFrame(self.records)
+    
+    def release_all(self, pacer, records=None, chunk=None):
+        """Helper to run a pacer over one chunk, returning (batches, elapsed seconds)"""
+        async def run():
+            return [batch async for batch in pacer.pace(records or self.records,
+                                                        self.chunk if chunk is None else chunk)]
+        
+        start = time.monotonic()
+        batches = asyncio.run(run())
+        return batches, time.monotonic() - start
+    
+    def test_rate_pacer_holds_rate(self):
+        """Test records are released at the target rate"""
+        batches, elapsed = self.release_all(RatePacer(200))
+        
+        self.assertEqual(sum(len(batch) for batch in batches), 40)
+        self.assertGreater(elapsed, 0.15)
+        self.assertLess(elapsed, 0.5)
+    
+    def test_rate_pacer_batches_high_rates(self):
+        """Test high rates release many records per batch"""
+        records = [{"EventID": 1}] * 20000
+        batches, _ = self.release_all(RatePacer(1_000_000), records, pd.DataFrame(records))
+        
+        self.assertEqual(sum(len(batch) for batch in batches), 20000)
+        self.assertLess(len(batches), 100)
+    
+    def test_timestamp_pacer_follows_utc_time(self):
+        """Test replay follows UtcTime spacing divided by speed"""
+        pacer = TimestampPacer(speed=20)
+        batches, elapsed = self.release_all(pacer)
+        
+        # 3.9 seconds of original time at 20x
+        self.assertEqual(pacer.released, 40)
+        self.assertGreater(elapsed, 0.15)
+        self.assertLess(elapsed, 0.5)
+    
+    def test_timestamp_pacer_unparsable_times(self):
+        """Test records without a usable UtcTime are released without waiting"""
+        chunk = pd.DataFrame({"EventID": [1, 3], "UtcTime": [None, "not a time"]})
+        batches, elapsed = self.release_all(TimestampPacer(), chunk.to_dict("records"), chunk)
+        
+        self.assertEqual(sum(len(batch) for batch in batches), 2)
+        self.assertLess(elapsed, 0.1)
+    
+    def test_make_pacer(self):
+        """Test pacer selection"""
+        self.assertIsNone(make_pacer())
+        self.assertIsInstance(make_pacer(rate=10), RatePacer)
+        self.assertIsInstance(make_pacer(speed=2), TimestampPacer)
+        with self.assertRaises(ValueError):
+            make_pacer(rate=10, speed=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
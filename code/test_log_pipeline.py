@@ -0,0 +1,115 @@
+import unittest
+import tempfile
+import os
+import json
+import asyncio
+import shutil
+import pandas as pd
+from log_pipeline import run_pipeline, run_pipeline_async
+from log_producer import stream_logs
+from log_consumer import consume_logs
+from log_sinks import AlertSink
+
+
+class TestLogPipeline(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_csv = os.path.join(self.temp_dir, "test_input.csv")
+        self.test_output = os.path.join(self.temp_dir, "test_output.json")
+        
+        pd.DataFrame({
+            'EventID': [1, 3, 999, 1] * 25,
+            'UtcTime': ['2024-01-15 10:00:00'] * 100,
+            'Image': ['C:\\Windows\\cmd.exe', 'C:\\Windows\\svchost.exe', 'C:\\Tools\\normal.exe',
+                      'C:\\Tools\\tunnel.exe'] * 25,
+            'CommandLine': ['cmd.exe', '', 'normal.exe', 'tunnel.exe --remote-host example.com'] * 25
+        }).to_csv(self.test_csv, index=False)
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def read_alerts(self):
+        """Helper to load the alerts.json export"""
+        with open(self.test_output, 'r') as f:
+            return json.load(f)
+    
+    def test_pipeline_matches_buffered_run(self):
+        """Test the in-process pipeline writes the same alerts as producer + consumer"""
+        buffer_path = os.path.join(self.temp_dir, "stream_buffer.jsonl")
+        stream_logs(self.test_csv, buffer_path, delay=0, chunksize=10)
+        consume_logs(buffer_path, self.test_output)
+        buffered_alerts = self.read_alerts()
+        
+        processor = run_pipeline(self.test_csv, self.test_output, chunksize=10)
+        
+        self.assertEqual(processor.processed_count, 100)
+        self.assertEqual(self.read_alerts(), buffered_alerts)
+    
+    def test_pipeline_offload_keeps_order(self):
+        """Test executor offload merges batch results in queue order"""
+        run_pipeline(self.test_csv, self.test_output, chunksize=7)
+        inline_alerts = self.read_alerts()
+        
+        for offload in ("thread", "process"):
+            run_pipeline(self.test_csv, self.test_output, chunksize=7, offload=offload, workers=2)
+            self.assertEqual(self.read_alerts(), inline_alerts)
+    
+    def test_pipeline_backpressure_bounds_queue(self):
+        """Test a slow consumer holds the producer back at the queue bound"""
+        from log_producer import stream_logs_async
+        
+        async def run():
+            queue = asyncio.Queue(maxsize=2)
+            high_water = 0
+            
+            async def slow_consumer():
+                nonlocal high_water
+                while True:
+                    high_water = max(high_water, queue.qsize())
+                    batch = await queue.get()
+                    if batch is None:
+                        return
+                    await asyncio.sleep(0.01)
+            
+            async def produce():
+                await stream_logs_async(self.test_csv, delay=0, chunksize=5, queue=queue)
+                await queue.put(None)
+            
+            await asyncio.gather(produce(), slow_consumer())
+            return high_water
+        
+        self.assertLessEqual(asyncio.run(run()), 2)
+    
+    def test_pipeline_consumer_failure_stops_producer(self):
+        """Test a failing sink is raised instead of leaving the producer blocked on a full queue
+        
+        With offload, alerts are written while merging batch results, outside
+        the per-record error handling.
+        """
+        class FailingSink(AlertSink):
+            def write(self, alert):
+                raise OSError("disk full")
+        
+        async def run():
+            await asyncio.wait_for(run_pipeline_async(self.test_csv, None, sink=FailingSink(), chunksize=5,
+                                                      queue_size=1, offload="thread"), timeout=10)
+        
+        with self.assertRaises(OSError):
+            asyncio.run(run())
+    
+    def test_pipeline_producer_failure_is_raised(self):
+        """Test a producer error reaches the caller instead of exiting the process"""
+        with self.assertRaises(FileNotFoundError):
+            run_pipeline(os.path.join(self.temp_dir, "missing.csv"), self.test_output)
+    
+    def test_pipeline_rejects_unbounded_queue(self):
+        """Test a queue size of zero is refused, since it would disable backpressure"""
+        with self.assertRaises(ValueError):
+            run_pipeline(self.test_csv, self.test_output, queue_size=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
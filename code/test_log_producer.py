@@ -6,6 +6,10 @@ import json
 import sys
 from unittest.mock import patch
 from log_producer import stream_logs
+from log_segments import read_manifest, pending_segments, open_compressed
+from log_index import build_index
+import log_buffer
+import shutil
 
 
 class TestLogProducer(unittest.TestCase):
@@ -114,5 +118,125 @@ class TestLogProducer(unittest.TestCase):
         self.assertIsNone(third_log['UtcTime'])
 
 
+    def test_stream_logs_chunked_matches_row_path(self):
+        """Test chunked ingestion writes the same records as the row path"""
+        self.create_test_csv()
+        
+        stream_logs(self.test_csv, self.test_output, delay=0)
+        with open(self.test_output, 'r') as f:
+            row_lines = f.readlines()
+        
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2)
+        with open(self.test_output, 'r') as f:
+            chunk_lines = f.readlines()
+        
+        self.assertEqual(len(chunk_lines), 3)
+        self.assertEqual([json.loads(l) for l in chunk_lines], [json.loads(l) for l in row_lines])
+    
+    def test_stream_logs_chunked_nan_handling(self):
+        """Test chunked ingestion converts NaN values to null"""
+        data_with_nan = self.test_data.copy()
+        data_with_nan.loc[1, 'CommandLine'] = None
+        data_with_nan.loc[2, 'EventID'] = None
+        data_with_nan.to_csv(self.test_csv, index=False)
+        
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2)
+        
+        with open(self.test_output, 'r') as f:
+            logs = [json.loads(line) for line in f]
+        
+        self.assertEqual(logs[0]['EventID'], 1)
+        self.assertIsNone(logs[1]['CommandLine'])
+        self.assertIsNone(logs[2]['EventID'])
+    
+    def test_stream_logs_chunked_missing_event_id(self):
+        """Test chunked ingestion rejects a CSV without an EventID column"""
+        self.test_data.drop(columns=['EventID']).to_csv(self.test_csv, index=False)
+        
+        with patch('sys.exit') as mock_exit:
+            stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2)
+            mock_exit.assert_called_with(1)
+
+    @unittest.skipIf(log_buffer.msgpack is None, "msgpack is not installed")
+    def test_stream_logs_msgpack_format(self):
+        """Test the msgpack buffer holds the same records as JSONL"""
+        self.create_test_csv()
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2)
+        with open(self.test_output, 'r') as f:
+            jsonl_logs = [json.loads(line) for line in f]
+        
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2, buffer_format="msgpack")
+        with open(self.test_output, 'rb') as f:
+            msgpack_logs = [log for batch in log_buffer.iter_msgpack_batches(f) for log in batch]
+        
+        self.assertEqual(msgpack_logs, jsonl_logs)
+
+    def test_stream_logs_rate_paced(self):
+        """Test rate pacing writes every record"""
+        self.create_test_csv()
+        
+        stream_logs(self.test_csv, self.test_output, rate=1000)
+        
+        with open(self.test_output, 'r') as f:
+            logs = [json.loads(line) for line in f]
+        self.assertEqual([log['EventID'] for log in logs], [1, 3, 11])
+
+    def test_stream_logs_compressed_input_segmented_output(self):
+        """Test a .csv.gz export streams into gzip segments with a manifest"""
+        gz_csv = self.test_csv + ".gz"
+        segments_dir = os.path.join(self.temp_dir, "buffer")
+        self.test_data.to_csv(gz_csv, index=False, compression="gzip")
+        
+        stream_logs(gz_csv, segments_dir, delay=0, chunksize=1, compression="gzip", segment_bytes=1)
+        
+        manifest = read_manifest(segments_dir)
+        logs = []
+        for path in pending_segments(segments_dir):
+            with open_compressed(path) as f:
+                logs.extend(json.loads(line) for line in f)
+        os.remove(gz_csv)
+        shutil.rmtree(segments_dir)
+        
+        self.assertEqual(len(manifest["segments"]), 3)
+        self.assertEqual([log['EventID'] for log in logs], [1, 3, 11])
+
+    def test_stream_logs_writes_time_index(self):
+        """Test --index writes a sidecar index matching a separate indexing pass"""
+        self.create_test_csv()
+        
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2, index=True)
+        
+        with open(self.test_output + ".idx", 'r') as f:
+            written = json.load(f)
+        os.remove(self.test_output + ".idx")
+        rebuilt = build_index(self.test_output).to_dict()
+        os.remove(self.test_output + ".idx")
+        self.assertEqual(written["entries"], rebuilt["entries"])
+        self.assertEqual(len(written["entries"]), 3)
+
+    def test_stream_logs_removes_stale_time_index(self):
+        """Test rewriting the buffer without --index removes the index of the previous buffer"""
+        self.create_test_csv()
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2, index=True)
+        
+        stream_logs(self.test_csv, self.test_output, delay=0, chunksize=2)
+        
+        self.assertFalse(os.path.exists(self.test_output + ".idx"))
+
+    def test_stream_logs_fan_in_directory(self):
+        """Test a directory of per-host exports is merged on UtcTime and tagged by host"""
+        exports = os.path.join(self.temp_dir, "exports")
+        os.mkdir(exports)
+        self.test_data.iloc[[0, 2]].to_csv(os.path.join(exports, "HOST01.csv"), index=False)
+        self.test_data.iloc[[1]].to_csv(os.path.join(exports, "HOST02.csv.gz"), index=False, compression="gzip")
+        
+        stream_logs(exports, self.test_output, delay=0, chunksize=1)
+        
+        with open(self.test_output, 'r') as f:
+            logs = [json.loads(line) for line in f]
+        shutil.rmtree(exports)
+        self.assertEqual([log['EventID'] for log in logs], [1, 3, 11])
+        self.assertEqual([log['SourceHost'] for log in logs], ['HOST01', 'HOST02', 'HOST01'])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,198 @@
+import unittest
+import json
+import os
+import tempfile
+import time
+from unittest.mock import patch
+from log_utils import parse_log_line
+from log_rules import RELOAD_CHECK_SECONDS, RuleEngine, RuleError, compile_rule, load_rules, rule_alert
+
+
+def event(event_id=1, image="C:\\Windows\\System32\\WindowsPowerShell\\v1.0\\powershell.exe",
+          command_line="powershell.exe -enc SQBFAFgA"):
+    """Helper to build a parsed event"""
+    return parse_log_line({"EventID": event_id, "UtcTime": "2024-01-15 09:30:00.000", "Image": image,
+                           "ProcessName": image.rsplit("\\", 1)[-1], "CommandLine": command_line})
+
+
+ENCODED_POWERSHELL = {
+    "id": "encoded_powershell",
+    "level": "high",
+    "detection": {
+        "selection": {"EventID": [1, 4688], "Image|endswith": "\\powershell.exe",
+                      "CommandLine|contains": [" -enc ", " -encodedcommand "]},
+        "filter": {"CommandLine|contains": "legit"},
+        "condition": "selection and not filter",
+    },
+}
+
+
+class TestLogRules(unittest.TestCase):
+    
+    def test_field_conditions(self):
+        """Test modifiers, case-insensitive matching and list semantics"""
+        engine = RuleEngine([compile_rule(ENCODED_POWERSHELL)])
+        
+        self.assertEqual([rule.id for rule in engine.match(event())], ["encoded_powershell"])
+        self.assertTrue(engine.match(event(4688, image="C:\\POWERSHELL.EXE", command_line="x -EncodedCommand y")))
+        self.assertEqual(engine.match(event(3)), [])
+        self.assertEqual(engine.match(event(command_line="powershell.exe -enc legit")), [])
+        self.assertEqual(engine.match(event(image="C:\\cmd.exe")), [])
+    
+    def test_condition_grammar(self):
+        """Test or, parentheses, '1 of' and 'all of' conditions"""
+        spec = {"id": "any_tool", "detection": {
+            "tool_mimikatz": {"CommandLine|contains": "sekurlsa"},
+            "tool_procdump": {"CommandLine|re": r"procdump.*lsass"},
+            "parent": {"ProcessName": "cmd.exe"},
+            "condition": "1 of tool_* or (parent and not tool_mimikatz)",
+        }}
+        engine = RuleEngine([compile_rule(spec)])
+        
+        self.assertTrue(engine.match(event(command_line="procdump -ma lsass.exe")))
+        self.assertTrue(engine.match(event(image="C:\\cmd.exe", command_line="dir")))
+        self.assertFalse(engine.match(event(command_line="dir")))
+        
+        all_of = {"id": "both", "detection": {"a": {"CommandLine|contains": "x"},
+                                               "b": {"CommandLine|contains": "y"}, "condition": "all of them"}}
+        engine = RuleEngine([compile_rule(all_of)])
+        self.assertTrue(engine.match(event(command_line="x y")))
+        self.assertFalse(engine.match(event(command_line="x")))
+    
+    def test_index_selection(self):
+        """Test rules are indexed by EventID, then another required equality, else left unindexed"""
+        rules = [
+            compile_rule(ENCODED_POWERSHELL),
+            compile_rule({"id": "by_image", "detection": {"sel": {"Image": "C:\\Tools\\nc.exe"}}}),
+            compile_rule({"id": "optional_id", "detection": {"a": {"EventID": 3}, "b": {"Image|contains": "nc"},
+                                                             "condition": "a or b"}}),
+        ]
+        
+        self.assertEqual((rules[0].index_field, rules[0].index_values), ("EventID", [1, 4688]))
+        self.assertEqual((rules[1].index_field, rules[1].index_values), ("Image", ["c:\\tools\\nc.exe"]))
+        self.assertIsNone(rules[2].index_field)
+        engine = RuleEngine(rules)
+        self.assertEqual(engine.index_summary(), {"event_id": 1, "field": 1, "unindexed": 1})
+        
+        engine.match(event(3, image="C:\\Tools\\NC.exe"))
+        self.assertEqual([rule.evaluations for rule in rules], [0, 1, 1])
+        self.assertEqual([rule.matches for rule in rules], [0, 1, 1])
+    
+    def test_repeated_index_values(self):
+        """Test a value listed twice in an indexed selection matches once"""
+        engine = RuleEngine([compile_rule({"id": "proc", "detection": {"s": {"EventID": [1, 1, "1"]}}}),
+                             compile_rule({"id": "ps", "detection": {"s": {"Image|contains": "x",
+                                                                             "ProcessName": ["powershell.exe", "PowerShell.exe"]}}})])
+        self.assertEqual([rule.id for rule in engine.match(event(image="C:\\x\\powershell.exe"))], ["proc", "ps"])
+        self.assertEqual(engine.rules[0].evaluations, 1)
+        self.assertEqual(engine.rules[1].evaluations, 1)
+    
+    def test_per_rule_stats(self):
+        """Test evaluations and matches are exact and time is sampled"""
+        rule = compile_rule(ENCODED_POWERSHELL)
+        engine = RuleEngine([rule], sample_every=4)
+        for _ in range(100):
+            engine.match(event())
+        
+        stats = engine.stats()[0]
+        self.assertEqual((stats["evaluations"], stats["matches"]), (100, 100))
+        self.assertEqual(rule.samples, 25)
+        self.assertGreater(stats["seconds"], 0)
+    
+    def test_every_rule_is_sampled(self):
+        """Test each candidate rule gets its own samples when the candidate count divides sample_every"""
+        rules = [compile_rule({"id": f"rule{i}", "detection": {"s": {"CommandLine|contains": "-enc"}}})
+                 for i in range(4)]
+        engine = RuleEngine(rules, sample_every=4)
+        for _ in range(40):
+            engine.match(event())
+        
+        self.assertEqual([rule.samples for rule in rules], [10, 10, 10, 10])
+    
+    def test_rule_alert(self):
+        """Test alerts carry the matched rule ids and the highest level"""
+        low = compile_rule({"id": "low", "level": "low", "detection": {"s": {"EventID": 1}}})
+        high = compile_rule(ENCODED_POWERSHELL)
+        
+        alert = rule_alert(event(), [low, high])
+        
+        self.assertEqual(alert["Rules"], ["low", "encoded_powershell"])
+        self.assertEqual(alert["Level"], "high")
+        self.assertEqual(alert["EventID"], 1)
+    
+    def test_invalid_rules(self):
+        """Test bad rules are rejected with RuleError"""
+        bad_specs = [
+            {"detection": {"s": {"EventID": 1}}},
+            {"id": "x", "detection": {"s": {"Image|wildcard": "a"}}},
+            {"id": "x", "detection": {"s": {"Image": "a"}, "condition": "s and missing"}},
+            {"id": "x", "detection": {"s": {"Image": "a"}, "condition": "(s"}},
+            {"id": "x", "detection": {"s": {"CommandLine|re": "("}}},
+            {"id": "x", "detection": {"s": "not a map"}},
+            "not a map",
+            ["id", "x"],
+        ]
+        for spec in bad_specs:
+            with self.assertRaises(RuleError):
+                compile_rule(spec)
+        with self.assertRaises(RuleError):
+            RuleEngine([compile_rule(ENCODED_POWERSHELL), compile_rule(ENCODED_POWERSHELL)])
+    
+    def test_load_yaml_and_json_directory(self):
+        """Test a directory of YAML and JSON rule files loads in name order"""
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, "a.json"), 'w') as f:
+                json.dump([ENCODED_POWERSHELL], f)
+            with open(os.path.join(directory, "b.yml"), 'w') as f:
+                f.write("id: network\ndetection:\n  selection:\n    EventID: 3\n"
+                        "---\nid: dns\ndetection:\n  selection:\n    EventID: 22\n")
+            with open(os.path.join(directory, "notes.txt"), 'w') as f:
+                f.write("ignored")
+            
+            rules = load_rules(directory)
+        
+        self.assertEqual([rule.id for rule in rules], ["encoded_powershell", "network", "dns"])
+    
+    def test_hot_reload(self):
+        """Test changed rule files are picked up and broken edits keep the previous rules"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rules.json")
+            with open(path, 'w') as f:
+                json.dump([ENCODED_POWERSHELL], f)
+            engine = RuleEngine.from_path(path)
+            engine.match(event())
+            
+            with open(path, 'w') as f:
+                json.dump([ENCODED_POWERSHELL, {"id": "network", "detection": {"s": {"EventID": 3}}}], f)
+            os.utime(path, (time.time() + 5, time.time() + 5))
+            self.assertTrue(engine.maybe_reload())
+            self.assertEqual([rule.id for rule in engine.match(event(3))], ["network"])
+            self.assertEqual(engine.rules[0].evaluations, 1)  # counters survive the reload
+            self.assertFalse(engine.maybe_reload())
+            
+            with open(path, 'w') as f:
+                f.write("[{broken")
+            os.utime(path, (time.time() + 10, time.time() + 10))
+            self.assertFalse(engine.maybe_reload())
+            self.assertEqual(len(engine.rules), 2)
+            self.assertEqual(engine.reloads, 1)
+    
+    def test_reload_checked_on_a_slow_stream(self):
+        """Test rule files are checked after RELOAD_CHECK_SECONDS even with few events"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rules.json")
+            with open(path, 'w') as f:
+                json.dump([ENCODED_POWERSHELL], f)
+            engine = RuleEngine.from_path(path)
+            with open(path, 'w') as f:
+                json.dump([{"id": "network", "detection": {"s": {"EventID": 3}}}], f)
+            os.utime(path, (time.time() + 5, time.time() + 5))
+            
+            self.assertEqual(engine.match(event(3)), [])
+            with patch("log_rules.time.monotonic", return_value=time.monotonic() + RELOAD_CHECK_SECONDS):
+                self.assertEqual([rule.id for rule in engine.match(event(3))], ["network"])
+            self.assertEqual(engine.reloads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import log_segments
+from log_segments import (
+    SegmentWriter, read_manifest, pending_segments, finish_segment, open_compressed, is_segmented
+)
+
+
+class TestLogSegments(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.buffer_dir = os.path.join(self.temp_dir, "buffer")
+        self.lines = [json.dumps({"EventID": i, "CommandLine": "x" * 50}).encode() + b"\n" for i in range(100)]
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def write_segments(self, compression="none", max_bytes=500):
+        """Helper to write the test lines in blocks of 10"""
+        with SegmentWriter(self.buffer_dir, compression, max_bytes) as writer:
+            for start in range(0, len(self.lines), 10):
+                writer.write(b"".join(self.lines[start:start + 10]), 10)
+        return writer
+    
+    def read_all(self):
+        """Helper to read every pending segment back"""
+        lines = []
+        for path in pending_segments(self.buffer_dir):
+            with open_compressed(path) as f:
+                lines.extend(f)
+        return lines
+    
+    def test_rotation_and_manifest(self):
+        """Test segments rotate by size, hold whole blocks and are listed in order"""
+        writer = self.write_segments()
+        manifest = read_manifest(self.buffer_dir)
+        
+        self.assertTrue(is_segmented(self.buffer_dir))
+        self.assertEqual(len(manifest["segments"]), 10)
+        self.assertEqual(manifest["segments"][0]["name"], "segment-000001.jsonl")
+        self.assertEqual(sum(entry["records"] for entry in manifest["segments"]), 100)
+        self.assertEqual(writer.segments, manifest["segments"])
+        self.assertEqual(self.read_all(), self.lines)
+        self.assertFalse([name for name in os.listdir(self.buffer_dir) if name.endswith(".part")])
+    
+    def test_gzip_segments(self):
+        """Test gzip segments round-trip and are smaller than the JSONL they hold"""
+        self.write_segments("gzip", max_bytes=1 << 20)
+        entry = read_manifest(self.buffer_dir)["segments"][0]
+        
+        self.assertTrue(entry["name"].endswith(".jsonl.gz"))
+        self.assertLess(entry["size"], entry["bytes"] / 4)
+        self.assertEqual(self.read_all(), self.lines)
+    
+    def test_reopen_continues_numbering(self):
+        """Test a second writer on the same directory appends new segments"""
+        self.write_segments(max_bytes=1 << 20)
+        self.write_segments(max_bytes=1 << 20)
+        
+        names = [entry["name"] for entry in read_manifest(self.buffer_dir)["segments"]]
+        self.assertEqual(names, ["segment-000001.jsonl", "segment-000002.jsonl"])
+        self.assertEqual(len(self.read_all()), 200)
+    
+    def test_finish_segment_actions(self):
+        """Test finished segments can be kept, deleted or archived"""
+        self.write_segments()
+        first, second, third = pending_segments(self.buffer_dir)[:3]
+        
+        finish_segment(first, "keep")
+        finish_segment(second, "delete")
+        finish_segment(third, "archive")
+        
+        self.assertTrue(os.path.exists(first))
+        self.assertFalse(os.path.exists(second))
+        self.assertTrue(os.path.exists(os.path.join(self.buffer_dir, "archive", os.path.basename(third))))
+        self.assertEqual(len(pending_segments(self.buffer_dir)), 8)
+        with self.assertRaises(ValueError):
+            finish_segment(first, "shred")
+    
+    def test_open_compressed_by_extension(self):
+        """Test plain and gzip files are opened by extension"""
+        path = os.path.join(self.temp_dir, "lines.jsonl.gz")
+        with gzip.open(path, 'wb') as f:
+            f.write(b"".join(self.lines))
+        
+        with open_compressed(path) as f:
+            self.assertEqual(list(f), self.lines)
+    
+    @unittest.skipIf(log_segments.zstandard is None, "zstandard is not installed")
+    def test_zstd_segments(self):
+        """Test zstd segments round-trip"""
+        self.write_segments("zstd", max_bytes=1 << 20)
+        
+        self.assertEqual(self.read_all(), self.lines)
+    
+    def test_invalid_compression(self):
+        """Test unknown compressions are rejected"""
+        with self.assertRaises(ValueError):
+            SegmentWriter(self.buffer_dir, "lz4")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+import json
+import tempfile
+import os
+from log_sinks import JsonArraySink, JsonlAlertSink, MultiSink, SuppressingSink, CountMinSketch, build_sink
+
+
+class ListSink:
+    """Helper sink that keeps written alerts in memory"""
+    
+    def __init__(self):
+        self.alerts = []
+        self.closed = False
+    
+    def open(self):
+        pass
+    
+    def write(self, alert):
+        self.alerts.append(alert)
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+
+
+class TestLogSinks(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_output = os.path.join(self.temp_dir, "alerts.json")
+        self.test_jsonl = os.path.join(self.temp_dir, "alerts.jsonl")
+        self.alerts = [
+            {"EventID": 1, "UtcTime": "2024-01-15 09:30:15.123", "Image": "C:\\Windows\\cmd.exe",
+             "ProcessName": "cmd.exe", "CommandLine": "cmd.exe /c dir"},
+            {"EventID": 3, "UtcTime": "", "Image": "", "ProcessName": "", "CommandLine": "line\nbreak"}
+        ]
+    
+    def tearDown(self):
+        """Clean up test files"""
+        for name in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, name))
+        os.rmdir(self.temp_dir)
+    
+    def read_jsonl(self, path):
+        """Helper to read a JSONL alert file"""
+        with open(path, 'r') as f:
+            return [json.loads(line) for line in f]
+    
+    def test_json_array_sink_matches_json_dump(self):
+        """Test the streamed export is byte-identical to json.dump(indent=2)"""
+        for alerts in (self.alerts, []):
+            with JsonArraySink(self.test_output) as sink:
+                for alert in alerts:
+                    sink.write(alert)
+            
+            with open(self.test_output, 'r') as f:
+                self.assertEqual(f.read(), json.dumps(alerts, indent=2))
+    
+    def test_jsonl_sink_batches_writes(self):
+        """Test alerts are held until the batch is full"""
+        sink = JsonlAlertSink(self.test_jsonl, batch_size=2, flush_interval=60)
+        sink.open()
+        sink.write(self.alerts[0])
+        self.assertEqual(os.path.getsize(self.test_jsonl), 0)
+        
+        sink.write(self.alerts[1])
+        self.assertEqual(self.read_jsonl(self.test_jsonl), self.alerts)
+        sink.close()
+    
+    def test_jsonl_sink_appends(self):
+        """Test a reopened sink appends to the existing file"""
+        for alert in self.alerts:
+            with JsonlAlertSink(self.test_jsonl) as sink:
+                sink.write(alert)
+        
+        self.assertEqual(self.read_jsonl(self.test_jsonl), self.alerts)
+    
+    def test_jsonl_sink_rotation(self):
+        """Test size-based rotation keeps backup_count old files"""
+        with JsonlAlertSink(self.test_jsonl, batch_size=1, max_bytes=10, backup_count=2) as sink:
+            for event_id in range(4):
+                sink.write({"EventID": event_id})
+        
+        self.assertEqual(self.read_jsonl(self.test_jsonl), [{"EventID": 3}])
+        self.assertEqual(self.read_jsonl(self.test_jsonl + ".1"), [{"EventID": 2}])
+        self.assertEqual(self.read_jsonl(self.test_jsonl + ".2"), [{"EventID": 1}])
+        self.assertFalse(os.path.exists(self.test_jsonl + ".3"))
+    
+    def test_jsonl_sink_invalid_fsync_policy(self):
+        """Test an unknown fsync policy is rejected"""
+        with self.assertRaises(ValueError):
+            JsonlAlertSink(self.test_jsonl, fsync="sometimes")
+    
+    def test_build_sink(self):
+        """Test sink composition for export and extra sinks"""
+        jsonl_sink = JsonlAlertSink(self.test_jsonl)
+        
+        self.assertIsInstance(build_sink(self.test_output), JsonArraySink)
+        self.assertIs(build_sink(None, jsonl_sink), jsonl_sink)
+        self.assertIsInstance(build_sink(self.test_output, jsonl_sink), MultiSink)
+        with self.assertRaises(ValueError):
+            build_sink(None, None)
+    
+    def send(self, sink, alerts):
+        """Helper to pass alerts through admit/write as LogProcessor does"""
+        admitted = 0
+        for alert in alerts:
+            if sink.admit(alert):
+                sink.write(alert)
+                admitted += 1
+        return admitted
+    
+    def test_suppressing_sink_collapses_repeats(self):
+        """Test repeats within the TTL are counted and written once collapsed"""
+        now = [0.0]
+        inner = ListSink()
+        sink = SuppressingSink(inner, ttl=60, clock=lambda: now[0])
+        repeats = [dict(self.alerts[0], UtcTime=f"2024-01-15 09:30:{i:02d}.000") for i in range(50)]
+        
+        self.assertEqual(self.send(sink, repeats + [self.alerts[1]]), 2)
+        self.assertEqual(len(inner.alerts), 2)
+        
+        now[0] = 61.0
+        sink.flush()
+        collapsed = inner.alerts[-1]
+        self.assertEqual(collapsed["Count"], 50)
+        self.assertEqual(collapsed["SuppressedCount"], 49)
+        self.assertEqual(collapsed["UtcTime"], "2024-01-15 09:30:00.000")
+        self.assertEqual(collapsed["LastUtcTime"], "2024-01-15 09:30:49.000")
+        
+        # A new window starts after the TTL
+        self.assertEqual(self.send(sink, repeats[:1]), 1)
+        sink.close()
+        self.assertTrue(inner.closed)
+        self.assertEqual(sink.stats()["suppressed"], 49)
+    
+    def test_suppressing_sink_bounded_under_unique_flood(self):
+        """Test one-off signatures cannot push a heavy hitter out of a full map"""
+        inner = ListSink()
+        sink = SuppressingSink(inner, ttl=60, max_keys=100, clock=lambda: 0.0)
+        heavy = self.alerts[0]
+        self.send(sink, [heavy] * 10)
+        unique = [dict(heavy, CommandLine=f"cmd.exe /c {i}") for i in range(10000)]
+        
+        self.assertEqual(self.send(sink, unique), 10000)
+        self.assertEqual(self.send(sink, [heavy] * 10), 0)
+        self.assertLessEqual(sink.stats()["tracked"], 100)
+        sink.close()
+        self.assertEqual(inner.alerts[-1]["Count"], 20)
+    
+    def test_suppressing_sink_uses_event_time(self):
+        """Test without a clock, windows follow UtcTime rather than how fast alerts arrive"""
+        inner = ListSink()
+        sink = SuppressingSink(inner, ttl=60)
+        hours = [dict(self.alerts[0], UtcTime=f"2024-01-15 {hour:02d}:00:00.000") for hour in (9, 10, 11)]
+        minute = [dict(self.alerts[0], UtcTime=f"2024-01-15 12:00:{second:02d}.000") for second in (0, 30)]
+        
+        self.assertEqual(self.send(sink, hours), 3)
+        self.assertEqual(self.send(sink, minute), 1)
+        sink.close()
+        self.assertEqual(inner.alerts[-1]["Count"], 2)
+    
+    def test_count_min_sketch_estimates(self):
+        """Test estimates never undercount and heavy keys stand out"""
+        sketch = CountMinSketch(width=256, depth=4)
+        for i in range(1000):
+            sketch.add(("heavy",))
+            sketch.add(("light", i))
+        
+        self.assertGreaterEqual(sketch.estimate(("heavy",)), 1000)
+        self.assertLess(sketch.estimate(("light", 1)), 100)
+    
+    def test_build_sink_suppression(self):
+        """Test build_sink wraps the outputs when suppress_ttl is set"""
+        sink = build_sink(self.test_output, None, suppress_ttl=5)
+        self.assertIsInstance(sink, SuppressingSink)
+        self.assertEqual(sink.describe(), self.test_output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import tempfile
+import os
+import json
+import shutil
+import pandas as pd
+from log_synth import generate_frame, generate_chunks, write_synthetic, SYNTH_COLUMNS
+from log_utils import parse_log_batch, is_suspicious_batch
+from log_bench import run_benchmark, compare_results, parse_size
+
+
+class TestLogSynth(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_same_seed_same_data(self):
+        """Test generation is reproducible from the seed"""
+        first = generate_frame(500, seed=7)
+        
+        pd.testing.assert_frame_equal(first, generate_frame(500, seed=7))
+        self.assertFalse(first.equals(generate_frame(500, seed=8)))
+    
+    def test_suspicious_ratio(self):
+        """Test the configured share of events is flagged by is_suspicious"""
+        frame = generate_frame(20000, seed=1, suspicious_ratio=0.1)
+        mask, _ = is_suspicious_batch(parse_log_batch(frame))
+        
+        self.assertAlmostEqual(mask.mean(), 0.1, delta=0.01)
+    
+    def test_no_suspicious_events(self):
+        """Test benign-only data has no false positives"""
+        frame = generate_frame(5000, seed=2, suspicious_ratio=0.0)
+        mask, _ = is_suspicious_batch(parse_log_batch(frame))
+        
+        self.assertFalse(mask.any())
+    
+    def test_chunks_continue_utc_time(self):
+        """Test chunked generation keeps UtcTime increasing across chunks"""
+        frame = pd.concat(generate_chunks(2500, chunksize=1000, seed=3), ignore_index=True)
+        
+        self.assertEqual(len(frame), 2500)
+        self.assertTrue(frame["UtcTime"].is_monotonic_increasing)
+    
+    def test_write_csv_and_jsonl(self):
+        """Test both output formats hold the same events"""
+        csv_path = os.path.join(self.temp_dir, "synthetic.csv")
+        jsonl_path = os.path.join(self.temp_dir, "synthetic.jsonl")
+        write_synthetic(csv_path, 300, chunksize=100, seed=4)
+        write_synthetic(jsonl_path, 300, "jsonl", chunksize=100, seed=4)
+        
+        csv_frame = pd.read_csv(csv_path, keep_default_na=False)
+        with open(jsonl_path, 'r') as f:
+            records = [json.loads(line) for line in f]
+        
+        self.assertEqual(list(csv_frame.columns), SYNTH_COLUMNS)
+        self.assertEqual(csv_frame.astype(object).to_dict("records"), records)
+
+
+class TestLogBench(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up test files"""
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def test_parse_size(self):
+        """Test row counts with k/M suffixes"""
+        self.assertEqual(parse_size("10k"), 10_000)
+        self.assertEqual(parse_size("1M"), 1_000_000)
+        self.assertEqual(parse_size("2500"), 2500)
+    
+    def test_run_benchmark_report(self):
+        """Test a small in-process run reports every stage and compares with itself"""
+        report = run_benchmark([1000], work_dir=self.temp_dir, isolate=False)
+        
+        self.assertEqual([result["stage"] for result in report["results"]],
+                         ["producer", "parse", "detect", "consume"])
+        for result in report["results"]:
+            self.assertEqual(result["events"], 1000)
+            self.assertGreater(result["events_per_sec"], 0)
+        
+        changes = compare_results(report, report)
+        self.assertEqual([change["speedup"] for change in changes], [1.0] * 4)
+        json.dumps(report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+import unittest
+import io
+import tempfile
+import os
+import threading
+import time
+from log_tail import tail_lines, load_checkpoint, save_checkpoint, make_watcher, PollingWatcher
+from log_diagnostics import configure_diagnostics, flush_diagnostics
+
+
+class TestLogTail(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.test_input = os.path.join(self.temp_dir, "buffer.jsonl")
+        self.test_checkpoint = os.path.join(self.temp_dir, "buffer.ckpt")
+    
+    def tearDown(self):
+        """Clean up test files"""
+        for name in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, name))
+        os.rmdir(self.temp_dir)
+    
+    def append(self, data, delay=0.0):
+        """Helper to append bytes to the buffer, optionally from a thread"""
+        def write():
+            time.sleep(delay)
+            with open(self.test_input, 'ab') as f:
+                f.write(data)
+        if delay:
+            thread = threading.Thread(target=write)
+            thread.start()
+            return thread
+        write()
+    
+    def test_read_to_end_with_trailing_partial_line(self):
+        """Test a final line without newline is returned when not following"""
+        self.append(b'{"EventID": 1}\n{"EventID": 3}')
+        
+        with open(self.test_input, 'rb') as f:
+            lines = list(tail_lines(f))
+        
+        self.assertEqual([line for _, line in lines], [b'{"EventID": 1}', b'{"EventID": 3}'])
+        self.assertEqual(lines[-1][0], os.path.getsize(self.test_input))
+    
+    def test_hold_partial_line(self):
+        """Test a final line without newline is left unread when hold_partial is set"""
+        self.append(b'{"EventID": 1}\n{"Event')
+        
+        with open(self.test_input, 'rb') as f:
+            lines = list(tail_lines(f, hold_partial=True))
+        
+        self.assertEqual(lines, [(15, b'{"EventID": 1}')])
+    
+    def test_truncation_restarts_from_zero(self):
+        """Test a file truncated between reads is re-read from the start"""
+        self.append(b'{"EventID": 1}\n{"EventID": 3}\n')
+        truncations = []
+        
+        with open(self.test_input, 'rb') as f:
+            lines = tail_lines(f, on_truncate=lambda: truncations.append(True))
+            first = [next(lines), next(lines)]
+            with open(self.test_input, 'wb') as rewrite:
+                rewrite.write(b'{"EventID": 11}\n')
+            rest = list(lines)
+        
+        self.assertEqual(first, [(15, b'{"EventID": 1}'), (30, b'{"EventID": 3}')])
+        self.assertEqual(truncations, [True])
+        self.assertEqual(rest, [(16, b'{"EventID": 11}')])
+    
+    def test_follow_waits_for_newline(self):
+        """Test a partial line is held back until its newline is appended"""
+        self.append(b'{"EventID": 1}\n{"Event')
+        thread = self.append(b'ID": 3}\n', delay=0.05)
+        
+        with open(self.test_input, 'rb') as f:
+            watcher = make_watcher(self.test_input)
+            lines = list(tail_lines(f, follow=True, watcher=watcher, idle_timeout=0.3))
+            watcher.close()
+        thread.join()
+        
+        self.assertEqual([line for _, line in lines], [b'{"EventID": 1}', b'{"EventID": 3}'])
+    
+    def test_follow_with_polling_watcher(self):
+        """Test adaptive polling picks up appended lines"""
+        self.append(b'')
+        thread = self.append(b'{"EventID": 11}\n', delay=0.05)
+        
+        with open(self.test_input, 'rb') as f:
+            lines = list(tail_lines(f, follow=True, watcher=PollingWatcher(self.test_input), idle_timeout=0.3))
+        thread.join()
+        
+        self.assertEqual([line for _, line in lines], [b'{"EventID": 11}'])
+    
+    def test_checkpoint_roundtrip(self):
+        """Test a saved checkpoint is loaded back for the same file after it grew"""
+        self.append(b'{"EventID": 1}\n{"EventID": 3}\n')
+        save_checkpoint(self.test_checkpoint, self.test_input, 15, 1)
+        self.append(b'{"EventID": 11}\n')
+        
+        self.assertEqual(load_checkpoint(self.test_checkpoint, self.test_input), (15, 1))
+    
+    def test_checkpoint_of_rewritten_file_is_ignored(self):
+        """Test a file rewritten in place with other data past the offset restarts from zero"""
+        self.append(b'{"EventID": 1}\n{"EventID": 3}\n')
+        save_checkpoint(self.test_checkpoint, self.test_input, 15, 1)
+        inode = os.stat(self.test_input).st_ino
+        with open(self.test_input, 'wb') as f:
+            f.write(b'{"EventID": 11, "Image": "C:\\\\new.exe"}\n' * 3)
+        
+        self.assertEqual(os.stat(self.test_input).st_ino, inode)
+        self.assertEqual(load_checkpoint(self.test_checkpoint, self.test_input), (0, 0))
+    
+    def test_checkpoint_past_end_is_ignored(self):
+        """Test a checkpoint beyond the end of the file restarts from zero"""
+        self.append(b'{"EventID": 1}\n')
+        save_checkpoint(self.test_checkpoint, self.test_input, 1000, 50)
+        output = io.StringIO()
+        configure_diagnostics(stream=output)
+        try:
+            self.assertEqual(load_checkpoint(self.test_checkpoint, self.test_input), (0, 0))
+            flush_diagnostics()
+        finally:
+            configure_diagnostics()
+        
+        self.assertIn("Checkpoint does not match", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
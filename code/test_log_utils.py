@@ -1,6 +1,16 @@
 import unittest
 import json
-from log_utils import parse_log_line, is_suspicious, validate_json_structure
+import os
+import pickle
+import tempfile
+import pandas as pd
+from log_utils import (
+    parse_log_line, is_suspicious, validate_json_structure,
+    match_suspicious_patterns, PatternMatcher, parse_log_batch, is_suspicious_batch,
+    utc_time_to_epoch, utc_times_to_epoch, SysmonEvent, load_patterns, invalidate_patterns,
+    get_verdict_cache, set_verdict_cache_size, IocIndex, ioc_tokens, load_iocs, read_ioc_feeds
+)
+import log_utils
 
 
 class TestLogUtils(unittest.TestCase):
@@ -106,6 +116,20 @@ class TestLogUtils(unittest.TestCase):
         """Test JSON structure validation with empty data"""
         self.assertFalse(validate_json_structure({}))
 
+    def test_utc_time_to_epoch(self):
+        """Test Sysmon UtcTime parsing to epoch seconds"""
+        self.assertAlmostEqual(utc_time_to_epoch("2024-01-15 09:30:15.123"), 1705311015.123, places=3)
+        self.assertIsNone(utc_time_to_epoch("not a time"))
+        self.assertIsNone(utc_time_to_epoch(None))
+    
+    def test_utc_times_to_epoch(self):
+        """Test vectorized UtcTime parsing agrees with the scalar version"""
+        values = pd.Series(["2024-01-15 09:30:15.123", "bad", None])
+        epochs = utc_times_to_epoch(values)
+        
+        self.assertAlmostEqual(epochs[0], utc_time_to_epoch(values[0]), places=3)
+        self.assertTrue(pd.isna(epochs[1]) and pd.isna(epochs[2]))
+
 
 class TestPatternDetection(unittest.TestCase):
     """Test advanced pattern detection capabilities"""
@@ -136,5 +160,311 @@ class TestPatternDetection(unittest.TestCase):
         self.assertTrue(is_suspicious(tunnel_event))
 
 
+class TestPatternMatcher(unittest.TestCase):
+    """Test the precompiled pattern matcher"""
+    
+    def test_match_reports_categories(self):
+        """Test that every matching category and pattern is reported"""
+        event = {
+            "EventID": 999,
+            "Image": "C:\\Tools\\tunnel.exe",
+            "CommandLine": "tunnel.exe --remote-host example.com"
+        }
+        matches = match_suspicious_patterns(event)
+        
+        self.assertEqual(matches["suspicious_processes"], [r"tunnel\.exe"])
+        self.assertEqual(matches["suspicious_networks"], [r"--remote-host"])
+    
+    def test_match_clean_event(self):
+        """Test that a clean event reports no matches"""
+        event = {"EventID": 999, "CommandLine": "notepad.exe sample.txt"}
+        self.assertEqual(match_suspicious_patterns(event), {})
+    
+    def test_overlapping_literals(self):
+        """Test rules whose literals share a prefix are all evaluated"""
+        matcher = PatternMatcher({"a": [r"-enc\s+x"], "b": [r"-encodedcommand\s+x"]})
+        
+        self.assertEqual(matcher.match("ps -encodedcommand x"), [("b", r"-encodedcommand\s+x")])
+        self.assertEqual(matcher.match("ps -enc x"), [("a", r"-enc\s+x")])
+    
+    def test_pattern_without_literal(self):
+        """Test rules without a required literal are always evaluated"""
+        matcher = PatternMatcher({"digits": [r"\d{6}|[xyz]{4}"]})
+        
+        self.assertTrue(matcher.search("pid 123456"))
+        self.assertFalse(matcher.search("pid 12"))
+    
+    def test_uppercase_character_class(self):
+        """Test upper-case classes still match the lower-cased event text"""
+        matcher = PatternMatcher({"net": [r":\d{4}.*-[CR]\s"]})
+        self.assertTrue(matcher.search("nc 10.0.0.1:4444 -c cmd.exe"))
+    
+    def test_in_place_pattern_edits(self):
+        """Test patterns added to SUSPICIOUS_PATTERNS in place are picked up by invalidate_patterns"""
+        event = {"EventID": 999, "Image": "C:\\Tools\\normal.exe", "CommandLine": "normal.exe"}
+        self.assertFalse(is_suspicious(event))
+        
+        log_utils.SUSPICIOUS_PATTERNS["suspicious_processes"].append(r"normal\.exe")
+        try:
+            invalidate_patterns()
+            self.assertTrue(is_suspicious(event))
+            self.assertIn("suspicious_processes", match_suspicious_patterns(event))
+        finally:
+            log_utils.SUSPICIOUS_PATTERNS["suspicious_processes"].remove(r"normal\.exe")
+            invalidate_patterns()
+        self.assertFalse(is_suspicious(event))
+
+
+class TestVerdictCache(unittest.TestCase):
+    """Test the memoized pattern verdicts behind is_suspicious"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.patterns = log_utils.SUSPICIOUS_PATTERNS
+        self.suspicious_processes = self.patterns["suspicious_processes"]
+        self.cache = set_verdict_cache_size(2)
+        self.tunnel = {"EventID": 999, "Image": "C:\\Tools\\tunnel.exe", "CommandLine": "tunnel.exe"}
+        self.clean = {"EventID": 999, "Image": "C:\\Tools\\normal.exe", "CommandLine": "normal.exe"}
+    
+    def tearDown(self):
+        """Restore the default patterns and cache"""
+        self.patterns["suspicious_processes"] = self.suspicious_processes
+        load_patterns(self.patterns)
+        set_verdict_cache_size(65536)
+    
+    def test_repeated_fields_hit(self):
+        """Test repeated text fields are answered from the cache"""
+        for _ in range(3):
+            self.assertTrue(is_suspicious(self.tunnel))
+            self.assertFalse(is_suspicious(self.clean))
+        
+        stats = get_verdict_cache().stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (4, 2))
+    
+    def test_lru_eviction(self):
+        """Test the least recently used entry is evicted at maxsize"""
+        other = dict(self.clean, CommandLine="other.exe")
+        is_suspicious(self.tunnel)
+        is_suspicious(self.clean)
+        is_suspicious(self.tunnel)
+        is_suspicious(other)  # evicts clean, the least recently used
+        is_suspicious(self.tunnel)
+        
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["evictions"], stats["size"]), (2, 1, 2))
+    
+    def test_invalidated_by_new_patterns(self):
+        """Test loading new patterns discards cached verdicts"""
+        self.assertFalse(is_suspicious(self.clean))
+        load_patterns({"normal": [r"normal\.exe"]})
+        
+        self.assertTrue(is_suspicious(self.clean))
+        self.assertFalse(is_suspicious(self.tunnel))
+    
+    def test_invalidated_by_in_place_edit(self):
+        """Test editing SUSPICIOUS_PATTERNS in place and invalidating discards cached verdicts"""
+        self.assertFalse(is_suspicious(self.clean))
+        log_utils.SUSPICIOUS_PATTERNS["suspicious_processes"] = [r"normal\.exe"]
+        invalidate_patterns()
+        
+        self.assertTrue(is_suspicious(self.clean))
+        self.assertFalse(is_suspicious(self.tunnel))
+    
+    def test_event_ids_not_cached(self):
+        """Test EventID list changes apply to events already cached"""
+        self.assertFalse(is_suspicious(self.clean))
+        log_utils.SUSPICIOUS_EVENT_IDS.append(999)
+        try:
+            self.assertTrue(is_suspicious(self.clean))
+        finally:
+            log_utils.SUSPICIOUS_EVENT_IDS.remove(999)
+    
+    def test_disabled(self):
+        """Test maxsize 0 keeps nothing"""
+        set_verdict_cache_size(0)
+        is_suspicious(self.tunnel)
+        is_suspicious(self.tunnel)
+        
+        self.assertEqual(get_verdict_cache().stats()["size"], 0)
+
+
+class TestBatchDetection(unittest.TestCase):
+    """Test the vectorized batch API against the scalar functions"""
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.frame = pd.DataFrame([
+            {"EventID": 1, "UtcTime": "2024-01-15 09:30:15.123", "Image": "C:\\Windows\\cmd.exe",
+             "ProcessName": "cmd.exe", "CommandLine": "cmd.exe /c dir"},
+            {"EventID": "4688", "UtcTime": None, "Image": "C:\\Tools\\tunnel.exe",
+             "ProcessName": "tunnel.exe", "CommandLine": "tunnel.exe --remote-host example.com"},
+            {"EventID": "invalid", "UtcTime": "", "Image": None,
+             "ProcessName": "net.exe", "CommandLine": "net user testuser password123 /add"},
+            {"EventID": 999, "UtcTime": "", "Image": "C:\\Tools\\normal.exe",
+             "ProcessName": "normal.exe", "CommandLine": "normal.exe"},
+            {"EventID": None, "UtcTime": "", "Image": "C:\\Tools\\normal.exe",
+             "ProcessName": "normal.exe", "CommandLine": "normal.exe"},
+        ])
+        self.records = self.frame.to_dict("records")
+    
+    def test_parse_log_batch_matches_scalar(self):
+        """Test batch parsing agrees with parse_log_line row by row"""
+        parsed = parse_log_batch(self.frame)
+        expected = [parse_log_line(record) for record in self.records]
+        
+        self.assertEqual(parsed.to_dict("records"), expected)
+    
+    def test_is_suspicious_batch_matches_scalar(self):
+        """Test the batch mask and categories agree with the scalar functions"""
+        mask, categories = is_suspicious_batch(parse_log_batch(self.frame))
+        parsed = [parse_log_line(record) for record in self.records]
+        
+        self.assertEqual(list(mask), [is_suspicious(event) for event in parsed])
+        self.assertEqual(list(categories),
+                         [",".join(match_suspicious_patterns(event)) for event in parsed])
+    
+    def test_is_suspicious_batch_categories(self):
+        """Test matched categories are reported per row"""
+        _, categories = is_suspicious_batch(parse_log_batch(self.frame))
+        
+        self.assertEqual(categories[0], "")
+        self.assertEqual(categories[1], "suspicious_processes,suspicious_networks")
+        self.assertEqual(categories[2], "lateral_movement")
+    
+    def test_is_suspicious_batch_empty(self):
+        """Test an empty frame gives an empty mask"""
+        mask, categories = is_suspicious_batch(parse_log_batch(self.frame.iloc[:0]))
+        
+        self.assertEqual(len(mask), 0)
+        self.assertEqual(len(categories), 0)
+
+class TestSysmonEvent(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up test fixtures"""
+        self.fields = {"EventID": 1, "UtcTime": "2024-01-15 10:00:00", "Image": "C:\\Windows\\cmd.exe",
+                       "ProcessName": "cmd.exe", "CommandLine": "cmd.exe /c whoami"}
+        self.event = parse_log_line(self.fields)
+    
+    def test_dict_compatible(self):
+        """Test parsed events read like the dicts parse_log_line used to return"""
+        self.assertIsInstance(self.event, SysmonEvent)
+        self.assertEqual(self.event, self.fields)
+        self.assertEqual(dict(self.event), self.fields)
+        self.assertEqual(self.event["Image"], "C:\\Windows\\cmd.exe")
+        self.assertEqual(self.event.get("Missing", "default"), "default")
+        self.assertIn("CommandLine", self.event)
+        with self.assertRaises(KeyError):
+            self.event["Missing"]
+    
+    def test_no_instance_dict(self):
+        """Test events are slotted, without a per-instance __dict__"""
+        self.assertFalse(hasattr(self.event, "__dict__"))
+    
+    def test_repeated_strings_interned(self):
+        """Test equal Image and ProcessName values share one string object"""
+        other = parse_log_line(json.loads(json.dumps(self.fields)))
+        
+        self.assertIs(other.Image, self.event.Image)
+        self.assertIs(other.ProcessName, self.event.ProcessName)
+    
+    def test_serialization(self):
+        """Test events survive JSON encoding and pickling"""
+        import log_codec
+        
+        self.assertEqual(json.loads(log_codec.dumps(self.event)), self.fields)
+        self.assertEqual(pickle.loads(pickle.dumps(self.event)), self.event)
+
+
+class TestIocMatching(unittest.TestCase):
+    
+    def setUp(self):
+        """Set up a small two-category feed"""
+        self.feeds = {"domains": ["Evil.example.com", "bad.example.net"],
+                      "hashes": ["d41d8cd98f00b204e9800998ecf8427e"], "paths": ["c:\\temp\\dropper.exe"]}
+        self.event = parse_log_line({"EventID": 999, "Image": "C:\\Temp\\dropper.exe", "ProcessName": "dropper.exe",
+                                     "CommandLine": 'dropper.exe "http://evil.example.com:8080/x" -k 10.0.0.1'})
+    
+    def tearDown(self):
+        load_iocs([])
+    
+    def test_ioc_tokens(self):
+        """Test URL, host:port and path components become tokens and short tokens are skipped"""
+        tokens = ioc_tokens(self.event["CommandLine"], self.event["Image"], self.event["ProcessName"])
+        
+        for token in ("c:\\temp\\dropper.exe", "dropper.exe", "evil.example.com", "10.0.0.1", "http"):
+            self.assertIn(token, tokens)
+        self.assertNotIn("-k", tokens)
+    
+    def test_index_lookup(self):
+        """Test exact, case-insensitive lookups by category and clean tokens"""
+        index = IocIndex.from_indicators(self.feeds)
+        
+        self.assertEqual(index.lookup("evil.example.com"), ["domains"])
+        self.assertEqual(index.lookup("d41d8cd98f00b204e9800998ecf8427e"), ["hashes"])
+        self.assertEqual(index.lookup("example.com"), [])
+        self.assertEqual(index.match({"evil.example.com", "c:\\temp\\dropper.exe", "clean.exe"}),
+                         {"paths": ["c:\\temp\\dropper.exe"], "domains": ["evil.example.com"]})
+    
+    def test_bloom_false_positive_rate(self):
+        """Test the Bloom filter rejects close to the configured share of clean tokens"""
+        index = IocIndex.from_indicators({"domains": [f"bad{i}.example.com" for i in range(5000)]}, 0.01)
+        
+        self.assertTrue(all(index.lookup(f"bad{i}.example.com") for i in range(5000)))
+        for i in range(20000):
+            index.lookup(f"good{i}.example.com")
+        self.assertLess(index.stats()["false_positives"], 20000 * 0.02)
+        self.assertEqual(index.stats()["hits"], 5000)
+    
+    def test_save_and_memory_map(self):
+        """Test a saved index loads memory-mapped and answers like the original"""
+        index = IocIndex.from_indicators(self.feeds)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "iocs.ioc")
+            index.save(path)
+            loaded = IocIndex.load(path)
+            try:
+                self.assertEqual(len(loaded), 4)
+                self.assertEqual(loaded.categories, ["domains", "hashes", "paths"])
+                self.assertEqual(loaded.lookup("evil.example.com"), ["domains"])
+                self.assertEqual(loaded.lookup("evil.example.org"), [])
+            finally:
+                loaded.close()
+            
+            with open(path, 'wb') as f:
+                f.write(b"not an index")
+            with self.assertRaises(ValueError):
+                IocIndex.load(path)
+    
+    def test_read_ioc_feeds(self):
+        """Test feed files skip comments, take the first field and name categories"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "domains.txt")
+            with open(path, 'w') as f:
+                f.write("# feed header\nevil.example.com,2024-01-01\n\nbad.example.net  high\n")
+            
+            self.assertEqual(read_ioc_feeds([path]), {"domains": ["evil.example.com", "bad.example.net"]})
+            self.assertEqual(list(read_ioc_feeds([f"c2={path}"])), ["c2"])
+    
+    def test_is_suspicious_with_iocs(self):
+        """Test loaded IOCs flag events, reset the verdict cache and show up as ioc_ categories"""
+        self.assertFalse(is_suspicious(self.event))
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for category, indicators in self.feeds.items():
+                paths.append(os.path.join(directory, f"{category}.txt"))
+                with open(paths[-1], 'w') as f:
+                    f.write("\n".join(indicators))
+            load_iocs(paths)
+        
+        self.assertTrue(is_suspicious(self.event))
+        matches = match_suspicious_patterns(self.event)
+        self.assertEqual(matches["ioc_domains"], ["evil.example.com"])
+        self.assertEqual(matches["ioc_paths"], ["c:\\temp\\dropper.exe"])
+        mask, categories = is_suspicious_batch(parse_log_batch(pd.DataFrame([dict(self.event)])))
+        self.assertTrue(mask[0])
+        self.assertEqual(categories[0], "ioc_domains,ioc_paths")
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file